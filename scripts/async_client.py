@@ -0,0 +1,324 @@
+import os
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+import aiohttp
+from dotenv import load_dotenv
+
+from label_studio_client import LABEL_CONFIG
+from project_index import normalize_name
+from scheduler import RequestScheduler, get_scheduler
+from task_importer import chunked
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLabelStudioManager:
+    """
+    Асинхронный клиент Label Studio на базе aiohttp.
+
+    Повторяет операции LabelStudioManager/StorageManager (проекты, локальные
+    хранилища, синхронизация, статистика, задачи), но позволяет держать
+    сотни запросов одновременно. Количество запросов в работе ограничено
+    max_concurrency, соединения переиспользуются из общего пула.
+
+    Пример:
+        async with AsyncLabelStudioManager() as manager:
+            project_id = await manager.get_project_id()
+            storages = await manager.list_storages()
+    """
+
+    def __init__(
+        self,
+        url: str = None,
+        api_key: str = None,
+        project_name: str = None,
+        max_concurrency: int = None,
+        timeout: float = 60.0,
+        scheduler: RequestScheduler = None
+    ):
+        """
+        :param url: Адрес Label Studio (LABEL_STUDIO_URL)
+        :param api_key: API ключ (LABEL_STUDIO_API_KEY)
+        :param project_name: Имя проекта (LABEL_STUDIO_PROJECT_NAME)
+        :param max_concurrency: Максимум запросов в работе (ASYNC_MAX_CONCURRENCY, по умолчанию 100)
+        :param timeout: Таймаут запроса в секундах
+        :param scheduler: Планировщик запросов (по умолчанию общий для процесса, см. get_scheduler);
+                          AIMD лимит действует внутри max_concurrency
+        """
+        self.url = (url or os.getenv('LABEL_STUDIO_URL') or '').rstrip('/')
+        self.api_key = api_key or os.getenv('LABEL_STUDIO_API_KEY')
+
+        if not self.url or not self.api_key:
+            raise ValueError("URL и API ключ должны быть установлены в .env")
+
+        self.project_name = project_name or os.getenv('LABEL_STUDIO_PROJECT_NAME', 'Default Project')
+        self.max_concurrency = max_concurrency or int(os.getenv('ASYNC_MAX_CONCURRENCY', '100'))
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.project: Optional[Dict[str, Any]] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.scheduler = scheduler or get_scheduler()
+
+    async def __aenter__(self) -> 'AsyncLabelStudioManager':
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        """Создание пула соединений"""
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.max_concurrency)
+        self._session = aiohttp.ClientSession(
+            headers={'Authorization': f'Token {self.api_key}'},
+            connector=connector,
+            timeout=self.timeout
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        logger.info(f"Асинхронный клиент Label Studio: {self.url}, до {self.max_concurrency} запросов")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def make_request(self, method: str, url: str, **kwargs) -> Any:
+        """
+        Выполнение запроса к API с ограничением параллельности
+
+        :return: Разобранный JSON ответа или None для пустого ответа
+        """
+        if self._session is None:
+            await self.open()
+        async with self._semaphore:
+            ticket = await self.scheduler.acquire_async(method, url) if self.scheduler else None
+            status = 'error'
+            retry_after = None
+            try:
+                async with self._session.request(method, f"{self.url}{url}", **kwargs) as response:
+                    status = response.status
+                    if response.status >= 400:
+                        retry_after = response.headers.get('Retry-After')
+                        text = await response.text()
+                        logger.error(f"{method} {url}: {response.status} {text[:500]}")
+                        response.raise_for_status()
+                    if response.status == 204:
+                        return None
+                    return await response.json(content_type=None)
+            finally:
+                if ticket:
+                    self.scheduler.release(ticket, status, retry_after)
+
+    async def check_connection(self) -> bool:
+        try:
+            await self.make_request('GET', '/api/health')
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка подключения к Label Studio: {e}")
+            return False
+
+    # --- проекты ---
+
+    async def get_projects(self, page_size: int = 100) -> List[Dict[str, Any]]:
+        """Список всех проектов (постранично)"""
+        projects = []
+        page = 1
+        while True:
+            result = await self.make_request('GET', '/api/projects', params={'page': page, 'page_size': page_size})
+            projects.extend(result.get('results', []))
+            if not result.get('next'):
+                return projects
+            page += 1
+
+    async def get_project(self, project_id: int) -> Dict[str, Any]:
+        return await self.make_request('GET', f'/api/projects/{project_id}')
+
+    async def create_project(self, title: str, label_config: str = LABEL_CONFIG) -> Dict[str, Any]:
+        project = await self.make_request('POST', '/api/projects', json={'title': title, 'label_config': label_config})
+        logger.info(f"Создан новый проект: {title}")
+        return project
+
+    async def get_or_create_project(self) -> Dict[str, Any]:
+        """Получение или создание проекта с именем project_name"""
+        target = normalize_name(self.project_name)
+        for project in await self.get_projects():
+            if normalize_name(project.get('title')) == target:
+                logger.info(f"Найден существующий проект: {project['title']}")
+                self.project = {'id': project['id'], 'title': project['title']}
+                return self.project
+
+        project = await self.create_project(self.project_name)
+        self.project = {'id': project['id'], 'title': project['title']}
+        return self.project
+
+    async def get_project_id(self) -> int:
+        if not self.project or 'id' not in self.project:
+            await self.get_or_create_project()
+        return self.project['id']
+
+    # --- локальные хранилища ---
+
+    async def list_storages(self, project_id: int = None) -> List[Dict[str, Any]]:
+        project_id = project_id or await self.get_project_id()
+        return await self.make_request('GET', '/api/storages/localfiles', params={'project': project_id})
+
+    async def create_storage(
+        self,
+        path: str,
+        title: str = None,
+        regex_filter: str = r".*\.(jpg|jpeg|png)",
+        use_blob_urls: bool = True,
+        project_id: int = None
+    ) -> Dict[str, Any]:
+        payload = {
+            'title': title or self.project_name,
+            'path': path,
+            'regex_filter': regex_filter,
+            'use_blob_urls': use_blob_urls,
+            'presign': False,
+            'project': project_id or await self.get_project_id()
+        }
+        storage = await self.make_request('POST', '/api/storages/localfiles', json=payload)
+        logger.info(f"Создано локальное хранилище: {storage}")
+        return storage
+
+    async def get_storage(self, storage_id: int) -> Dict[str, Any]:
+        return await self.make_request('GET', f'/api/storages/localfiles/{storage_id}')
+
+    async def update_storage(self, storage_id: int, **fields) -> Dict[str, Any]:
+        payload = {k: v for k, v in fields.items() if v is not None}
+        return await self.make_request('PATCH', f'/api/storages/localfiles/{storage_id}', json=payload)
+
+    async def delete_storage(self, storage_id: int) -> bool:
+        await self.make_request('DELETE', f'/api/storages/localfiles/{storage_id}')
+        return True
+
+    async def sync_storage(self, storage_id: int) -> Dict[str, Any]:
+        result = await self.make_request('POST', f'/api/storages/localfiles/{storage_id}/sync')
+        logger.info(f"Синхронизация хранилища {storage_id}: {result}")
+        return result
+
+    async def get_storage_stats(self, storage_id: int) -> Dict[str, Any]:
+        return await self.make_request('GET', f'/api/storages/localfiles/{storage_id}/stats')
+
+    # --- задачи ---
+
+    async def create_tasks_batch(self, tasks: List[Dict[str, Any]], project_id: int = None) -> List[int]:
+        project_id = project_id or await self.get_project_id()
+        result = await self.make_request(
+            'POST',
+            f'/api/projects/{project_id}/import',
+            json=tasks,
+            params={'return_task_ids': '1'}
+        )
+        return result.get('task_ids', [])
+
+    async def import_tasks(
+        self,
+        tasks: Iterable[Dict[str, Any]],
+        project_id: int = None,
+        chunk_size: int = None,
+        index=None
+    ) -> Dict[str, Any]:
+        """
+        Параллельный импорт задач чанками. Одновременно в работе не больше
+        max_concurrency чанков. Ошибка одного чанка не отменяет остальные:
+        после импорта всех чанков выбрасывается RuntimeError с числом неудачных.
+        Чтение задач и операции индекса (SQLite, файлы) выполняются в пуле
+        потоков, чтобы не останавливать цикл событий.
+
+        :param index: ImportedPathIndex проекта - уже импортированные файлы пропускаются
+        """
+        project_id = project_id or await self.get_project_id()
+        chunk_size = chunk_size or int(os.getenv('IMPORT_CHUNK_SIZE', '1000'))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        in_flight = set()
+        stats = {'imported': 0, 'chunks': 0, 'failed_chunks': 0}
+        errors: List[BaseException] = []
+        skipped = {'skipped': 0}
+        if index is not None:
+            tasks = index.filter_new(tasks, stats=skipped)
+
+        async def send(chunk):
+            task_ids = await self.create_tasks_batch(chunk, project_id)
+            if index is not None:
+                await loop.run_in_executor(None, index.record, chunk, task_ids)
+            return task_ids
+
+        async def collect(done):
+            for result in await asyncio.gather(*done, return_exceptions=True):
+                if isinstance(result, BaseException):
+                    logger.error(f"Ошибка асинхронного импорта чанка: {result}")
+                    stats['failed_chunks'] += 1
+                    errors.append(result)
+                else:
+                    stats['imported'] += len(result)
+                    stats['chunks'] += 1
+
+        chunks = chunked(tasks, chunk_size)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                if len(in_flight) >= self.max_concurrency:
+                    done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    await collect(done)
+                in_flight.add(asyncio.ensure_future(send(chunk)))
+
+            if in_flight:
+                done, in_flight = await asyncio.wait(in_flight)
+                await collect(done)
+        finally:
+            for task in in_flight:
+                task.cancel()
+            if index is not None:
+                await loop.run_in_executor(None, index.save)
+
+        elapsed = loop.time() - started
+        stats.update(
+            skipped=skipped['skipped'],
+            elapsed=round(elapsed, 3),
+            tasks_per_sec=round(stats['imported'] / elapsed, 1) if elapsed > 0 else 0.0
+        )
+        logger.info(f"Асинхронный импорт в проект {project_id}: {stats}")
+
+        if errors:
+            raise RuntimeError(
+                f"Не удалось импортировать {stats['failed_chunks']} чанков из "
+                f"{stats['chunks'] + stats['failed_chunks']}, импортировано задач: {stats['imported']}"
+            ) from errors[0]
+        return stats
+
+    async def list_tasks(self, project_id: int = None, page: int = 1, page_size: int = 100) -> Dict[str, Any]:
+        """Одна страница задач проекта"""
+        project_id = project_id or await self.get_project_id()
+        return await self.make_request(
+            'GET', '/api/tasks',
+            params={'project': project_id, 'page': page, 'page_size': page_size}
+        )
+
+    async def iter_tasks(self, project_id: int = None, page_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        """Постраничный обход всех задач проекта"""
+        page = 1
+        while True:
+            try:
+                result = await self.list_tasks(project_id, page, page_size)
+            except aiohttp.ClientResponseError as e:
+                # Label Studio отвечает 404 на страницу за пределами списка
+                if e.status == 404:
+                    return
+                raise
+            tasks = result.get('tasks', []) if isinstance(result, dict) else result
+            for task in tasks:
+                yield task
+            if len(tasks) < page_size:
+                return
+            page += 1
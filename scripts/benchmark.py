@@ -0,0 +1,363 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TREE_MARKER = '.benchmark_tree.json'
+
+
+def generate_tree(root: str, files: int, files_per_dir: int = 1000, ext: str = '.jpg') -> int:
+    """
+    Синтетическое дерево изображений: files файлов по files_per_dir в директории.
+    Содержимое файлов уникально (номер файла), чтобы не срабатывала дедупликация.
+    Если дерево с такими параметрами уже создано, повторная генерация не выполняется.
+
+    :return: Количество созданных файлов
+    """
+    marker = os.path.join(root, TREE_MARKER)
+    spec = {'files': files, 'files_per_dir': files_per_dir, 'ext': ext}
+    try:
+        with open(marker, encoding='utf-8') as f:
+            if json.load(f) == spec:
+                return 0
+    except (OSError, ValueError):
+        pass
+
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    for i in range(files):
+        directory = os.path.join(root, f'd{i // files_per_dir // 1000:03d}', f'{i // files_per_dir % 1000:03d}')
+        if i % files_per_dir == 0:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, f'{i:08d}{ext}'), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, i.to_bytes(8, 'little'))
+        finally:
+            os.close(fd)
+    with open(marker, 'w', encoding='utf-8') as f:
+        json.dump(spec, f)
+    return files
+
+
+def add_files(directory: str, count: int, prefix: str = 'new', ext: str = '.jpg'):
+    """Новые файлы для замера инкрементальной синхронизации"""
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.time_ns()
+    for i in range(count):
+        with open(os.path.join(directory, f'{prefix}_{stamp}_{i:06d}{ext}'), 'wb') as f:
+            f.write(stamp.to_bytes(8, 'little') + i.to_bytes(8, 'little'))
+
+
+def current_rss() -> int:
+    """Текущий RSS процесса в байтах (Linux), иначе пиковый за все время"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class RssSampler:
+    """Пиковый RSS за время фазы (фоновый опрос)"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+
+    def _run(self):
+        while True:
+            self.peak = max(self.peak, current_rss())
+            if self._stop.wait(self.interval):
+                break
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+class RequestRecorder:
+    """Длительность HTTP запросов клиента (response hook сессии requests)"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+
+    def install(self, session):
+        hooks = session.hooks.setdefault('response', [])
+        if self._hook not in hooks:
+            hooks.append(self._hook)
+
+    def _hook(self, response, *args, **kwargs):
+        with self._lock:
+            self.latencies.append(response.elapsed.total_seconds())
+
+    def take(self) -> List[float]:
+        with self._lock:
+            latencies, self.latencies = self.latencies, []
+        return latencies
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _serve_mock(document_root: str, api_key: str, latency: float, projects: int, url_queue, stop_event):
+    from mock_label_studio import MockLabelStudioServer
+
+    server = MockLabelStudioServer(api_key=api_key, latency=latency, document_root=document_root)
+    for i in range(projects):
+        server.state.add_project(f'Benchmark filler {i}')
+    server.start()
+    url_queue.put(server.url)
+    stop_event.wait()
+    server.stop()
+
+
+class Benchmark:
+    """
+    Замер фаз работы с Label Studio на локальной заглушке.
+
+    Заглушка запускается в отдельном процессе, поэтому RSS фаз относится
+    только к клиентской части. Для каждой фазы сохраняются длительность,
+    пропускная способность, p50/p99 длительности HTTP запросов и пиковый RSS.
+    """
+
+    def __init__(
+        self,
+        files: int = 10000,
+        files_per_dir: int = 1000,
+        added: int = 1000,
+        tasks: int = 10000,
+        projects: int = 200,
+        latency: float = 0.0,
+        workdir: str = None
+    ):
+        self.files = files
+        self.files_per_dir = files_per_dir
+        self.added = added
+        self.tasks = tasks
+        self.projects = projects
+        self.latency = latency
+        self.workdir = workdir or os.path.join(tempfile.gettempdir(), 'ls-benchmark')
+        self.document_root = os.path.join(self.workdir, 'files')
+        self.data_dir = os.path.join(self.document_root, 'augmented_images')
+        self.recorder = RequestRecorder()
+        self.results: List[Dict[str, Any]] = []
+
+    def phase(self, name: str, func: Callable[[], Any], items: int = None) -> Any:
+        self.recorder.take()
+        with RssSampler() as rss:
+            started = time.perf_counter()
+            result = func()
+            seconds = time.perf_counter() - started
+        latencies = self.recorder.take()
+        items = items if items is not None else (result if isinstance(result, int) else 0)
+        record = {
+            'phase': name,
+            'seconds': round(seconds, 4),
+            'items': items,
+            'items_per_sec': round(items / seconds, 1) if items and seconds else None,
+            'requests': len(latencies),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+            'peak_rss_mb': round(rss.peak / 2 ** 20, 1),
+        }
+        self.results.append(record)
+        logger.info(f"{name}: {record}")
+        return result
+
+    def _manager(self, client=None):
+        """LabelStudioManager с замером запросов, включая поиск проекта при создании"""
+        from label_studio_sdk import Client
+        from label_studio_client import LabelStudioManager
+
+        if client is None:
+            client = Client(url=os.environ['LABEL_STUDIO_URL'], api_key=os.environ['LABEL_STUDIO_API_KEY'])
+            self.recorder.install(client.session)
+        return LabelStudioManager(client=client)
+
+    def run(self) -> Dict[str, Any]:
+        os.makedirs(self.workdir, exist_ok=True)
+        state_dir = os.path.join(self.workdir, 'state')
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+        self.phase('generate_tree', lambda: generate_tree(self.data_dir, self.files, self.files_per_dir))
+        shutil.rmtree(os.path.join(self.data_dir, 'incoming'), ignore_errors=True)
+
+        api_key = 'benchmark'
+        url_queue = multiprocessing.Queue()
+        stop_event = multiprocessing.Event()
+        mock = multiprocessing.Process(
+            target=_serve_mock,
+            args=(self.document_root, api_key, self.latency, self.projects, url_queue, stop_event),
+            daemon=True
+        )
+        mock.start()
+        url = url_queue.get(timeout=30)
+
+        os.environ.update(
+            LABEL_STUDIO_URL=url,
+            LABEL_STUDIO_API_KEY=api_key,
+            LABEL_STUDIO_USERNAME=os.getenv('LABEL_STUDIO_USERNAME', 'benchmark'),
+            LABEL_STUDIO_PASSWORD=os.getenv('LABEL_STUDIO_PASSWORD', 'benchmark'),
+            LABEL_STUDIO_PROJECT_NAME='Benchmark Project',
+            LABEL_STUDIO_LOCAL_FILES_SERVING_ENABLED='true',
+            LABEL_STUDIO_LOCAL_FILES_DOCUMENT_ROOT=self.document_root,
+            STATE_DIR=state_dir
+        )
+        try:
+            self._run_phases()
+        finally:
+            stop_event.set()
+            mock.join(timeout=10)
+
+        return {
+            'meta': {
+                'version': _git_version(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'params': {
+                    'files': self.files,
+                    'files_per_dir': self.files_per_dir,
+                    'added': self.added,
+                    'tasks': self.tasks,
+                    'projects': self.projects,
+                    'latency': self.latency,
+                },
+            },
+            'phases': self.results,
+        }
+
+    def _run_phases(self):
+        from main import setup_local_storage
+        from task_importer import chunked
+
+        manager = self.phase('project_resolution_cold', lambda: self._manager(), items=1)
+        self.phase('project_resolution_warm', lambda: self._manager(client=manager.client), items=1)
+
+        storage_id, _, _, storage_manager = self.phase(
+            'setup_local_storage', lambda: setup_local_storage(manager), items=self.files
+        )
+
+        self.phase(
+            'sync_storage_noop', lambda: storage_manager.sync_storage(storage_id), items=self.files
+        )
+        add_files(os.path.join(self.data_dir, 'incoming'), self.added)
+        self.phase(
+            'sync_storage_incremental', lambda: storage_manager.sync_storage(storage_id), items=self.added
+        )
+
+        tasks = ({'data': {'image': f'/data/local-files/?d=synthetic/{i}.jpg'}} for i in range(self.tasks))
+
+        def create_batches():
+            for batch in chunked(tasks, 1000):
+                manager.create_tasks_batch(batch)
+
+        self.phase('create_tasks_batch', create_batches, items=self.tasks)
+        self.phase('iter_tasks', lambda: sum(1 for _ in manager.iter_tasks(page_size=1000)))
+
+
+def _git_version() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Сравнение с предыдущим результатом
+
+    :return: Описания фаз, которые стали медленнее более чем на tolerance (доля)
+    """
+    previous = {p['phase']: p for p in baseline.get('phases', [])}
+    regressions = []
+    for phase in current['phases']:
+        before = previous.get(phase['phase'])
+        if not before or phase['phase'] == 'generate_tree' or not before['seconds']:
+            continue
+        ratio = phase['seconds'] / before['seconds']
+        if ratio > 1 + tolerance:
+            regressions.append(f"{phase['phase']}: {before['seconds']} -> {phase['seconds']} сек (x{ratio:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк синхронизации с Label Studio на локальной заглушке')
+    parser.add_argument('--files', type=int, default=10000, help='Файлов в синтетическом дереве (10k - 5M)')
+    parser.add_argument('--files-per-dir', type=int, default=1000)
+    parser.add_argument('--added', type=int, default=1000, help='Новых файлов для инкрементальной синхронизации')
+    parser.add_argument('--tasks', type=int, default=10000, help='Задач для create_tasks_batch')
+    parser.add_argument('--projects', type=int, default=200, help='Посторонних проектов на сервере')
+    parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа заглушки, сек')
+    parser.add_argument('--workdir', default=None, help='Директория для дерева файлов и состояния')
+    parser.add_argument('--output', default='benchmark.json', help='Файл результатов (JSON)')
+    parser.add_argument('--baseline', default=None, help='Предыдущий результат для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Допустимое замедление (доля)')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    # Подробные логи синхронизации искажают замеры
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    result = Benchmark(
+        files=args.files,
+        files_per_dir=args.files_per_dir,
+        added=args.added,
+        tasks=args.tasks,
+        projects=args.projects,
+        latency=args.latency,
+        workdir=args.workdir
+    ).run()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    logger.info(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            logger.warning(f"Регрессия: {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import importlib
+import threading
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Optional
+
+from file_manifest import DEFAULT_STATE_DIR
+from json_state import load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+
+def wait_for_label_studio(url: str = None, timeout: float = None, max_interval: float = None) -> bool:
+    """
+    Ожидание готовности Label Studio (/api/health) с адаптивным интервалом.
+
+    Первая проверка выполняется сразу, затем интервал растет от 50 мс до
+    max_interval, поэтому уже запущенный сервер обнаруживается за один запрос,
+    а долгий старт не создает лишней нагрузки.
+
+    :param url: Адрес Label Studio (LABEL_STUDIO_URL)
+    :param timeout: Максимальное время ожидания, сек (READINESS_TIMEOUT, по умолчанию 600)
+    :param max_interval: Максимальный интервал проверок, сек (READINESS_MAX_INTERVAL, по умолчанию 5)
+    """
+    url = (url or os.getenv('LABEL_STUDIO_URL') or '').rstrip('/')
+    if not url:
+        logger.error("LABEL_STUDIO_URL не установлен")
+        return False
+    timeout = timeout or float(os.getenv('READINESS_TIMEOUT', '600'))
+    max_interval = max_interval or float(os.getenv('READINESS_MAX_INTERVAL', '5'))
+
+    started = time.monotonic()
+    deadline = started + timeout
+    interval = 0.05
+    attempts = 0
+    last_log = 0.0
+    while True:
+        attempts += 1
+        error = None
+        try:
+            request = urllib.request.Request(f"{url}/api/health", headers={'Accept': 'application/json'})
+            with urllib.request.urlopen(request, timeout=min(10.0, max(deadline - time.monotonic(), 0.1))) as response:
+                if response.status == 200:
+                    logger.info(
+                        f"Label Studio готов к работе по адресу {url} "
+                        f"({attempts} проверок, {time.monotonic() - started:.2f} сек)"
+                    )
+                    return True
+                error = f"статус {response.status}"
+        except (urllib.error.URLError, OSError) as e:
+            error = e
+
+        now = time.monotonic()
+        if now >= deadline:
+            logger.error(f"Label Studio не запустился за {timeout} сек: {error}")
+            return False
+        if now - last_log >= 30 or attempts == 1:
+            logger.info(f"Ожидание Label Studio ({url}): {error}")
+            last_log = now
+        time.sleep(min(interval, max(deadline - now, 0)))
+        interval = min(interval * 1.5, max_interval)
+
+
+def preload(*modules: str) -> threading.Thread:
+    """
+    Фоновый импорт тяжелых модулей (SDK) на время ожидания сервера.
+    Повторный import в основном потоке дождется завершения через блокировку импорта.
+    """
+    def run():
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                logger.debug("Предзагрузка %s не удалась: %s", module, e)
+
+    thread = threading.Thread(target=run, name='preload', daemon=True)
+    thread.start()
+    return thread
+
+
+class SetupState:
+    """
+    Сохраненный результат настройки (ID проекта и хранилища).
+
+    Состояние действительно, пока не изменился отпечаток конфигурации
+    (адрес, проект, пути, фильтр, конфигурация разметки). При теплом
+    перезапуске поиск проекта, список и валидация хранилищ пропускаются.
+    """
+
+    def __init__(self, path: str = None):
+        state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+        self.path = path or os.path.join(state_dir, 'setup_state.json')
+
+    @staticmethod
+    def fingerprint(**values: Any) -> str:
+        data = json.dumps(values, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def load(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        state = load_json(self.path, {})
+        if state.get('fingerprint') != fingerprint:
+            return None
+        return state
+
+    def save(self, fingerprint: str, **values: Any):
+        save_json(self.path, dict(values, fingerprint=fingerprint, saved_at=time.time()))
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,222 @@
+import os
+import mmap
+import json
+import hashlib
+import logging
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from file_manifest import DEFAULT_STATE_DIR, FileEntry
+from task_importer import chunked
+
+logger = logging.getLogger(__name__)
+
+# unique - файлы для импорта, duplicates - пары (дубликат, путь оригинала)
+DedupResult = namedtuple('DedupResult', ['unique', 'duplicates'])
+
+
+def hash_file(path: str) -> Tuple[str, Optional[str]]:
+    """
+    Хеш содержимого файла (BLAKE2b, 128 бит), чтение через mmap.
+
+    :return: (путь, hex-дайджест или None при ошибке чтения)
+    """
+    try:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    digest.update(mm)
+        return path, digest.hexdigest()
+    except OSError as e:
+        logger.warning(f"Не удалось прочитать {path}: {e}")
+        return path, None
+
+
+class ContentDeduplicator:
+    """
+    Поиск побайтно одинаковых файлов перед импортом.
+
+    Файлы хешируются в пуле процессов, результаты сохраняются в индекс
+    (SQLite) с ключом (путь, размер, mtime), поэтому при повторных запусках
+    хешируются только новые и измененные файлы.
+    """
+
+    def __init__(self, root: str, db_path: str = None, workers: int = None, batch_size: int = 1000):
+        """
+        :param root: Директория, относительно которой заданы пути FileEntry
+        :param db_path: Путь к индексу хешей (по умолчанию STATE_DIR/content_hashes.sqlite)
+        :param workers: Количество процессов (DEDUP_WORKERS, по умолчанию число CPU)
+        :param batch_size: Количество файлов, обрабатываемых за один проход
+        """
+        state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+        self.root = root
+        self.db_path = db_path or os.path.join(state_dir, 'content_hashes.sqlite')
+        self.workers = workers or int(os.getenv('DEDUP_WORKERS', '0')) or os.cpu_count() or 1
+        self.batch_size = batch_size
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS hashes (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    digest TEXT NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS hashes_digest ON hashes (digest)')
+
+    def hash_entries(self, entries: Iterable[FileEntry]) -> Iterator[Tuple[FileEntry, str]]:
+        """
+        Хеши файлов с использованием индекса: пересчитываются только файлы,
+        у которых изменились размер или mtime.
+
+        :return: Итератор (FileEntry, дайджест). Нечитаемые файлы пропускаются.
+        """
+        conn = self._connect()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for batch in chunked(entries, self.batch_size):
+                    cached = self._lookup(conn, batch)
+                    misses = [e for e in batch if e.path not in cached]
+
+                    hashed: Dict[str, str] = {}
+                    if misses:
+                        full_paths = [os.path.join(self.root, e.path) for e in misses]
+                        chunksize = max(1, len(full_paths) // (self.workers * 4))
+                        for entry, (_, digest) in zip(misses, pool.map(hash_file, full_paths, chunksize=chunksize)):
+                            if digest is not None:
+                                hashed[entry.path] = digest
+                        with conn:
+                            conn.executemany(
+                                'INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)',
+                                ((e.path, e.size, e.mtime_ns, hashed[e.path]) for e in misses if e.path in hashed)
+                            )
+
+                    for entry in batch:
+                        digest = cached.get(entry.path) or hashed.get(entry.path)
+                        if digest is not None:
+                            yield entry, digest
+        finally:
+            conn.close()
+
+    def _lookup(self, conn: sqlite3.Connection, batch: List[FileEntry]) -> Dict[str, str]:
+        """Дайджесты из индекса для файлов, не изменившихся с момента хеширования"""
+        cached = {}
+        for i in range(0, len(batch), 500):
+            part = batch[i:i + 500]
+            by_path = {e.path: e for e in part}
+            rows = conn.execute(
+                f"SELECT path, size, mtime_ns, digest FROM hashes WHERE path IN ({','.join('?' * len(part))})",
+                list(by_path)
+            )
+            for path, size, mtime_ns, digest in rows:
+                entry = by_path[path]
+                if entry.size == size and entry.mtime_ns == mtime_ns:
+                    cached[path] = digest
+        return cached
+
+    def deduplicate(self, entries: Iterable[FileEntry]) -> DedupResult:
+        """
+        Разделение файлов на уникальные и дубликаты.
+
+        Файл считается дубликатом, если такое же содержимое уже есть у другого
+        существующего файла из индекса или у файла, встреченного ранее в entries.
+        """
+        entries = list(entries)
+        # Файлы текущего набора сравниваются между собой только в порядке обхода
+        current = {entry.path for entry in entries}
+        unique: List[FileEntry] = []
+        duplicates: List[Tuple[FileEntry, str]] = []
+        seen: Dict[str, str] = {}
+
+        conn = self._connect()
+        try:
+            for entry, digest in self.hash_entries(entries):
+                original = seen.get(digest) or self._find_original(conn, digest, current)
+                if original:
+                    duplicates.append((entry, original))
+                else:
+                    seen[digest] = entry.path
+                    unique.append(entry)
+        finally:
+            conn.close()
+
+        if duplicates:
+            logger.info(f"Найдено дубликатов: {len(duplicates)} из {len(unique) + len(duplicates)} файлов")
+        return DedupResult(unique, duplicates)
+
+    def _find_original(self, conn: sqlite3.Connection, digest: str, exclude: set) -> Optional[str]:
+        for (other,) in conn.execute('SELECT path FROM hashes WHERE digest = ? ORDER BY path', (digest,)):
+            if other not in exclude and os.path.exists(os.path.join(self.root, other)):
+                return other
+        return None
+
+    def find_duplicates(self, entries: Iterable[FileEntry]) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Группы дубликатов среди всех переданных файлов (для отчета)
+
+        :return: Итератор (дайджест, список путей), путей в группе больше одного
+        """
+        for _ in self.hash_entries(entries):
+            pass
+        conn = self._connect()
+        try:
+            for digest, paths in conn.execute(
+                """
+                SELECT digest, group_concat(path, char(0)) FROM hashes
+                GROUP BY digest HAVING COUNT(*) > 1
+                """
+            ):
+                existing = sorted(p for p in paths.split('\0') if os.path.exists(os.path.join(self.root, p)))
+                if len(existing) > 1:
+                    yield digest, existing
+        finally:
+            conn.close()
+
+    def write_report(self, entries: Iterable[FileEntry], report_path: str = None) -> int:
+        """
+        Запись отчета о дубликатах в JSONL
+
+        :return: Количество файлов-дубликатов (без учета оригиналов)
+        """
+        state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+        report_path = report_path or os.path.join(state_dir, 'duplicates.jsonl')
+        total = 0
+        with open(report_path, 'w', encoding='utf-8') as f:
+            for digest, paths in self.find_duplicates(entries):
+                f.write(json.dumps({'digest': digest, 'original': paths[0], 'duplicates': paths[1:]}) + '\n')
+                total += len(paths) - 1
+        logger.info(f"Отчет о дубликатах: {report_path}, дубликатов: {total}")
+        return total
+
+    def digests(self, paths: Iterable[str]) -> Dict[str, Tuple[int, str]]:
+        """Сохраненные (размер, дайджест) для путей, в том числе уже удаленных файлов"""
+        paths = list(paths)
+        result = {}
+        with self._connect() as conn:
+            for i in range(0, len(paths), 500):
+                part = paths[i:i + 500]
+                for path, size, digest in conn.execute(
+                    f"SELECT path, size, digest FROM hashes WHERE path IN ({','.join('?' * len(part))})", part
+                ):
+                    result[path] = (size, digest)
+        return result
+
+    def remove(self, paths: Iterable[str]):
+        """Удаление из индекса записей удаленных файлов"""
+        with self._connect() as conn:
+            conn.executemany('DELETE FROM hashes WHERE path = ?', ((p,) for p in paths))
@@ -0,0 +1,236 @@
+import os
+import json
+import logging
+import argparse
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from file_manifest import DEFAULT_STATE_DIR
+from json_state import load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+PARQUET_COLUMNS = ('id', 'data', 'annotations', 'predictions', 'created_at', 'updated_at')
+
+
+class JsonlWriter:
+    """Построчная запись задач в JSONL"""
+
+    def __init__(self, path: str, append: bool, offset: int = None):
+        """
+        :param append: Дописывать в существующий файл
+        :param offset: Размер файла после последней сохраненной страницы: хвост за ним
+                       (недописанная строка или страница, записанная до сбоя) отбрасывается
+        """
+        self.file = open(path, 'ab' if append else 'wb')
+        if append and offset is not None and offset < self.file.tell():
+            self.file.truncate(offset)
+            self.file.seek(offset)
+
+    def position(self) -> int:
+        """Размер записанного файла"""
+        return self.file.tell()
+
+    def write(self, tasks: List[Dict[str, Any]]):
+        for task in tasks:
+            self.file.write(json.dumps(task, ensure_ascii=False).encode('utf-8'))
+            self.file.write(b'\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """
+    Запись задач в Parquet по одной группе строк на страницу.
+    Вложенные поля (data, annotations, predictions) сохраняются как JSON строки.
+    """
+
+    def __init__(self, path: str, append: bool, offset: int = None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Для экспорта в Parquet установите pyarrow: pip install pyarrow")
+
+        if append and os.path.exists(path):
+            # Parquet нельзя дописать - продолжение экспорта пишется в отдельный файл
+            base, ext = os.path.splitext(path)
+            path = f"{base}.{datetime.now(timezone.utc):%Y%m%dT%H%M%S}{ext}"
+            logger.info(f"Продолжение экспорта в {path}")
+
+        self.pa = pa
+        self.schema = pa.schema([
+            ('id', pa.int64()),
+            ('data', pa.string()),
+            ('annotations', pa.string()),
+            ('predictions', pa.string()),
+            ('created_at', pa.string()),
+            ('updated_at', pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def position(self):
+        # Продолжение всегда пишется в новый файл - смещение не нужно
+        return None
+
+    def write(self, tasks: List[Dict[str, Any]]):
+        columns = {name: [] for name in PARQUET_COLUMNS}
+        for task in tasks:
+            columns['id'].append(task['id'])
+            for name in ('data', 'annotations', 'predictions'):
+                columns[name].append(json.dumps(task.get(name), ensure_ascii=False))
+            columns['created_at'].append(task.get('created_at'))
+            columns['updated_at'].append(task.get('updated_at'))
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {'jsonl': JsonlWriter, 'parquet': ParquetWriter}
+
+
+class AnnotationExporter:
+    """
+    Потоковый экспорт задач проекта с аннотациями.
+
+    Задачи читаются постранично и сразу записываются в файл, поэтому
+    потребление памяти не зависит от размера проекта. После каждой
+    страницы сохраняются ID последней задачи и размер файла - прерванный
+    экспорт продолжается с этого места в своем режиме, если пишется в тот же
+    файл, а недописанный хвост файла отбрасывается. Режим only_updated
+    дописывает в файл только задачи, измененные с момента предыдущего экспорта.
+    """
+
+    def __init__(self, ls_manager, project_id: int = None, page_size: int = None, state_path: str = None):
+        """
+        :param ls_manager: LabelStudioManager
+        :param project_id: ID проекта. Если не указан, используется текущий проект.
+        :param page_size: Задач на странице (EXPORT_PAGE_SIZE, по умолчанию 500)
+        :param state_path: Файл состояния (по умолчанию STATE_DIR/export_state_<project>.json)
+        """
+        self.ls_manager = ls_manager
+        self.project_id = project_id or ls_manager.get_project_id()
+        self.page_size = page_size or int(os.getenv('EXPORT_PAGE_SIZE', '500'))
+        state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+        self.state_path = state_path or os.path.join(state_dir, f'export_state_{self.project_id}.json')
+
+    def export(self, output_path: str, fmt: str = None, resume: bool = True, only_updated: bool = False) -> Dict[str, Any]:
+        """
+        Экспорт задач в файл
+
+        :param output_path: Файл экспорта
+        :param fmt: 'jsonl' или 'parquet' (по умолчанию по расширению файла)
+        :param resume: Продолжить с последней выгруженной задачи
+        :param only_updated: Выгрузить только задачи, обновленные после предыдущего экспорта
+        :return: Статистика экспорта
+        """
+        fmt = fmt or ('parquet' if output_path.endswith('.parquet') else 'jsonl')
+        if fmt not in WRITERS:
+            raise ValueError(f"Неподдерживаемый формат экспорта: {fmt}")
+
+        state = load_json(self.state_path, {})
+        run_started = datetime.now(timezone.utc).isoformat()
+
+        # Продолжать можно только прерванный экспорт в тот же файл
+        resume = resume and state.get('in_progress')
+        if resume and os.path.abspath(state.get('output') or '') != os.path.abspath(output_path):
+            logger.warning(
+                f"Прерванный экспорт писался в {state.get('output')}, а не в {output_path} - экспорт начинается заново"
+            )
+            resume = False
+
+        after_id = None
+        if resume:
+            # Прерванный экспорт продолжается в своем режиме и с той же точкой отсчета,
+            # иначе в файле остались бы пропуски
+            updated_since = state.get('updated_since')
+            after_id = state.get('last_task_id')
+            run_started = state.get('run_started') or run_started
+            if bool(updated_since) != bool(only_updated and state.get('last_run_started')):
+                logger.info(
+                    f"Продолжается прерванный {'инкрементальный' if updated_since else 'полный'} экспорт"
+                )
+        else:
+            updated_since = state.get('last_run_started') if only_updated else None
+
+        filters = []
+        if updated_since:
+            filters.append({
+                'filter': 'filter:tasks:updated_at',
+                'operator': 'greater',
+                'type': 'Datetime',
+                'value': updated_since
+            })
+
+        logger.info(
+            f"Экспорт проекта {self.project_id} в {output_path} ({fmt}), "
+            f"начиная с задачи {after_id or 0}, обновленные после: {updated_since}"
+        )
+
+        # Обновленные задачи дописываются к предыдущему экспорту (актуальна последняя запись задачи)
+        writer = WRITERS[fmt](
+            output_path, append=bool(after_id or updated_since), offset=state.get('offset') if resume else None
+        )
+        state.update(
+            in_progress=True,
+            output=output_path,
+            run_started=run_started,
+            updated_since=updated_since,
+            last_task_id=after_id or 0,
+            offset=writer.position()
+        )
+        save_json(self.state_path, state)
+
+        exported = 0
+        annotations = 0
+        try:
+            for page in self.ls_manager.iter_task_pages(
+                self.project_id, page_size=self.page_size, filters=filters, after_id=after_id
+            ):
+                annotations += self._flush(writer, page, state)
+                exported += len(page)
+        finally:
+            writer.close()
+
+        state.update(in_progress=False, last_run_started=run_started)
+        save_json(self.state_path, state)
+
+        stats = {'tasks': exported, 'annotations': annotations, 'output': output_path}
+        logger.info(f"Экспорт завершен: {stats}")
+        return stats
+
+    def _flush(self, writer, page: List[Dict[str, Any]], state: Dict[str, Any]) -> int:
+        writer.write(page)
+        state.update(last_task_id=page[-1]['id'], offset=writer.position())
+        save_json(self.state_path, state)
+        return sum(len(task.get('annotations') or []) for task in page)
+
+
+def main():
+    from label_studio_client import LabelStudioManager
+
+    parser = argparse.ArgumentParser(description='Потоковый экспорт аннотаций Label Studio')
+    parser.add_argument('output', help='Файл экспорта (.jsonl или .parquet)')
+    parser.add_argument('--format', choices=sorted(WRITERS), default=None)
+    parser.add_argument('--no-resume', action='store_true', help='Начать экспорт заново')
+    parser.add_argument('--updated-only', action='store_true', help='Только задачи, измененные после прошлого экспорта')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    LabelStudioManager().export_annotations(
+        args.output,
+        fmt=args.format,
+        resume=not args.no_resume,
+        only_updated=args.updated_only
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import os
+import logging
+import sqlite3
+from collections import namedtuple
+from typing import Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Описание файла в манифесте: путь относительно корня, размер, mtime (нс) и inode
+FileEntry = namedtuple('FileEntry', ['path', 'size', 'mtime_ns', 'inode'])
+
+# Результат сравнения текущего состояния директории с манифестом
+ManifestDelta = namedtuple('ManifestDelta', ['added', 'changed', 'removed'])
+
+DEFAULT_STATE_DIR = '/app/state'
+
+
+class FileManifest:
+    """
+    Персистентный манифест файлов хранилища на базе SQLite.
+
+    Хранит путь, размер, mtime и inode каждого файла, что позволяет
+    на каждом запуске вычислять только добавленные, измененные и удаленные файлы.
+    """
+
+    BATCH_SIZE = 10000
+
+    def __init__(self, db_path: str = None):
+        state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+        self.db_path = db_path or os.path.join(state_dir, 'file_manifest.sqlite')
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    scope TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    PRIMARY KEY (scope, path)
+                ) WITHOUT ROWID
+                """
+            )
+
+    def count(self, scope: str) -> int:
+        """Количество файлов, записанных в манифест для указанной области"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT COUNT(*) FROM files WHERE scope = ?', (scope,)).fetchone()
+            return row[0]
+
+    def is_empty(self, scope: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute('SELECT 1 FROM files WHERE scope = ? LIMIT 1', (scope,)).fetchone()
+            return row is None
+
+    def diff(self, entries: Iterable[FileEntry], scope: str) -> ManifestDelta:
+        """
+        Сравнение текущего набора файлов с манифестом.
+
+        Текущий набор потоково загружается во временную таблицу, поэтому
+        память не зависит от размера датасета - только от размера изменений.
+
+        :param entries: Итератор FileEntry текущего состояния директории
+        :param scope: Область манифеста (например, путь хранилища)
+        :return: ManifestDelta со списками added/changed (FileEntry) и removed (FileEntry из манифеста)
+        """
+        conn = self._connect()
+        try:
+            conn.execute(
+                """
+                CREATE TEMP TABLE scan (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            self._insert_batched(conn, 'INSERT OR REPLACE INTO scan VALUES (?, ?, ?, ?)', entries)
+
+            added = [FileEntry(*row) for row in conn.execute(
+                """
+                SELECT s.path, s.size, s.mtime_ns, s.inode FROM scan s
+                LEFT JOIN files f ON f.scope = ? AND f.path = s.path
+                WHERE f.path IS NULL
+                """, (scope,)
+            )]
+            changed = [FileEntry(*row) for row in conn.execute(
+                """
+                SELECT s.path, s.size, s.mtime_ns, s.inode FROM scan s
+                JOIN files f ON f.scope = ? AND f.path = s.path
+                WHERE f.size != s.size OR f.mtime_ns != s.mtime_ns OR f.inode != s.inode
+                """, (scope,)
+            )]
+            removed = [FileEntry(*row) for row in conn.execute(
+                """
+                SELECT f.path, f.size, f.mtime_ns, f.inode FROM files f
+                WHERE f.scope = ? AND NOT EXISTS (SELECT 1 FROM scan s WHERE s.path = f.path)
+                """, (scope,)
+            )]
+
+            logger.info(
+                f"Изменения в манифесте '{scope}': добавлено {len(added)}, "
+                f"изменено {len(changed)}, удалено {len(removed)}"
+            )
+            return ManifestDelta(added, changed, removed)
+        finally:
+            conn.close()
+
+    def diff_paths(self, entries: Iterable[FileEntry], missing: Iterable[str], scope: str) -> ManifestDelta:
+        """
+        Дельта только для указанных путей (например, по событиям файловой системы)
+
+        :param entries: FileEntry существующих файлов
+        :param missing: Пути файлов, которых больше нет на диске
+        :param scope: Область манифеста
+        """
+        entries = list(entries)
+        missing = list(missing)
+        paths = [e.path for e in entries] + missing
+        known = {}
+        with self._connect() as conn:
+            for i in range(0, len(paths), 500):
+                part = paths[i:i + 500]
+                for row in conn.execute(
+                    f"SELECT path, size, mtime_ns, inode FROM files "
+                    f"WHERE scope = ? AND path IN ({','.join('?' * len(part))})",
+                    [scope] + part
+                ):
+                    known[row[0]] = FileEntry(*row)
+
+        added = [e for e in entries if e.path not in known]
+        changed = [e for e in entries if e.path in known and known[e.path] != e]
+        removed = [known[path] for path in missing if path in known]
+        return ManifestDelta(added, changed, removed)
+
+    def apply(self, delta: ManifestDelta, scope: str):
+        """Фиксация изменений в манифесте после успешной отправки в Label Studio"""
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                ((scope,) + tuple(e) for e in list(delta.added) + list(delta.changed))
+            )
+            conn.executemany(
+                'DELETE FROM files WHERE scope = ? AND path = ?',
+                ((scope, e.path) for e in delta.removed)
+            )
+        logger.debug(f"Манифест '{scope}' обновлен")
+
+    def rebuild(self, entries: Iterable[FileEntry], scope: str) -> int:
+        """
+        Полная перезапись манифеста для области (после полной синхронизации).
+
+        :return: Количество записанных файлов
+        """
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM files WHERE scope = ?', (scope,))
+            total = self._insert_batched(
+                conn,
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                ((scope,) + tuple(e) for e in entries)
+            )
+            conn.commit()
+            logger.info(f"Манифест '{scope}' перестроен: {total} файлов")
+            return total
+        finally:
+            conn.close()
+
+    def promote(self, source_scope: str, scope: str):
+        """
+        Замена манифеста области записями другой области одной транзакцией
+        (снимок файлов, сделанный до полной синхронизации, становится манифестом после нее)
+        """
+        with self._connect() as conn:
+            conn.execute('DELETE FROM files WHERE scope = ?', (scope,))
+            conn.execute('UPDATE files SET scope = ? WHERE scope = ?', (scope, source_scope))
+        logger.info(f"Манифест '{scope}' заменен снимком '{source_scope}'")
+
+    def entries(self, scope: str) -> Iterator[FileEntry]:
+        """Потоковое чтение записей манифеста"""
+        conn = self._connect()
+        try:
+            for row in conn.execute(
+                'SELECT path, size, mtime_ns, inode FROM files WHERE scope = ? ORDER BY path', (scope,)
+            ):
+                yield FileEntry(*row)
+        finally:
+            conn.close()
+
+    def _insert_batched(self, conn: sqlite3.Connection, sql: str, rows: Iterable) -> int:
+        total = 0
+        batch: List = []
+        for row in rows:
+            batch.append(tuple(row))
+            if len(batch) >= self.BATCH_SIZE:
+                conn.executemany(sql, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            conn.executemany(sql, batch)
+            total += len(batch)
+        return total
@@ -0,0 +1,207 @@
+import os
+import re
+import time
+import queue
+import logging
+import threading
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from file_manifest import FileEntry
+from metrics import FILES_SCANNED, SCAN_RATE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IMAGE_EXTENSIONS = '.jpg,.jpeg,.png'
+
+_DONE = object()
+
+
+def build_matcher(
+    extensions: Optional[Iterable[str]] = None,
+    regex_filter: Optional[str] = None
+) -> Callable[[str], bool]:
+    """
+    Построение предкомпилированного фильтра имен файлов.
+
+    Расширения берутся из ALLOWED_IMAGE_EXTENSIONS, если не переданы явно.
+    regex_filter применяется к имени файла так же, как это делает
+    локальное хранилище Label Studio (re.match по имени).
+
+    :param extensions: Допустимые расширения (с точкой)
+    :param regex_filter: Регулярное выражение хранилища
+    :return: Функция name -> bool
+    """
+    if extensions is None:
+        extensions = os.getenv('ALLOWED_IMAGE_EXTENSIONS', DEFAULT_IMAGE_EXTENSIONS).split(',')
+    suffixes = tuple(ext.strip().lower() for ext in extensions if ext.strip())
+    regex = re.compile(regex_filter) if regex_filter else None
+
+    def match(name: str) -> bool:
+        if suffixes and not name.lower().endswith(suffixes):
+            return False
+        return regex is None or regex.match(name) is not None
+
+    return match
+
+
+class FileScanner:
+    """
+    Потоковый сканер директорий на базе os.scandir.
+
+    Вложенные директории обходятся параллельно в пуле потоков, найденные файлы
+    передаются потребителю пачками через ограниченную очередь: обработка может
+    начинаться до окончания обхода, а память не зависит от количества файлов.
+
+    Ошибки чтения директорий и файлов не прерывают обход, но считаются в errors:
+    при errors > 0 отсутствие файла в результате не означает, что он удален.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        base: str = None,
+        matcher: Callable[[str], bool] = None,
+        workers: int = None,
+        batch_size: int = 1000,
+        queue_size: int = 64
+    ):
+        """
+        :param root: Директория для обхода
+        :param base: Директория, относительно которой строятся пути (по умолчанию root)
+        :param matcher: Фильтр имен файлов (см. build_matcher). None - все файлы.
+        :param workers: Количество потоков обхода (SCAN_WORKERS, по умолчанию 8)
+        :param batch_size: Размер пачки файлов, передаваемой потребителю
+        :param queue_size: Максимальное количество пачек в очереди
+        """
+        self.root = root
+        self.base = base or root
+        self.matcher = matcher
+        self.workers = workers or int(os.getenv('SCAN_WORKERS', '8'))
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.errors = 0
+
+    def __iter__(self) -> Iterator[FileEntry]:
+        return self.scan()
+
+    def scan(self) -> Iterator[FileEntry]:
+        """Генератор FileEntry для всех подходящих файлов"""
+        dirs: queue.Queue = queue.Queue()
+        out: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        lock = threading.Lock()
+        pending = [1]
+        self.errors = 0
+        dirs.put(self.root)
+
+        def worker():
+            while not stop.is_set():
+                try:
+                    path = dirs.get(timeout=0.05)
+                except queue.Empty:
+                    with lock:
+                        if pending[0] == 0:
+                            return
+                    continue
+                try:
+                    self._scan_dir(path, dirs, out, stop, lock, pending)
+                finally:
+                    with lock:
+                        pending[0] -= 1
+
+        threads = [
+            threading.Thread(target=worker, name=f'scanner-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        def finisher():
+            for thread in threads:
+                thread.join()
+            self._put(out, _DONE, stop)
+
+        threading.Thread(target=finisher, name='scanner-finisher', daemon=True).start()
+
+        started = time.monotonic()
+        scanned = 0
+        try:
+            while True:
+                batch = out.get()
+                if batch is _DONE:
+                    elapsed = time.monotonic() - started
+                    if elapsed > 0:
+                        SCAN_RATE.set(round(scanned / elapsed, 1))
+                    return
+                scanned += len(batch)
+                FILES_SCANNED.inc(len(batch))
+                yield from batch
+        finally:
+            # Потребитель мог прервать итерацию - останавливаем обход
+            stop.set()
+
+    def _scan_dir(self, path, dirs, out, stop, lock, pending):
+        batch = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if stop.is_set():
+                        return
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            with lock:
+                                pending[0] += 1
+                            dirs.put(entry.path)
+                            continue
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        if self.matcher is not None and not self.matcher(entry.name):
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError as e:
+                        logger.warning(f"Не удалось прочитать {entry.path}: {e}")
+                        with lock:
+                            self.errors += 1
+                        continue
+
+                    batch.append(FileEntry(
+                        os.path.relpath(entry.path, self.base).replace(os.sep, '/'),
+                        st.st_size,
+                        st.st_mtime_ns,
+                        st.st_ino
+                    ))
+                    if len(batch) >= self.batch_size:
+                        self._put(out, batch, stop)
+                        batch = []
+        except OSError as e:
+            logger.error(f"Ошибка чтения директории {path}: {e}")
+            with lock:
+                self.errors += 1
+        if batch:
+            self._put(out, batch, stop)
+
+    @staticmethod
+    def _put(out: queue.Queue, item, stop: threading.Event):
+        # Ограниченная очередь дает обратное давление на потоки обхода
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+
+def count_entries(path: str, sample_size: int = 10) -> Tuple[int, list]:
+    """
+    Подсчет элементов директории без загрузки всего списка в память.
+
+    :return: (количество элементов, первые sample_size имен)
+    """
+    count = 0
+    sample = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if count < sample_size:
+                sample.append(entry.name)
+            count += 1
+    return count, sample
@@ -0,0 +1,228 @@
+import os
+import json
+import math
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from file_manifest import DEFAULT_STATE_DIR
+from task_importer import chunked
+from task_paths import TaskPathMap, image_path_from_task
+
+logger = logging.getLogger(__name__)
+
+MIN_CAPACITY = 100000
+
+
+class BloomFilter:
+    """
+    Фильтр Блума для строковых ключей: O(1) проверка, ~1.8 байта на ключ при 0.1% ложных срабатываний
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001, bits: bytearray = None, count: int = 0):
+        """
+        :param capacity: Ожидаемое количество ключей
+        :param error_rate: Доля ложноположительных ответов при заполнении до capacity
+        """
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.num_bits = max(int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))), 8)
+        self.num_hashes = max(int(round(self.num_bits / self.capacity * math.log(2))), 1)
+        size = (self.num_bits + 7) // 8
+        if bits is not None and len(bits) != size:
+            raise ValueError(f"Размер битового массива {len(bits)} не соответствует {size}")
+        self.bits = bits if bits is not None else bytearray(size)
+        self.count = count
+
+    def _positions(self, key: str) -> Iterator[int]:
+        # Двойное хеширование: h1 + i * h2 (Kirsch-Mitzenmacher)
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def dump(self, path: str, **meta: Any):
+        """Атомарная запись: строка JSON заголовка и битовый массив"""
+        header = dict(meta, capacity=self.capacity, error_rate=self.error_rate, count=self.count)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple[Optional['BloomFilter'], Dict[str, Any]]:
+        """
+        :return: (фильтр, заголовок) или (None, {}) при отсутствии или повреждении файла
+        """
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                bits = bytearray(f.read())
+            bloom = cls(header['capacity'], header['error_rate'], bits=bits, count=header['count'])
+            return bloom, header
+        except FileNotFoundError:
+            return None, {}
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Не удалось прочитать индекс {path}: {e}")
+            return None, {}
+
+
+class ImportedPathIndex:
+    """
+    Индекс путей изображений, для которых в проекте уже есть задачи.
+
+    Точные данные хранит TaskPathMap (SQLite, пополняется постраничным
+    обходом задач с ID больше последнего обработанного). Фильтр Блума
+    в памяти отвечает на вопрос "новый ли файл" за O(1) без обращения
+    к базе; в SQLite проверяются только положительные ответы фильтра.
+    Фильтр сохраняется рядом с картой и пересобирается локально, если
+    они разошлись, а также после полной перестройки карты (удаленные
+    задачи исчезают из обоих, см. TaskPathMap.rebuild_interval).
+    """
+
+    def __init__(
+        self,
+        ls_manager,
+        project_id: int = None,
+        path: str = None,
+        error_rate: float = None,
+        key: Callable[[Dict[str, Any]], Optional[str]] = image_path_from_task,
+        refresh_interval: float = None
+    ):
+        """
+        :param ls_manager: LabelStudioManager
+        :param project_id: ID проекта. Если не указан, используется текущий проект.
+        :param path: Файл фильтра (по умолчанию STATE_DIR/imported_paths_<project>.bloom)
+        :param error_rate: Доля ложных срабатываний фильтра (IMPORT_INDEX_ERROR_RATE, по умолчанию 0.001)
+        :param key: Путь файла из задачи; задачи без пути импортируются всегда
+        :param refresh_interval: Как часто import_tasks загружает задачи, созданные в обход процесса, сек
+                                 (IMPORT_INDEX_REFRESH_INTERVAL, по умолчанию 60, 0 - перед каждым импортом)
+        """
+        self.task_map = TaskPathMap(ls_manager, project_id)
+        self.project_id = self.task_map.project_id
+        state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+        self.path = path or os.path.join(state_dir, f'imported_paths_{self.project_id}.bloom')
+        self.error_rate = error_rate or float(os.getenv('IMPORT_INDEX_ERROR_RATE', '0.001'))
+        self.key = key
+        if refresh_interval is None:
+            refresh_interval = float(os.getenv('IMPORT_INDEX_REFRESH_INTERVAL', '60'))
+        self.refresh_interval = refresh_interval
+        self.refreshed_at: Optional[float] = None
+        self._lock = threading.RLock()
+        self.bloom = self._load()
+
+    def _load(self) -> BloomFilter:
+        bloom, header = BloomFilter.load(self.path)
+        rows = self.task_map.count()
+        if bloom is None or header.get('rows') != rows or bloom.error_rate != self.error_rate:
+            return self._rebuild(rows)
+        return bloom
+
+    def _rebuild(self, rows: int = None) -> BloomFilter:
+        """Сборка фильтра из карты путей (без запросов к серверу)"""
+        rows = self.task_map.count() if rows is None else rows
+        bloom = BloomFilter(max(rows * 2, MIN_CAPACITY), self.error_rate)
+        for path, _ in self.task_map.items():
+            bloom.add(path)
+        logger.info(f"Индекс импортированных файлов проекта {self.project_id}: {rows} путей")
+        return bloom
+
+    def _add_paths(self, paths: Iterable[str]):
+        with self._lock:
+            for path in paths:
+                self.bloom.add(path)
+            if self.bloom.count > self.bloom.capacity:
+                # Фильтр переполнен - доля ложных срабатываний растет
+                self.bloom = self._rebuild()
+
+    def refresh(self) -> int:
+        """Загрузка задач, созданных после последнего обновления (в том числе синхронизацией хранилища)"""
+        with self._lock:
+            if self.task_map.rebuild_due():
+                # Полная перестройка карты убирает удаленные задачи - фильтр собирается заново
+                added = self.task_map.rebuild()
+                self.bloom = self._rebuild()
+                self.save()
+            else:
+                added = self.task_map.refresh(on_rows=lambda rows: self._add_paths(path for path, _ in rows))
+                if added:
+                    self.save()
+            self.refreshed_at = time.monotonic()
+            return added
+
+    def refresh_if_stale(self) -> int:
+        """refresh(), если последнее обновление старше refresh_interval (задачи этого процесса учитывает record)"""
+        with self._lock:
+            if self.refreshed_at is not None and time.monotonic() - self.refreshed_at < self.refresh_interval:
+                return 0
+            return self.refresh()
+
+    def save(self):
+        with self._lock:
+            self.bloom.dump(self.path, project=self.project_id, rows=self.task_map.count())
+
+    def existing(self, paths: List[str]) -> Dict[str, int]:
+        """ID задач для уже импортированных путей из списка"""
+        candidates = [path for path in paths if path in self.bloom]
+        return self.task_map.lookup(candidates) if candidates else {}
+
+    def created_ids(self, tasks: List[Dict[str, Any]]) -> Optional[List[Optional[int]]]:
+        """
+        ID задач чанка, если чанк уже импортирован (импорт выполняется одной транзакцией),
+        иначе None. Используется перед повтором POST после потерянного ответа.
+        """
+        paths = [self.key(task) for task in tasks]
+        keyed = [path for path in paths if path]
+        if not keyed:
+            return None
+        self.refresh()
+        existing = self.task_map.lookup(keyed)
+        if len(existing) < len(set(keyed)):
+            return None
+        return [existing.get(path) if path else None for path in paths]
+
+    def filter_new(
+        self,
+        tasks: Iterable[Dict[str, Any]],
+        stats: Dict[str, int] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Задачи для файлов, которых еще нет в проекте (повторы внутри потока тоже пропускаются)
+
+        :param stats: Словарь, в котором считаются пропущенные задачи ('skipped')
+        """
+        stats = stats if stats is not None else {}
+        stats.setdefault('skipped', 0)
+        seen = set()
+        for batch in chunked(tasks, batch_size):
+            paths = [self.key(task) for task in batch]
+            existing = self.existing([path for path in paths if path])
+            for task, path in zip(batch, paths):
+                if path and (path in existing or path in seen):
+                    stats['skipped'] += 1
+                    continue
+                if path:
+                    seen.add(path)
+                yield task
+        if stats['skipped']:
+            logger.info(f"Пропущено уже импортированных задач: {stats['skipped']}")
+
+    def record(self, tasks: List[Dict[str, Any]], task_ids: List[int]):
+        """Учет созданных задач (on_chunk импорта); ID задач идут в порядке задач"""
+        rows = [(path, task_id) for task, task_id in zip(tasks, task_ids) for path in [self.key(task)] if path]
+        self.task_map.add(rows, created_ids=[task_id for task_id in task_ids if task_id is not None])
+        if rows:
+            self._add_paths(path for path, _ in rows)
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import shutil
+import logging
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+from file_manifest import DEFAULT_STATE_DIR, FileEntry
+from task_importer import chunked
+
+logger = logging.getLogger(__name__)
+
+# valid - количество исправных файлов, invalid - пары (файл, описание ошибки),
+# pending - файлы, которые еще могут дописываться (проверяются при следующем запуске)
+IntegrityResult = namedtuple('IntegrityResult', ['valid', 'invalid', 'pending'])
+
+
+def check_image(path: str, full_decode: bool = True) -> Tuple[str, Optional[str]]:
+    """
+    Проверка файла изображения: структура и декодирование (Pillow)
+
+    Маркер конца файла не проверяется: камеры и редакторы пишут после него
+    служебные данные, и такие исправные файлы попадали бы в карантин.
+
+    :param full_decode: Декодировать изображение полностью (находит обрезанные файлы)
+    :return: (путь, описание ошибки или None)
+    """
+    try:
+        size = os.path.getsize(path)
+        if size == 0:
+            return path, 'пустой файл'
+
+        with Image.open(path) as image:
+            image.verify()
+        if full_decode:
+            # verify() не декодирует данные, а объект после него использовать нельзя
+            with Image.open(path) as image:
+                image.load()
+        return path, None
+    except Exception as e:
+        return path, f"{type(e).__name__}: {e}"
+
+
+class ImageIntegrityChecker:
+    """
+    Проверка изображений перед импортом и перенос поврежденных файлов в карантин.
+
+    Файлы проверяются в пуле процессов, результаты сохраняются в SQLite
+    с ключом (путь, размер, mtime), поэтому при повторных запусках
+    проверяются только новые и измененные файлы. Файлы, измененные
+    меньше grace_period секунд назад, не проверяются: их может еще
+    дописывать аугментация, и в карантин попал бы исправный файл.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        quarantine_dir: str = None,
+        db_path: str = None,
+        workers: int = None,
+        full_decode: bool = None,
+        batch_size: int = 1000,
+        grace_period: float = None
+    ):
+        """
+        :param root: Директория, относительно которой заданы пути FileEntry
+        :param quarantine_dir: Директория карантина (QUARANTINE_DIR, по умолчанию root/quarantine)
+        :param db_path: Кеш результатов (по умолчанию STATE_DIR/image_checks.sqlite)
+        :param workers: Количество процессов (INTEGRITY_WORKERS, по умолчанию число CPU)
+        :param full_decode: Полное декодирование (INTEGRITY_FULL_DECODE, по умолчанию true)
+        :param batch_size: Количество файлов, обрабатываемых за один проход
+        :param grace_period: Возраст файла (по mtime), после которого он проверяется, сек
+                             (INTEGRITY_GRACE_PERIOD, по умолчанию 60)
+        """
+        state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+        self.root = root
+        self.quarantine_dir = quarantine_dir or os.getenv('QUARANTINE_DIR') or os.path.join(root, 'quarantine')
+        self.db_path = db_path or os.path.join(state_dir, 'image_checks.sqlite')
+        self.workers = workers or int(os.getenv('INTEGRITY_WORKERS', '0')) or os.cpu_count() or 1
+        if full_decode is None:
+            full_decode = os.getenv('INTEGRITY_FULL_DECODE', 'true').lower() == 'true'
+        self.full_decode = full_decode
+        self.batch_size = batch_size
+        if grace_period is None:
+            grace_period = float(os.getenv('INTEGRITY_GRACE_PERIOD', '60'))
+        self.grace_period = grace_period
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS checks (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    error TEXT
+                ) WITHOUT ROWID
+                """
+            )
+
+    def _lookup(self, conn: sqlite3.Connection, batch: List[FileEntry]) -> Dict[str, Optional[str]]:
+        """Результаты из кеша для файлов, не изменившихся с момента проверки"""
+        cached = {}
+        for i in range(0, len(batch), 500):
+            part = batch[i:i + 500]
+            by_path = {e.path: e for e in part}
+            rows = conn.execute(
+                f"SELECT path, size, mtime_ns, error FROM checks WHERE path IN ({','.join('?' * len(part))})",
+                list(by_path)
+            )
+            for path, size, mtime_ns, error in rows:
+                entry = by_path[path]
+                if entry.size == size and entry.mtime_ns == mtime_ns:
+                    cached[path] = error
+        return cached
+
+    def check(self, entries: Iterable[FileEntry]) -> IntegrityResult:
+        """
+        Разделение файлов на исправные и поврежденные
+
+        Исправные файлы только подсчитываются, поэтому память зависит
+        от количества поврежденных и недавно измененных файлов.
+        """
+        valid = 0
+        invalid: List[Tuple[FileEntry, str]] = []
+        pending: List[FileEntry] = []
+        checked = 0
+        settled_before = time.time_ns() - int(self.grace_period * 1e9)
+        conn = self._connect()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for batch in chunked(entries, self.batch_size):
+                    pending.extend(e for e in batch if e.mtime_ns > settled_before)
+                    batch = [e for e in batch if e.mtime_ns <= settled_before]
+                    if not batch:
+                        continue
+                    cached = self._lookup(conn, batch)
+                    misses = [e for e in batch if e.path not in cached]
+
+                    results: Dict[str, Optional[str]] = dict(cached)
+                    if misses:
+                        full_paths = [os.path.join(self.root, e.path) for e in misses]
+                        chunksize = max(1, len(full_paths) // (self.workers * 4))
+                        checker = partial(check_image, full_decode=self.full_decode)
+                        for entry, (_, error) in zip(misses, pool.map(checker, full_paths, chunksize=chunksize)):
+                            results[entry.path] = error
+                        with conn:
+                            conn.executemany(
+                                'INSERT OR REPLACE INTO checks VALUES (?, ?, ?, ?)',
+                                ((e.path, e.size, e.mtime_ns, results[e.path]) for e in misses)
+                            )
+                        checked += len(misses)
+
+                    for entry in batch:
+                        error = results[entry.path]
+                        if error is None:
+                            valid += 1
+                        else:
+                            invalid.append((entry, error))
+        finally:
+            conn.close()
+
+        logger.info(
+            f"Проверка изображений: {valid + len(invalid)} файлов "
+            f"(проверено {checked}, из кеша {valid + len(invalid) - checked}), поврежденных {len(invalid)}, "
+            f"отложено недавно измененных {len(pending)}"
+        )
+        return IntegrityResult(valid, invalid, pending)
+
+    def quarantine(self, invalid: Iterable[Tuple[FileEntry, str]]) -> List[str]:
+        """
+        Перенос поврежденных файлов в карантин с сохранением относительного пути
+
+        :return: Пути (относительно root) перенесенных файлов
+        """
+        moved = []
+        report_path = os.path.join(self.quarantine_dir, 'quarantine.jsonl')
+        for entry, error in invalid:
+            source = os.path.join(self.root, entry.path)
+            target = os.path.join(self.quarantine_dir, entry.path)
+            if os.path.exists(target):
+                target = f"{target}.{entry.mtime_ns}"
+            try:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(source, target)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.error(f"Не удалось перенести {entry.path} в карантин: {e}")
+                continue
+            logger.warning(f"Файл {entry.path} перенесен в карантин: {error}")
+            moved.append(entry.path)
+            with open(report_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({
+                    'path': entry.path,
+                    'quarantine_path': target,
+                    'size': entry.size,
+                    'error': error,
+                    'time': time.time()
+                }, ensure_ascii=False) + '\n')
+
+        if moved:
+            with self._connect() as conn:
+                conn.executemany('DELETE FROM checks WHERE path = ?', ((p,) for p in moved))
+        return moved
+
+    def validate(self, entries: Iterable[FileEntry]) -> IntegrityResult:
+        """Проверка и перенос поврежденных файлов в карантин"""
+        result = self.check(entries)
+        if result.invalid:
+            self.quarantine(result.invalid)
+        return result
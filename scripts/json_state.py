@@ -0,0 +1,73 @@
+import os
+import json
+import logging
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def load_json(path: str, default: Any = None) -> Any:
+    """Чтение JSON файла состояния. При отсутствии или повреждении возвращает default."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не удалось прочитать файл состояния {path}: {e}")
+        return default
+
+
+def save_json(path: str, data: Any):
+    """
+    Атомарная запись JSON файла состояния (через временный файл и os.replace)
+
+    Временный файл у каждой записи свой, поэтому одновременные записи
+    не портят друг другу данные (но последняя запись побеждает, см. update_json).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        'w', encoding='utf-8', dir=directory, prefix=f'{os.path.basename(path)}.', suffix='.tmp', delete=False
+    ) as f:
+        tmp_path = f.name
+        try:
+            json.dump(data, f, ensure_ascii=False)
+        except BaseException:
+            f.close()
+            os.unlink(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Межпроцессная блокировка файла состояния (flock на соседнем .lock файле)"""
+    import fcntl
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def update_json(path: str, update: Callable[[Any], bool], default: Any = None) -> Any:
+    """
+    Изменение JSON файла состояния, который пишут несколько процессов
+
+    Файл перечитывается под блокировкой, update изменяет прочитанные данные
+    и возвращает True, если их нужно сохранить, - изменения других процессов
+    при этом не теряются.
+
+    :return: Актуальные данные файла
+    """
+    with _file_lock(path):
+        data = load_json(path, default)
+        if update(data):
+            save_json(path, data)
+        return data
@@ -1,19 +1,56 @@
-from label_studio_sdk import Client
 import logging
-from typing import Dict, Any, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
+from typing import TYPE_CHECKING, Dict, Any, Optional
+from requests import HTTPError
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 import os
 from dotenv import load_dotenv
 import time
 import subprocess
 import json
+from task_importer import BulkTaskImporter, prefetch
+from project_index import get_project_index, normalize_name
+from sync_jobs import StorageSyncJob
+from exporter import AnnotationExporter
+from import_index import ImportedPathIndex
+from scheduler import RequestScheduler, get_scheduler
+from resilience import Resilience, get_resilience, is_transient
+from metrics import IMPORT_RATE, TASKS_IMPORTED, count_retry, endpoint_label, observe_request
+
+if TYPE_CHECKING:
+    from label_studio_sdk import Client
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+LABEL_CONFIG = """
+        <View>
+            <Image name="image" value="$image"/>
+            <Choices name="choice" toName="image">
+                <Choice value="drone"/>
+                <Choice value="not_drone"/>
+            </Choices>
+        </View>
+        """
+
 class LabelStudioManager:
-    def __init__(self, url: str = None, api_key: str = None):
+    def __init__(
+        self,
+        url: str = None,
+        api_key: str = None,
+        project_name: str = None,
+        client: 'Client' = None,
+        label_config: str = None,
+        project_id: int = None,
+        scheduler: RequestScheduler = None,
+        resilience: Resilience = None
+    ):
+        """
+        :param project_id: Известный ID проекта (из сохраненного состояния) - поиск проекта
+                           на сервере не выполняется
+        :param scheduler: Планировщик запросов (по умолчанию общий для процесса, см. get_scheduler)
+        :param resilience: Политика повторов и размыкатель цепи (по умолчанию общие, см. get_resilience)
+        """
         # Проверка конфигурации перед инициализацией
         self.validate_env_config()
 
@@ -24,9 +61,55 @@ class LabelStudioManager:
         if not self.url or not self.api_key:
             raise ValueError("URL и API ключ должны быть установлены в .env")
         
-        self.client = self._initialize_client()
-        self.project_name = os.getenv('LABEL_STUDIO_PROJECT_NAME', 'Default Project')
-        self.project = self._get_or_create_project()
+        # Клиент и планировщик могут быть общими для нескольких менеджеров (один пул соединений)
+        self.scheduler = scheduler or get_scheduler()
+        self.resilience = resilience or get_resilience()
+        self.client = client or self._initialize_client()
+        self.project_name = project_name or os.getenv('LABEL_STUDIO_PROJECT_NAME', 'Default Project')
+        self.label_config = label_config
+        self.project_index = get_project_index()
+        self._import_indexes: Dict[int, ImportedPathIndex] = {}
+        if project_id:
+            self.project = {'id': project_id, 'title': self.project_name}
+        else:
+            self.project = self._get_or_create_project()
+
+    def for_project(self, project_name: str, label_config: str = None) -> 'LabelStudioManager':
+        """Менеджер другого проекта, использующий тот же клиент и пул соединений"""
+        return LabelStudioManager(
+            self.url, self.api_key, project_name=project_name, client=self.client, label_config=label_config,
+            scheduler=self.scheduler, resilience=self.resilience
+        )
+
+    def make_request(self, method: str, url: str, **kwargs):
+        """
+        Единая точка запросов к REST API Label Studio (размыкатель цепи, повторы GET,
+        планировщик запросов и метрики по эндпоинтам)
+
+        Параметры те же, что у Client.make_request (json, params, timeout, raise_exceptions).
+        """
+        name = f"{method} {endpoint_label(url)}"
+        return self.resilience.call(method, name, lambda: self._send(method, url, **kwargs))
+
+    def _send(self, method: str, url: str, **kwargs):
+        """Одна попытка запроса"""
+        ticket = self.scheduler.acquire(method, url) if self.scheduler else None
+        started = time.perf_counter()
+        status = 'error'
+        retry_after = None
+        try:
+            response = self.client.make_request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        except HTTPError as e:
+            if e.response is not None:
+                status = e.response.status_code
+                retry_after = e.response.headers.get('Retry-After')
+            raise
+        finally:
+            observe_request(method, url, status, time.perf_counter() - started)
+            if ticket:
+                self.scheduler.release(ticket, status, retry_after)
 
     @classmethod
     def validate_env_config(cls):
@@ -59,8 +142,17 @@ class LabelStudioManager:
             logger.error(f"Ошибка подключения к Label Studio: {e}")
             return False
 
-    @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=2, min=4, max=30))
-    def _initialize_client(self) -> Client:
+    @retry(
+        stop=stop_after_attempt(5),
+        wait=wait_random_exponential(multiplier=0.1, max=2),
+        retry=retry_if_exception(is_transient),
+        before_sleep=count_retry,
+        reraise=True
+    )
+    def _initialize_client(self) -> 'Client':
+        # SDK импортируется лениво: импорт занимает заметную часть времени запуска
+        from label_studio_sdk import Client
+
         try:
             # Используем только URL и API ключ
             client = Client(
@@ -116,9 +208,9 @@ class LabelStudioManager:
                 return ''
             
             # Нормализация
-            normalized_name = name.strip().lower().replace(' ', '')
+            normalized_name = normalize_name(name)
             
-            logger.debug(f"Нормализация имени: '{name}' -> '{normalized_name}'")
+            logger.debug("Нормализация имени: '%s' -> '%s'", name, normalized_name)
             return normalized_name
         
         except Exception as e:
@@ -146,9 +238,8 @@ class LabelStudioManager:
             result = normalized_project_name == normalized_target_name
             
             logger.debug(
-                f"Сравнение имен проектов: "
-                f"'{project_name}' (normalized: '{normalized_project_name}') vs "
-                f"'{target_name}' (normalized: '{normalized_target_name}') = {result}"
+                "Сравнение имен проектов: '%s' (normalized: '%s') vs '%s' (normalized: '%s') = %s",
+                project_name, normalized_project_name, target_name, normalized_target_name, result
             )
             
             return result
@@ -158,25 +249,24 @@ class LabelStudioManager:
             return False
 
     def _get_or_create_project(self) -> Any:
-        """Получение или создание проекта"""
+        """
+        Получение или создание проекта
+
+        Сначала проверяется ID из локального индекса проектов (один GET), затем
+        выполняется постраничный поиск с фильтром по имени, и только если проект
+        не найден - создается новый.
+        """
         try:
-            # Получаем список проектов
-            projects = self.client.get_projects()
-            
-            # Ищем проект с совпадающим именем
-            matching_project = next(
-                (project for project in projects 
-                 if self.is_project_name_match(project.title, self.project_name)), 
-                None
-            )
-            
-            # Если проект найден - возвращаем его
-            if matching_project:
-                logger.info(f"Найден существующий проект: {matching_project.title}")
-                return {
-                    'id': matching_project.id,
-                    'title': matching_project.title
-                }
+            project = self._get_cached_project()
+            if project:
+                logger.info(f"Найден существующий проект: {project['title']} (из индекса)")
+                return project
+
+            project = self._find_project()
+            if project:
+                logger.info(f"Найден существующий проект: {project['title']}")
+                self.project_index.set(self.url, self.project_name, project['id'])
+                return project
             
             # Создаем новый проект, если не найден
             new_project = self.client.create_project(
@@ -185,6 +275,7 @@ class LabelStudioManager:
             )
             
             logger.info(f"Создан новый проект: {self.project_name}")
+            self.project_index.set(self.url, self.project_name, new_project.id)
             
             # Возвращаем словарь с данными проекта
             return {
@@ -196,17 +287,66 @@ class LabelStudioManager:
             logger.error(f"Ошибка при получении/создании проекта: {e}")
             raise
 
+    def _get_cached_project(self) -> Optional[Dict[str, Any]]:
+        """Проверка проекта из индекса одним запросом к серверу"""
+        project_id = self.project_index.get(self.url, self.project_name)
+        if project_id is None:
+            return None
+
+        response = self.make_request(
+            "GET", f"/api/projects/{project_id}", raise_exceptions=False
+        )
+        if response.status_code == 200:
+            title = response.json().get('title')
+            if normalize_name(title) == normalize_name(self.project_name):
+                return {'id': project_id, 'title': title}
+
+        logger.info(f"Проект {project_id} из индекса не найден или переименован, выполняется поиск")
+        self.project_index.remove(self.url, self.project_name)
+        return None
+
+    def _find_project(self, page_size: int = 100) -> Optional[Dict[str, Any]]:
+        """
+        Постраничный поиск проекта по имени с остановкой на первом совпадении.
+
+        Сначала используется фильтр по названию на сервере. Если сервер фильтр
+        не поддерживает, первый проход уже является полным обходом; иначе
+        выполняется полный постраничный обход (имена сравниваются после нормализации).
+        """
+        target = normalize_name(self.project_name)
+        for params in ({'title': self.project_name}, {}):
+            page = 1
+            filter_applied = True
+            while True:
+                response = self.make_request(
+                    "GET",
+                    "/api/projects",
+                    params={'page': page, 'page_size': page_size, **params},
+                    raise_exceptions=False
+                )
+                if response.status_code != 200:
+                    break
+                result = response.json()
+                projects = result.get('results', []) if isinstance(result, dict) else result
+                self.project_index.update(self.url, projects)
+
+                for project in projects:
+                    if normalize_name(project.get('title')) == target:
+                        return {'id': project['id'], 'title': project['title']}
+                    if self.project_name.lower() not in (project.get('title') or '').lower():
+                        filter_applied = False
+
+                if not isinstance(result, dict) or not result.get('next'):
+                    break
+                page += 1
+
+            if params and not filter_applied:
+                break
+        return None
+
     def _get_label_config(self):
         """Генерация конфигурации раметки"""
-        return """
-        <View>
-            <Image name="image" value="$image"/>
-            <Choices name="choice" toName="image">
-                <Choice value="drone"/>
-                <Choice value="not_drone"/>
-            </Choices>
-        </View>
-        """
+        return self.label_config or LABEL_CONFIG
 
     def create_project(self, title, label_config):
         """Создание нового проекта"""
@@ -237,18 +377,183 @@ class LabelStudioManager:
             logger.error(f"Ошибка создания задачи в Label Studio: {e}")
             raise
 
-    def create_tasks_batch(self, tasks, project_id):
-        """Пакетное создание задач"""
+    def create_tasks_batch(self, tasks, project_id=None):
+        """
+        Пакетное создание задач через API импорта проекта
+
+        :param tasks: Список задач в формате Label Studio JSON
+        :param project_id: ID проекта. Если не указан, используется текущий проект.
+        :return: Список ID созданных задач
+        """
         try:
-            created_tasks = self.client.create_tasks_batch(
-                tasks, 
-                project_id=project_id
+            project_id = project_id or self.get_project_id()
+            response = self.make_request(
+                "POST",
+                f"/api/projects/{project_id}/import",
+                json=tasks,
+                params={'return_task_ids': '1'},
+                timeout=(10, 600)
             )
+            created_tasks = response.json().get('task_ids', [])
+            TASKS_IMPORTED.inc(len(tasks))
+            logger.debug(f"Создано задач: {len(created_tasks)} в проекте {project_id}")
             return created_tasks
         except Exception as e:
             logger.error(f"Ошибка создания пакета задач: {e}")
             raise
 
+    def import_index(self, project_id=None) -> ImportedPathIndex:
+        """Индекс уже импортированных путей проекта (один на проект за время работы процесса)"""
+        project_id = project_id or self.get_project_id()
+        if project_id not in self._import_indexes:
+            self._import_indexes[project_id] = ImportedPathIndex(self, project_id)
+        return self._import_indexes[project_id]
+
+    def import_tasks(self, tasks, project_id=None, chunk_size=None, workers=None, on_chunk=None, skip_existing=None):
+        """
+        Потоковый импорт большого количества задач чанками в несколько потоков
+
+        :param tasks: Итератор/генератор задач в формате Label Studio JSON
+        :param project_id: ID проекта. Если не указан, используется текущий проект.
+        :param chunk_size: Задач в одном запросе (IMPORT_CHUNK_SIZE)
+        :param workers: Количество параллельных запросов (IMPORT_WORKERS)
+        :param on_chunk: Вызывается после импорта каждого чанка (задачи, ID задач)
+        :param skip_existing: Пропускать файлы, для которых в проекте уже есть задачи
+                              (IMPORT_INDEX_ENABLED, по умолчанию true)
+        :return: Статистика импорта (количество задач, чанков, задач/сек, пропущенных)
+        """
+        project_id = project_id or self.get_project_id()
+        if skip_existing is None:
+            skip_existing = os.getenv('IMPORT_INDEX_ENABLED', 'true').lower() == 'true'
+        index = self.import_index(project_id) if skip_existing else None
+        skipped = {'skipped': 0}
+        if index:
+            index.refresh_if_stale()
+            tasks = index.filter_new(tasks, stats=skipped)
+            user_on_chunk = on_chunk
+
+            def on_chunk(chunk, task_ids):
+                index.record(chunk, task_ids)
+                if user_on_chunk:
+                    user_on_chunk(chunk, task_ids)
+
+        sender = None
+        if index:
+            # Чанк повторяется при временной ошибке, только если сервер его не импортировал
+            def sender(chunk, chunk_project_id):
+                if not any(index.key(task) for task in chunk):
+                    # Без путей файлов нельзя проверить, создан ли чанк - без повторов
+                    return self.create_tasks_batch(chunk, chunk_project_id)
+                return self.resilience.idempotent_post(
+                    'import_tasks',
+                    lambda: self.create_tasks_batch(chunk, chunk_project_id),
+                    lambda: index.created_ids(chunk)
+                )
+
+        importer = BulkTaskImporter(
+            self,
+            project_id=project_id,
+            chunk_size=chunk_size,
+            workers=workers,
+            sender=sender
+        )
+        try:
+            stats = importer.import_tasks(tasks, on_chunk=on_chunk)
+        finally:
+            if index:
+                index.save()
+        stats['skipped'] = skipped['skipped']
+        IMPORT_RATE.set(stats['tasks_per_sec'])
+        return stats
+
+    def iter_task_pages(
+        self,
+        project_id=None,
+        page_size: int = None,
+        fields: str = 'all',
+        filters: list = None,
+        after_id: int = None,
+        prefetch_pages: int = None
+    ):
+        """
+        Постраничный обход задач проекта в порядке возрастания ID (генератор списков задач)
+
+        Используется keyset-пагинация (id > последнего полученного), поэтому
+        страницы не сдвигаются при добавлении задач во время обхода. Следующие
+        страницы запрашиваются в фоновом потоке, пока вызывающий код обрабатывает
+        текущую; в памяти находится не больше prefetch_pages + 2 страниц.
+
+        :param project_id: ID проекта. Если не указан, используется текущий проект.
+        :param page_size: Количество задач на странице (TASK_PAGE_SIZE, по умолчанию 100)
+        :param fields: Набор полей задачи ('all' - с аннотациями и предсказаниями, 'task_only' - без них)
+        :param filters: Дополнительные фильтры Data Manager (элементы filters.items)
+        :param after_id: Начать с задач, ID которых больше указанного
+        :param prefetch_pages: Страниц, запрашиваемых заранее (TASK_PREFETCH_PAGES, по умолчанию 2; 0 - без фонового потока)
+        """
+        project_id = project_id or self.get_project_id()
+        page_size = page_size or int(os.getenv('TASK_PAGE_SIZE', '100'))
+        if prefetch_pages is None:
+            prefetch_pages = int(os.getenv('TASK_PREFETCH_PAGES', '2'))
+        pages = self._fetch_task_pages(project_id, page_size, fields, filters, after_id or 0)
+        return prefetch(pages, depth=prefetch_pages) if prefetch_pages > 0 else pages
+
+    def _fetch_task_pages(self, project_id, page_size: int, fields: str, filters: list, last_id: int):
+        while True:
+            items = [{
+                'filter': 'filter:tasks:id',
+                'operator': 'greater',
+                'type': 'Number',
+                'value': last_id
+            }] + list(filters or [])
+            query = {
+                'filters': {'conjunction': 'and', 'items': items},
+                'ordering': ['tasks:id']
+            }
+            response = self.make_request(
+                "GET",
+                "/api/tasks",
+                params={
+                    'project': project_id,
+                    'page': 1,
+                    'page_size': page_size,
+                    'fields': fields,
+                    'query': json.dumps(query)
+                }
+            )
+            result = response.json()
+            tasks = result.get('tasks', []) if isinstance(result, dict) else result
+            if not tasks:
+                return
+            yield tasks
+            last_id = tasks[-1]['id']
+            if len(tasks) < page_size:
+                return
+
+    def iter_tasks(
+        self,
+        project_id=None,
+        page_size: int = None,
+        fields: str = 'all',
+        filters: list = None,
+        after_id: int = None,
+        prefetch_pages: int = None
+    ):
+        """
+        Потоковый обход задач проекта по одной (параметры как у iter_task_pages)
+        """
+        for page in self.iter_task_pages(project_id, page_size, fields, filters, after_id, prefetch_pages):
+            yield from page
+
+    def export_annotations(self, output_path: str, **export_kwargs):
+        """
+        Потоковый экспорт задач с аннотациями в JSONL или Parquet
+
+        :param output_path: Файл экспорта (.jsonl или .parquet)
+        :param export_kwargs: Параметры AnnotationExporter.export (resume, only_updated, fmt)
+        :return: Статистика экспорта
+        """
+        return AnnotationExporter(self).export(output_path, **export_kwargs)
+
     def get_project_id(self):
         """
         Возвращает ID проекта, инициализируя его при необходимости
@@ -271,16 +576,6 @@ class LabelStudioManager:
             logger.error(f"Ошибка создания локального хранилища: {e}")
             raise
 
-    def sync_local_storage(self, storage_id: int):
-        """Синхронизация локального хранилища"""
-        try:
-            sync_response = self.client.sync_local_storage(storage_id)
-            logger.info(f"Синхронизация хранилища {storage_id}: {sync_response}")
-            return sync_response
-        except Exception as e:
-            logger.error(f"Ошибка синхронизации локального хранилища: {e}")
-            raise
-
     def get_local_storage(self, storage_id: int):
         """Получение информации о локальном хранилище"""
         try:
@@ -320,7 +615,7 @@ class LabelStudioManager:
                 "project": self.project['id']
             }
 
-            response = self.client.client.make_request(
+            response = self.make_request(
                 "POST", 
                 f"/api/storages/localfiles", 
                 json=payload
@@ -344,7 +639,7 @@ class LabelStudioManager:
         """
         try:
             sync_url = f"/api/storages/localfiles/{storage_id}/sync"
-            response = self.client.client.make_request("POST", sync_url)
+            response = self.make_request("POST", sync_url)
             
             sync_result = response.json()
             logger.info(f"Синхронизация хранилища {storage_id}: {sync_result}")
@@ -355,6 +650,16 @@ class LabelStudioManager:
             logger.error(f"Ошибка синхронизации локального хранилища: {e}")
             raise
 
+    def start_storage_sync(self, storage_id: int, **job_kwargs) -> StorageSyncJob:
+        """
+        Неблокирующая синхронизация локального хранилища
+
+        :param storage_id: ID хранилища для синхронизации
+        :param job_kwargs: Параметры StorageSyncJob (колбэки, интервалы опроса, timeout)
+        :return: Запущенная задача синхронизации (wait/cancel/progress)
+        """
+        return StorageSyncJob(self, storage_id, **job_kwargs).start()
+
     def monitor_storage_import(self, storage_id):
         """
         Мониторинг импорта локального хранилища
@@ -362,7 +667,7 @@ class LabelStudioManager:
         try:
             # Получение статистики импорта
             stats_url = f"/api/storages/localfiles/{storage_id}/stats"
-            response = self.client.client.make_request("GET", stats_url)
+            response = self.make_request("GET", stats_url)
             
             stats = response.json()
             logger.info(f"Статистика импорта: {stats}")
@@ -0,0 +1,423 @@
+import os
+import time
+import socket
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from file_manifest import FileEntry
+from task_importer import chunked
+
+logger = logging.getLogger(__name__)
+
+
+class Lease(NamedTuple):
+    """Аренда диапазона файлов одной репликой"""
+    range_id: int
+    owner: str
+    size: int
+
+
+class LeaseCoordinator:
+    """
+    Распределение файлов между репликами storage-manager через общий файл SQLite.
+
+    Одна реплика (под блокировкой 'scan') обходит директорию и записывает
+    новые файлы диапазонами по range_size. Реплики берут диапазоны в аренду
+    на ttl секунд и продлевают ее, пока обрабатывают диапазон. Аренда
+    упавшей реплики истекает, и диапазон забирает другая реплика.
+
+    Файл должен лежать на файловой системе, общей для всех реплик
+    (по умолчанию в data_dir рядом с файлами). Диапазон, обработка которого
+    завершилась ошибкой max_attempts раз, помечается как неудачный и больше
+    не выдается.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        owner: str = None,
+        ttl: float = None,
+        range_size: int = None,
+        scan_interval: float = None,
+        max_attempts: int = None
+    ):
+        """
+        :param db_path: Файл состояния на общей файловой системе
+        :param owner: Имя реплики (по умолчанию <hostname>:<pid>)
+        :param ttl: Время аренды, сек (LEASE_TTL, по умолчанию 120)
+        :param range_size: Файлов в диапазоне (LEASE_RANGE_SIZE, по умолчанию 5000)
+        :param scan_interval: Минимальный интервал между обходами директории, сек (LEASE_SCAN_INTERVAL, по умолчанию 60)
+        :param max_attempts: Попыток обработки диапазона (LEASE_MAX_ATTEMPTS, по умолчанию 3)
+        """
+        self.db_path = db_path
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.ttl = ttl or float(os.getenv('LEASE_TTL', '120'))
+        self.range_size = range_size or int(os.getenv('LEASE_RANGE_SIZE', '5000'))
+        self.scan_interval = scan_interval if scan_interval is not None else \
+            float(os.getenv('LEASE_SCAN_INTERVAL', '60'))
+        self.max_attempts = max_attempts or int(os.getenv('LEASE_MAX_ATTEMPTS', '3'))
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._init_db()
+
+    @classmethod
+    def for_data_dir(cls, data_dir: str, **kwargs) -> 'LeaseCoordinator':
+        """Координатор для data_dir (LEASE_DB, по умолчанию data_dir/.leases.sqlite)"""
+        db_path = os.getenv('LEASE_DB') or os.path.join(data_dir, '.leases.sqlite')
+        return cls(db_path, **kwargs)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        # Файл общий для нескольких хостов: WAL требует общей памяти и на сетевых ФС не работает
+        conn.execute('PRAGMA journal_mode=DELETE')
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция с блокировкой записи с самого начала (выбор и захват аренды атомарны)"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ranges (
+                    id INTEGER PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    owner TEXT,
+                    expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    done INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    range_id INTEGER NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS files_range ON files (range_id)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT, expires REAL, updated REAL)'
+            )
+
+    # --- блокировки ---
+    def claim(self, name: str, ttl: float = None) -> bool:
+        """Захват или продление именованной блокировки (свободной, своей или просроченной)"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute('SELECT owner, expires FROM locks WHERE name = ?', (name,)).fetchone()
+            if row and row[0] and row[0] != self.owner and row[1] > now:
+                return False
+            conn.execute(
+                'INSERT OR REPLACE INTO locks (name, owner, expires, updated) VALUES (?, ?, ?, ?)',
+                (name, self.owner, now + (ttl or self.ttl), now)
+            )
+            return True
+
+    def unlock(self, name: str):
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE locks SET owner = NULL, expires = NULL, updated = ? WHERE name = ? AND owner = ?',
+                (time.time(), name, self.owner)
+            )
+
+    def locked(self, name: str) -> bool:
+        """Блокировка удерживается другой репликой"""
+        with self._transaction() as conn:
+            row = conn.execute('SELECT owner, expires FROM locks WHERE name = ?', (name,)).fetchone()
+        return bool(row and row[0] and row[0] != self.owner and row[1] > time.time())
+
+    @contextmanager
+    def exclusive(self, name: str, poll_interval: float = 0.5):
+        """Участок, который выполняет только одна реплика (например, создание проекта и хранилища)"""
+        while not self.claim(name):
+            time.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            self.unlock(name)
+
+    # --- диапазоны файлов ---
+    def scan_due(self) -> bool:
+        """Пора обойти директорию: прошлый обход старше scan_interval и никто не обходит ее сейчас"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT owner, expires, updated FROM locks WHERE name = 'scan'").fetchone()
+        if not row:
+            return True
+        owner, expires, updated = row
+        if owner and expires > time.time():
+            return False
+        return time.time() - (updated or 0) >= self.scan_interval
+
+    def publish(self, entries: Iterable[FileEntry]) -> int:
+        """
+        Запись новых файлов диапазонами (выполняет одна реплика за раз)
+
+        Если блокировка 'scan' истекла и ее забрала другая реплика, обход прерывается:
+        файлы опубликует она.
+
+        :param entries: Файлы data_dir (пути относительно document_root)
+        :return: Количество новых диапазонов или 0, если обход уже выполняет другая реплика
+        """
+        if not self.claim('scan'):
+            return 0
+        stats = {'ranges': 0, 'files': 0}
+        pending: List[str] = []
+        lost = False
+
+        def add(paths: List[str]) -> bool:
+            added = self._add_range(paths)
+            if added:
+                stats['ranges'] += 1
+                stats['files'] += added
+            return added is not None
+
+        try:
+            for batch in chunked(entries, 1000):
+                pending.extend(self._unknown([entry.path for entry in batch]))
+                while len(pending) >= self.range_size and not lost:
+                    lost = not add(pending[:self.range_size])
+                    pending = pending[self.range_size:]
+                # Долгий обход продлевает блокировку
+                if lost or not self.claim('scan'):
+                    lost = True
+                    break
+            if pending and not lost:
+                lost = not add(pending)
+        finally:
+            self.unlock('scan')
+        if lost:
+            logger.warning(f"Блокировка обхода перехвачена другой репликой, обход {self.owner} прерван")
+        if stats['ranges']:
+            logger.info(f"Новых файлов {stats['files']}, диапазонов для реплик: {stats['ranges']}")
+        return stats['ranges']
+
+    def _unknown(self, paths: List[str], conn: sqlite3.Connection = None) -> List[str]:
+        """Пути, которых еще нет ни в одном диапазоне"""
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            known = set()
+            for i in range(0, len(paths), 500):
+                part = paths[i:i + 500]
+                known.update(row[0] for row in conn.execute(
+                    f"SELECT path FROM files WHERE path IN ({','.join('?' * len(part))})", part
+                ))
+            return [path for path in paths if path not in known]
+        finally:
+            if own:
+                conn.close()
+
+    def _add_range(self, paths: List[str]) -> Optional[int]:
+        """
+        Запись диапазона из еще не опубликованных путей одной транзакцией
+
+        :return: Количество записанных файлов или None, если блокировку 'scan' забрала другая реплика
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT owner, expires FROM locks WHERE name = 'scan'").fetchone()
+            if row and row[0] and row[0] != self.owner and row[1] > now:
+                return None
+            # Блокировка продлевается в той же транзакции, что и запись диапазона
+            conn.execute(
+                "INSERT OR REPLACE INTO locks (name, owner, expires, updated) VALUES ('scan', ?, ?, ?)",
+                (self.owner, now + self.ttl, now)
+            )
+            # Повторная проверка в той же транзакции: диапазоны не пересекаются, size совпадает с файлами
+            paths = self._unknown(paths, conn)
+            if not paths:
+                return 0
+            range_id = conn.execute('INSERT INTO ranges (size) VALUES (?)', (len(paths),)).lastrowid
+            conn.executemany('INSERT INTO files (path, range_id) VALUES (?, ?)', ((path, range_id) for path in paths))
+            return len(paths)
+
+    def forget(self, paths: Iterable[str]):
+        """Удаление путей из диапазонов: при следующем обходе они будут опубликованы снова"""
+        paths = list(paths)
+        with self._transaction() as conn:
+            for i in range(0, len(paths), 500):
+                part = paths[i:i + 500]
+                conn.execute(f"DELETE FROM files WHERE path IN ({','.join('?' * len(part))})", part)
+
+    def acquire(self) -> Optional[Lease]:
+        """Аренда свободного или просроченного диапазона"""
+        now = time.time()
+        with self._transaction() as conn:
+            # Реплика падала на диапазоне max_attempts раз (аренда истекала без завершения)
+            failed = conn.execute(
+                'UPDATE ranges SET done = -1, owner = NULL, expires = NULL '
+                'WHERE done = 0 AND attempts >= ? AND (owner IS NULL OR expires < ?)',
+                (self.max_attempts, now)
+            ).rowcount
+            row = conn.execute(
+                'SELECT id, size, owner FROM ranges WHERE done = 0 AND (owner IS NULL OR expires < ?) '
+                'ORDER BY id LIMIT 1',
+                (now,)
+            ).fetchone()
+            if failed:
+                logger.error(f"Диапазонов, не обработанных за {self.max_attempts} попытки: {failed}")
+            if not row:
+                return None
+            range_id, size, previous = row
+            conn.execute(
+                'UPDATE ranges SET owner = ?, expires = ?, attempts = attempts + 1 WHERE id = ?',
+                (self.owner, now + self.ttl, range_id)
+            )
+        if previous:
+            logger.warning(f"Диапазон {range_id}: аренда {previous} истекла, диапазон передан {self.owner}")
+        return Lease(range_id, self.owner, size)
+
+    def renew(self, lease: Lease) -> bool:
+        """Продление аренды; False, если диапазон уже забрала другая реплика"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'UPDATE ranges SET expires = ? WHERE id = ? AND owner = ? AND done = 0',
+                (time.time() + self.ttl, lease.range_id, lease.owner)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, lease: Lease) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'UPDATE ranges SET done = 1, owner = NULL, expires = NULL WHERE id = ? AND owner = ?',
+                (lease.range_id, lease.owner)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, lease: Lease):
+        """Возврат диапазона без обработки (его сразу может взять другая реплика)"""
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE ranges SET owner = NULL, expires = NULL WHERE id = ? AND owner = ? AND done = 0',
+                (lease.range_id, lease.owner)
+            )
+
+    def fail(self, lease: Lease) -> bool:
+        """
+        Возврат диапазона после ошибки обработки
+
+        :return: True, если попытки исчерпаны и диапазон помечен как неудачный
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE ranges SET owner = NULL, expires = NULL, '
+                'done = CASE WHEN attempts >= ? THEN -1 ELSE 0 END '
+                'WHERE id = ? AND owner = ? AND done = 0',
+                (self.max_attempts, lease.range_id, lease.owner)
+            )
+            row = conn.execute('SELECT done FROM ranges WHERE id = ?', (lease.range_id,)).fetchone()
+        return bool(row and row[0] == -1)
+
+    def retry_failed(self) -> int:
+        """Повторная выдача неудачных диапазонов (после исправления причины ошибки)"""
+        with self._transaction() as conn:
+            return conn.execute('UPDATE ranges SET done = 0, attempts = 0 WHERE done = -1').rowcount
+
+    def paths(self, lease: Lease) -> List[str]:
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute('SELECT path FROM files WHERE range_id = ?', (lease.range_id,))]
+        finally:
+            conn.close()
+
+    def pending(self) -> int:
+        """Количество необработанных диапазонов (в том числе арендованных)"""
+        with self._transaction() as conn:
+            return conn.execute('SELECT COUNT(*) FROM ranges WHERE done = 0').fetchone()[0]
+
+
+class LeasedSync:
+    """
+    Синхронизация data_dir несколькими репликами: каждая импортирует
+    только арендованные диапазоны файлов (StorageManager.sync_paths).
+
+    Повторная обработка диапазона после истечения аренды не создает
+    дубликатов - уже импортированные файлы пропускаются по индексу.
+    """
+
+    def __init__(self, storage_manager, coordinator: LeaseCoordinator = None, poll_interval: float = 1.0):
+        """
+        :param storage_manager: StorageManager реплики
+        :param coordinator: Координатор (по умолчанию LeaseCoordinator.for_data_dir)
+        :param poll_interval: Пауза, пока диапазоны обрабатывают другие реплики, сек
+        """
+        self.storage_manager = storage_manager
+        self.coordinator = coordinator or LeaseCoordinator.for_data_dir(storage_manager.data_dir)
+        self.poll_interval = poll_interval
+
+    def run(self) -> Dict[str, Any]:
+        """Обработка диапазонов, пока все они не будут завершены (этой или другими репликами)"""
+        stats = {'ranges': 0, 'files': 0, 'imported': 0, 'skipped': 0, 'failed': 0}
+        while True:
+            if self.coordinator.scan_due():
+                self.coordinator.publish(self.storage_manager.iter_files())
+            lease = self.coordinator.acquire()
+            if lease:
+                self._process(lease, stats)
+                continue
+            if not self.coordinator.pending() and not self.coordinator.locked('scan'):
+                break
+            time.sleep(self.poll_interval)
+        logger.info(f"Реплика {self.coordinator.owner}: {stats}")
+        return stats
+
+    def watch(self):
+        """
+        Непрерывный режим для нескольких реплик: новые файлы раз в LEASE_SCAN_INTERVAL
+        раздаются диапазонами всем репликам (вместо WatchDaemon в каждой реплике)
+        """
+        while True:
+            self.run()
+            time.sleep(max(self.coordinator.scan_interval, self.poll_interval))
+
+    def _process(self, lease: Lease, stats: Dict[str, int]):
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(self.coordinator.ttl / 3):
+                if not self.coordinator.renew(lease):
+                    logger.warning(f"Аренда диапазона {lease.range_id} потеряна")
+                    return
+
+        thread = threading.Thread(target=heartbeat, name=f'lease-{lease.range_id}', daemon=True)
+        thread.start()
+        try:
+            result = self.storage_manager.sync_paths(self.coordinator.paths(lease))
+        except Exception as e:
+            exhausted = self.coordinator.fail(lease)
+            stats['failed'] += 1
+            logger.error(
+                f"Ошибка обработки диапазона {lease.range_id}: {e}"
+                + (" (попытки исчерпаны, диапазон пропущен)" if exhausted else "")
+            )
+            return
+        finally:
+            stop.set()
+            thread.join()
+
+        if result.get('deferred'):
+            # Недавно измененные файлы (см. INTEGRITY_GRACE_PERIOD) войдут в диапазон следующего обхода
+            self.coordinator.forget(result['deferred'])
+        self.coordinator.complete(lease)
+        stats['ranges'] += 1
+        stats['files'] += lease.size
+        stats['imported'] += result.get('imported', 0)
+        stats['skipped'] += result.get('skipped', 0)
+        logger.info(f"Диапазон {lease.range_id} ({lease.size} файлов): {result}")
@@ -1,8 +1,15 @@
 import os
 import logging
+from contextlib import nullcontext
 from dotenv import load_dotenv
-from label_studio_client import LabelStudioManager
-from storage_manager import StorageManager
+from label_studio_client import LabelStudioManager, LABEL_CONFIG
+from storage_manager import StorageManager, IMAGE_REGEX_FILTER, DEFAULT_DATA_DIR
+from sharding import ShardManager
+from leases import LeaseCoordinator, LeasedSync
+from orchestrator import Orchestrator, load_datasets
+from watcher import WatchDaemon
+from metrics import start_metrics_server
+from bootstrap import SetupState, preload, wait_for_label_studio
 
 # Настройка логирования
 logging.basicConfig(
@@ -11,9 +18,54 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def setup_local_storage():
+def setup_fingerprint() -> str:
+    """Отпечаток конфигурации, от которой зависят сохраненные ID проекта и хранилища"""
+    return SetupState.fingerprint(
+        url=os.getenv('LABEL_STUDIO_URL'),
+        project=os.getenv('LABEL_STUDIO_PROJECT_NAME'),
+        label_config=LABEL_CONFIG,
+        document_root=os.getenv('LABEL_STUDIO_LOCAL_FILES_DOCUMENT_ROOT'),
+        serve_previews=os.getenv('SERVE_PREVIEWS'),
+        preview_dir=os.getenv('PREVIEW_DIR'),
+        regex_filter=IMAGE_REGEX_FILTER
+    )
+
+def setup_from_state(setup_state: SetupState, fingerprint: str):
+    """
+    Теплый перезапуск по сохраненному состоянию: без поиска проекта,
+    списка и валидации хранилищ, только синхронизация
+
+    :return: Результат как у setup_local_storage или None, если состояния нет
+    """
+    state = setup_state.load(fingerprint)
+    if not state:
+        return None
+    storage_id = state['storage_id']
+    try:
+        ls_manager = LabelStudioManager(project_id=state['project_id'])
+        storage_manager = StorageManager(ls_manager)
+        storage = storage_manager.get_storage(storage_id)
+        if storage.get('project') != state['project_id'] or storage.get('path') != storage_manager.storage_path:
+            raise ValueError(f"хранилище {storage_id} не соответствует проекту или пути")
+    except Exception as e:
+        # Проект или хранилище могли быть удалены - выполняется полная настройка
+        logger.warning(f"Сохраненное состояние недействительно ({e}), выполняется полная настройка")
+        setup_state.clear()
+        return None
+
+    # Ошибки синхронизации не означают, что состояние устарело, - они передаются вызывающему
+    logger.info(f"Используется сохраненное состояние: проект {state['project_id']}, хранилище {storage_id}")
+    sync_result = storage_manager.sync_storage(storage_id, scan_all=True)
+    logger.info(f"Результат синхронизации: {sync_result}")
+    return storage_id, 'cached', sync_result, storage_manager
+
+def setup_local_storage(ls_manager: LabelStudioManager = None):
     """
     Основная функция настройки локального хранилища в Label Studio
+
+    :param ls_manager: Готовый менеджер Label Studio (по умолчанию создается новый)
+    :return: (ID хранилища, результат валидации, результат синхронизации, StorageManager)
+             или None, если настройка не выполнена
     """
     try:
         # Загрузка переменных окружения
@@ -30,43 +82,79 @@ def setup_local_storage():
             logger.error(f"Отсутствуют обязательные переменные окружения: {missing_vars}")
             return None
 
-        # Инициализация менеджера Label Studio
-        ls_manager = LabelStudioManager()
+        # Теплый перезапуск: ID проекта и хранилища из сохраненного состояния
+        sharding = os.getenv('SHARDING_ENABLED', 'false').lower() == 'true'
+        # Несколько реплик делят файлы data_dir через аренду диапазонов
+        leased = os.getenv('LEASES_ENABLED', 'false').lower() == 'true'
+        setup_state = SetupState()
+        fingerprint = setup_fingerprint()
+        cache_enabled = ls_manager is None and not sharding and not leased and \
+            os.getenv('SETUP_STATE_ENABLED', 'true').lower() == 'true'
+        if cache_enabled:
+            cached_result = setup_from_state(setup_state, fingerprint)
+            if cached_result:
+                return cached_result
 
-        # Проверка подключения к Label Studio
-        if not ls_manager.validate_connection():
-            logger.error("Не удалось установить подключение к Label Studio")
-            return None
+        # Реплики создают проект и хранилище по очереди, иначе появились бы дубликаты
+        coordinator = None
+        if leased:
+            data_dir = os.path.join(os.getenv('LABEL_STUDIO_LOCAL_FILES_DOCUMENT_ROOT'), DEFAULT_DATA_DIR)
+            coordinator = LeaseCoordinator.for_data_dir(data_dir)
+        with coordinator.exclusive('setup') if coordinator else nullcontext():
+            # Инициализация менеджера Label Studio
+            ls_manager = ls_manager or LabelStudioManager()
 
-        # Убедимся что проект создан и получим его ID
-        project_id = ls_manager.get_project_id()
-        logger.info(f"Получен ID проекта: {project_id}")
+            # Проверка подключения к Label Studio
+            if not ls_manager.validate_connection():
+                logger.error("Не удалось установить подключение к Label Studio")
+                return None
 
-        # Инициализация менеджера хранилища
-        storage_manager = StorageManager(ls_manager)
+            # Убедимся что проект создан и получим его ID
+            project_id = ls_manager.get_project_id()
+            logger.info(f"Получен ID проекта: {project_id}")
 
-        # Получаем список существующих хранилищ
-        existing_storages = storage_manager.list_storages()
-        logger.info(f"Существующие хранилища: {existing_storages}")
+            # Инициализация менеджера хранилища
+            storage_manager = StorageManager(ls_manager)
+
+            # Режим шардирования: отдельное хранилище на каждую часть data_dir
+            if sharding:
+                shard_result = ShardManager(storage_manager).run(scan_all=True)
+                storage_ids = [storage_id for _, storage_id, _ in shard_result['shards']]
+                logger.info(f"Хранилища шардов: {shard_result['shards']}")
+                return storage_ids, shard_result['shards'], shard_result['sync'], storage_manager
+
+            # Получаем список существующих хранилищ
+            existing_storages = storage_manager.list_storages()
+            logger.info(f"Существующие хранилища: {existing_storages}")
+
+            # Создаем новое хранилище только если нет существующих
+            if not existing_storages:
+                storage_info = storage_manager.create_storage()
+                storage_id = storage_info['id']
+                logger.info(f"Создано новое хранилище с ID: {storage_id}")
+            else:
+                storage_id = existing_storages[0]['id']
+                logger.info(f"Используется существующее хранилище с ID: {storage_id}")
+                if existing_storages[0].get('path') != storage_manager.storage_path:
+                    # SERVE_PREVIEWS переключает хранилище между оригиналами и деревом превью
+                    logger.info(f"Обновление пути хранилища {storage_id}: {storage_manager.storage_path}")
+                    storage_manager.update_storage(storage_id, path=storage_manager.storage_path)
 
-        # Создаем новое хранилище только если нет существующих
-        if not existing_storages:
-            storage_info = storage_manager.create_storage()
-            storage_id = storage_info['id']
-            logger.info(f"Создано новое хранилище с ID: {storage_id}")
-        else:
-            storage_id = existing_storages[0]['id']
-            logger.info(f"Используется существующее хранилище с ID: {storage_id}")
-        
         # Валидируем хранилище
         validation_result = storage_manager.validate_storage(storage_id)
         
         # Добавляем синхронизацию после валидации
         logger.info("Начинаем синхронизацию хранилища...")
-        sync_result = storage_manager.sync_storage(storage_id, scan_all=True)
+        if coordinator:
+            sync_result = LeasedSync(storage_manager, coordinator).run()
+        else:
+            sync_result = storage_manager.sync_storage(storage_id, scan_all=True)
         logger.info(f"Результат синхронизации: {sync_result}")
+
+        if cache_enabled:
+            setup_state.save(fingerprint, project_id=project_id, storage_id=storage_id)
         
-        return storage_id, validation_result, sync_result
+        return storage_id, validation_result, sync_result, storage_manager
         
     except Exception as e:
         logger.error(f"Ошибка настройки локального хранилища: {e}")
@@ -77,17 +165,46 @@ def main():
     Основная точка входа в приложение
     """
     try:
+        # /health для HEALTHCHECK контейнера и /metrics для Prometheus
+        load_dotenv()
+        start_metrics_server()
+
+        # Ожидание Label Studio в том же процессе; SDK импортируется параллельно
+        preload('label_studio_sdk')
+        if not wait_for_label_studio():
+            logger.error("Label Studio недоступен, настройка не выполнена")
+            return
+
+        # Несколько проектов в одном процессе по списку наборов данных
+        datasets_config = os.getenv('DATASETS_CONFIG')
+        if datasets_config:
+            logger.info(f"Запуск оркестратора по конфигурации {datasets_config}")
+            Orchestrator(load_datasets(datasets_config)).run()
+            return
+
         # Настройка локального хранилища
         storage_result = setup_local_storage()
         
         if storage_result:
-            storage_id, validation_result, sync_result = storage_result
+            storage_id, validation_result, sync_result, storage_manager = storage_result
             logger.info(f"""
             Локальное хранилище успешно настроено:
             - ID хранилища: {storage_id}
             - Валидация: {validation_result}
             - Синхронизация: {sync_result}
             """)
+
+            # Режим наблюдения: новые файлы отправляются без перезапуска контейнера
+            # тем же StorageManager, что выполнил настройку (без повторного поиска проекта)
+            if os.getenv('WATCH_ENABLED', 'false').lower() == 'true':
+                if isinstance(storage_id, list):
+                    logger.warning("Режим наблюдения не поддерживается вместе с шардированием")
+                elif os.getenv('LEASES_ENABLED', 'false').lower() == 'true':
+                    # Каждая реплика с WatchDaemon импортировала бы все новые файлы сама;
+                    # вместо этого новые файлы раздаются диапазонами через координатор
+                    LeasedSync(storage_manager).watch()
+                else:
+                    WatchDaemon(storage_manager, storage_id).run()
         else:
             logger.warning("Не удалось настроить локальное хранилище")
 
@@ -0,0 +1,307 @@
+import os
+import errno
+import shutil
+import hashlib
+import argparse
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from file_manifest import DEFAULT_STATE_DIR
+from task_paths import image_path_from_task
+
+logger = logging.getLogger(__name__)
+
+LINK_MODES = ('hardlink', 'reflink', 'symlink', 'copy')
+# ioctl FICLONE (Linux): копия файла с общими блоками данных (btrfs, XFS)
+FICLONE = 0x40049409
+# Файловая система не поддерживает reflink
+REFLINK_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS, errno.EPERM}
+
+
+def label_from_task(task: Dict[str, Any], from_name: str = 'choice') -> Optional[str]:
+    """Класс из последней не отмененной аннотации задачи (Choices с именем from_name)"""
+    annotations = [a for a in task.get('annotations') or [] if not a.get('was_cancelled')]
+    for annotation in sorted(annotations, key=lambda a: (a.get('updated_at') or '', a.get('id') or 0), reverse=True):
+        for item in annotation.get('result') or []:
+            choices = (item.get('value') or {}).get('choices')
+            if item.get('from_name') == from_name and choices:
+                return choices[0]
+    return None
+
+
+def split_for(path: str, val_ratio: float) -> str:
+    """Детерминированное разбиение по хешу пути: файл не переходит между train и val при повторных запусках"""
+    digest = hashlib.blake2b(path.encode('utf-8'), digest_size=8).digest()
+    return 'val' if int.from_bytes(digest, 'little') / 2 ** 64 < val_ratio else 'train'
+
+
+def _reflink(source: str, target: str):
+    import fcntl
+
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def link_file(source: str, target: str, mode: str) -> str:
+    """
+    Размещение файла без копирования данных; настоящая копия - только между файловыми системами
+
+    :param mode: hardlink, reflink (при отсутствии поддержки - hardlink), symlink или copy
+    :return: Фактически использованный способ
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.tmp"
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    method = mode
+    try:
+        if mode == 'symlink':
+            os.symlink(source, tmp)
+        elif mode == 'copy':
+            shutil.copy2(source, tmp)
+        else:
+            if mode == 'reflink':
+                try:
+                    _reflink(source, tmp)
+                except (OSError, ImportError) as e:
+                    if os.path.lexists(tmp):
+                        os.remove(tmp)
+                    if getattr(e, 'errno', None) == errno.EXDEV:
+                        raise
+                    method = 'hardlink'
+            if method == 'hardlink':
+                os.link(source, tmp)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copy2(source, tmp)
+        method = 'copy'
+    os.replace(tmp, target)
+    return method
+
+
+class DatasetMaterializer:
+    """
+    Сборка обучающего набора split/class/файл из аннотаций проекта.
+
+    Файлы размещаются жесткими ссылками, reflink или символическими
+    ссылками; копирование выполняется только между файловыми системами.
+    Размещенные файлы записываются в SQLite, поэтому повторный запуск
+    обрабатывает только задачи, измененные после предыдущего, и переносит
+    файлы, у которых изменился класс.
+    """
+
+    def __init__(
+        self,
+        storage_manager,
+        output_dir: str = None,
+        link_mode: str = None,
+        val_ratio: float = None,
+        workers: int = None,
+        from_name: str = 'choice',
+        db_path: str = None
+    ):
+        """
+        :param storage_manager: StorageManager (document_root и пути превью)
+        :param output_dir: Директория набора (MATERIALIZE_DIR, по умолчанию document_root/dataset)
+        :param link_mode: hardlink, reflink, symlink или copy (MATERIALIZE_LINK, по умолчанию hardlink)
+        :param val_ratio: Доля val (MATERIALIZE_VAL_RATIO, по умолчанию 0.2)
+        :param workers: Параллельных операций с файлами (MATERIALIZE_WORKERS, по умолчанию 8)
+        :param from_name: Имя тега Choices в конфигурации разметки
+        :param db_path: Состояние (по умолчанию STATE_DIR/materialized_<project>.sqlite)
+        """
+        self.storage_manager = storage_manager
+        self.ls_manager = storage_manager.client
+        self.project_id = self.ls_manager.get_project_id()
+        self.output_dir = os.path.abspath(
+            output_dir or os.getenv('MATERIALIZE_DIR') or os.path.join(storage_manager.document_root, 'dataset')
+        )
+        self.link_mode = link_mode or os.getenv('MATERIALIZE_LINK', 'hardlink')
+        if self.link_mode not in LINK_MODES:
+            raise ValueError(f"Неизвестный способ размещения файлов: {self.link_mode}")
+        self.val_ratio = val_ratio if val_ratio is not None else float(os.getenv('MATERIALIZE_VAL_RATIO', '0.2'))
+        self.workers = workers or int(os.getenv('MATERIALIZE_WORKERS', '8'))
+        self.from_name = from_name
+        state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+        self.db_path = db_path or os.path.join(state_dir, f'materialized_{self.project_id}.sqlite')
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    task_id INTEGER PRIMARY KEY,
+                    target TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL
+                )
+                """
+            )
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    def _meta(self, conn: sqlite3.Connection) -> Dict[str, str]:
+        return dict(conn.execute('SELECT key, value FROM meta'))
+
+    def source_path(self, task: Dict[str, Any]) -> Optional[str]:
+        """Абсолютный путь оригинала (задачи могут ссылаться на превью)"""
+        path = image_path_from_task(task)
+        if not path:
+            return None
+        previews = self.storage_manager.previews
+        if self.storage_manager.serve_previews and previews:
+            path = previews.original_relative_path(path)
+        return os.path.join(self.storage_manager.document_root, path)
+
+    def target_path(self, task_id: int, source: str, label: str) -> str:
+        """Путь в наборе относительно output_dir: split/класс/<ID задачи>_<имя файла>"""
+        label = label.replace(os.sep, '_')
+        return os.path.join(split_for(source, self.val_ratio), label, f"{task_id}_{os.path.basename(source)}")
+
+    def run(self, full: bool = False) -> Dict[str, Any]:
+        """
+        Сборка или обновление набора
+
+        :param full: Проверить все задачи (иначе только измененные после прошлого запуска);
+                     полный проход также убирает файлы удаленных задач
+        """
+        run_started = datetime.now(timezone.utc).isoformat()
+        conn = self._connect()
+        stats = {'linked': 0, 'unchanged': 0, 'removed': 0, 'unlabeled': 0, 'missing': 0, 'methods': {}}
+        try:
+            meta = self._meta(conn)
+            if meta.get('output_dir') != self.output_dir or meta.get('val_ratio') != str(self.val_ratio):
+                # Другая директория или разбиение - набор собирается заново
+                conn.execute('DELETE FROM files')
+                full = True
+            filters = []
+            if not full and meta.get('last_run_started'):
+                filters.append({
+                    'filter': 'filter:tasks:updated_at',
+                    'operator': 'greater',
+                    'type': 'Datetime',
+                    'value': meta['last_run_started']
+                })
+            full = full or not filters
+
+            seen = set()
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for page in self.ls_manager.iter_task_pages(self.project_id, filters=filters):
+                    seen.update(task['id'] for task in page)
+                    self._apply_page(conn, pool, page, stats)
+                if full:
+                    stale = [row for row in conn.execute('SELECT task_id, target FROM files') if row[0] not in seen]
+                    self._remove(conn, stale, stats)
+
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', [
+                    ('output_dir', self.output_dir),
+                    ('val_ratio', str(self.val_ratio)),
+                    ('last_run_started', run_started)
+                ])
+        finally:
+            conn.close()
+
+        logger.info(f"Набор данных {self.output_dir} ({'полный' if full else 'инкрементальный'} проход): {stats}")
+        return stats
+
+    def _apply_page(self, conn: sqlite3.Connection, pool: ThreadPoolExecutor, page: List[Dict[str, Any]],
+                    stats: Dict[str, Any]):
+        ids = [task['id'] for task in page]
+        current = {
+            row[0]: row[1:] for row in conn.execute(
+                f"SELECT task_id, target, source, size, mtime_ns FROM files "
+                f"WHERE task_id IN ({','.join('?' * len(ids))})", ids
+            )
+        }
+        jobs: List[Tuple[int, str, str, int, int]] = []
+        stale: List[Tuple[int, str]] = []
+        for task in page:
+            task_id = task['id']
+            label = label_from_task(task, self.from_name)
+            source = self.source_path(task)
+            st = None
+            if not (source and label):
+                stats['unlabeled'] += 1
+            else:
+                try:
+                    st = os.stat(source)
+                except FileNotFoundError:
+                    stats['missing'] += 1
+            if st is None:
+                if task_id in current:
+                    stale.append((task_id, current[task_id][0]))
+                continue
+            target = self.target_path(task_id, source, label)
+            record = (target, source, st.st_size, st.st_mtime_ns)
+            if current.get(task_id) == record and os.path.lexists(os.path.join(self.output_dir, target)):
+                stats['unchanged'] += 1
+                continue
+            if task_id in current and current[task_id][0] != target:
+                # Класс или разбиение изменились - старый файл убирается
+                stale.append((task_id, current[task_id][0]))
+            jobs.append((task_id,) + record)
+
+        self._remove(conn, stale, stats, keep={job[0] for job in jobs})
+        methods = pool.map(
+            lambda job: link_file(job[2], os.path.join(self.output_dir, job[1]), self.link_mode), jobs
+        )
+        for method in methods:
+            stats['methods'][method] = stats['methods'].get(method, 0) + 1
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)', jobs)
+        stats['linked'] += len(jobs)
+
+    def _remove(self, conn: sqlite3.Connection, rows: List[Tuple[int, str]], stats: Dict[str, Any],
+                keep: set = frozenset()):
+        """Удаление файлов из набора (keep - задачи, которые сразу получат новый файл)"""
+        for task_id, target in rows:
+            try:
+                os.remove(os.path.join(self.output_dir, target))
+            except FileNotFoundError:
+                pass
+        with conn:
+            conn.executemany(
+                'DELETE FROM files WHERE task_id = ?', ((task_id,) for task_id, _ in rows if task_id not in keep)
+            )
+        stats['removed'] += len(rows)
+
+
+def main():
+    from label_studio_client import LabelStudioManager
+    from storage_manager import StorageManager
+
+    parser = argparse.ArgumentParser(description='Сборка обучающего набора по аннотациям без копирования файлов')
+    parser.add_argument('--output', default=None, help='Директория набора (MATERIALIZE_DIR)')
+    parser.add_argument('--link', choices=LINK_MODES, default=None, help='Способ размещения файлов (MATERIALIZE_LINK)')
+    parser.add_argument('--val-ratio', type=float, default=None, help='Доля val (MATERIALIZE_VAL_RATIO)')
+    parser.add_argument('--full', action='store_true', help='Проверить все задачи, а не только измененные')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    materializer = DatasetMaterializer(
+        StorageManager(LabelStudioManager()),
+        output_dir=args.output,
+        link_mode=args.link,
+        val_ratio=args.val_ratio
+    )
+    print(materializer.run(full=args.full))
+
+
+if __name__ == "__main__":
+    main()
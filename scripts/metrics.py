@@ -0,0 +1,303 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SYNC_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.type}'
+        yield from self._samples()
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f'{self.name}{_format_labels(self.label_names, key)} {value}'
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._values.items())
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.label_names, key, f'le="{bound}"')
+                yield f'{self.name}_bucket{labels} {bucket_count}'
+            labels = _format_labels(self.label_names, key, 'le="+Inf"')
+            yield f'{self.name}_bucket{labels} {count}'
+            yield f'{self.name}_sum{_format_labels(self.label_names, key)} {total}'
+            yield f'{self.name}_count{_format_labels(self.label_names, key)} {count}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'label_studio_requests_total', 'Запросы к API Label Studio', ('method', 'endpoint', 'status')
+))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'label_studio_request_duration_seconds', 'Длительность запросов к API Label Studio', ('method', 'endpoint')
+))
+RETRIES = REGISTRY.register(Counter(
+    'label_studio_retries_total', 'Повторы вызовов после ошибки (tenacity)', ('function',)
+))
+FILES_SCANNED = REGISTRY.register(Counter(
+    'storage_files_scanned_total', 'Файлов найдено при обходе директорий'
+))
+SCAN_RATE = REGISTRY.register(Gauge(
+    'storage_scan_files_per_second', 'Скорость последнего обхода директории'
+))
+TASKS_IMPORTED = REGISTRY.register(Counter(
+    'label_studio_tasks_imported_total', 'Задач импортировано через API импорта'
+))
+IMPORT_RATE = REGISTRY.register(Gauge(
+    'label_studio_import_tasks_per_second', 'Скорость последнего импорта задач'
+))
+SYNC_DURATION = REGISTRY.register(Histogram(
+    'storage_sync_duration_seconds', 'Длительность синхронизации хранилища', ('mode',), buckets=SYNC_BUCKETS
+))
+SYNC_LAST_SUCCESS = REGISTRY.register(Gauge(
+    'storage_sync_last_success_timestamp_seconds', 'Время последней успешной синхронизации', ('mode',)
+))
+
+CONCURRENCY_LIMIT = REGISTRY.register(Gauge(
+    'label_studio_concurrency_limit', 'Текущий лимит параллельных запросов (AIMD)'
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    'label_studio_requests_in_flight', 'Запросов к API Label Studio в работе'
+))
+THROTTLED = REGISTRY.register(Counter(
+    'label_studio_throttled_total', 'Запросы, ожидавшие токен ограничения частоты', ('endpoint',)
+))
+
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    'label_studio_circuit_state', 'Состояние размыкателя цепи: 0 - замкнут, 1 - пробный запрос, 2 - разомкнут'
+))
+
+
+def endpoint_label(url: str) -> str:
+    """Шаблон эндпоинта для меток: /api/projects/12/import?x=1 -> /api/projects/{id}/import"""
+    path = url.split('?', 1)[0]
+    if '://' in path:
+        path = '/' + path.split('://', 1)[1].partition('/')[2]
+    return _ID_SEGMENT.sub('/{id}', path)
+
+
+def observe_request(method: str, url: str, status, seconds: float):
+    endpoint = endpoint_label(url)
+    REQUESTS.inc(method=method, endpoint=endpoint, status=status)
+    REQUEST_DURATION.observe(seconds, method=method, endpoint=endpoint)
+
+
+def count_retry(retry_state):
+    """before_sleep для tenacity: учет повторов по имени функции"""
+    fn = retry_state.fn
+    name = getattr(fn, '__qualname__', None) or getattr(fn, '__name__', 'unknown')
+    RETRIES.inc(function=name)
+    logger.warning(f"Повтор {name} (попытка {retry_state.attempt_number}): {retry_state.outcome.exception()}")
+
+
+def record_sync(mode: str, started: float):
+    """
+    Длительность успешной синхронизации и время ее завершения
+
+    :param mode: incremental, full или paths
+    :param started: time.perf_counter() в начале синхронизации
+    """
+    SYNC_DURATION.observe(time.perf_counter() - started, mode=mode)
+    SYNC_LAST_SUCCESS.set(time.time(), mode=mode)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'StorageManagerMetrics/1.0'
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body = REGISTRY.render().encode('utf-8')
+            self._send(200, body, 'text/plain; version=0.0.4; charset=utf-8')
+        elif path in ('/health', '/healthz'):
+            healthy, details = self.server.health()
+            body = json.dumps(details, ensure_ascii=False).encode('utf-8')
+            self._send(200 if healthy else 503, body, 'application/json')
+        else:
+            self._send(404, b'{"detail": "Not found"}', 'application/json')
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class MetricsServer:
+    """
+    Встроенный HTTP сервер: /health для HEALTHCHECK контейнера и /metrics в формате Prometheus
+    """
+
+    def __init__(
+        self,
+        host: str = None,
+        port: int = None,
+        health_check: Optional[Callable[[], bool]] = None
+    ):
+        """
+        :param host: Адрес (METRICS_HOST, по умолчанию 0.0.0.0)
+        :param port: Порт (METRICS_PORT, по умолчанию 8000)
+        :param health_check: Дополнительная проверка состояния; False - ответ 503
+        """
+        host = host or os.getenv('METRICS_HOST', '0.0.0.0')
+        port = port if port is not None else int(os.getenv('METRICS_PORT', '8000'))
+        self.health_check = health_check
+        self.started_at = time.time()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.health = self.health
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def health(self):
+        healthy = True
+        if self.health_check is not None:
+            try:
+                healthy = bool(self.health_check())
+            except Exception as e:
+                logger.warning(f"Ошибка проверки состояния: {e}")
+                healthy = False
+        return healthy, {
+            'status': 'ok' if healthy else 'unhealthy',
+            'uptime': round(time.time() - self.started_at, 1),
+        }
+
+    def start(self) -> 'MetricsServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+        logger.info(f"Метрики и health check: {self.url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_metrics_server(**kwargs) -> Optional[MetricsServer]:
+    """Запуск сервера метрик, если он не отключен (METRICS_ENABLED, по умолчанию true)"""
+    if os.getenv('METRICS_ENABLED', 'true').lower() != 'true':
+        return None
+    try:
+        return MetricsServer(**kwargs).start()
+    except OSError as e:
+        logger.warning(f"Не удалось запустить сервер метрик: {e}")
+        return None
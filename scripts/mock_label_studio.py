@@ -0,0 +1,415 @@
+import os
+import re
+import json
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, quote, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class MockLabelStudioState:
+    """Состояние заглушки Label Studio в памяти"""
+
+    def __init__(self, document_root: str = None):
+        self.document_root = document_root or os.getenv('LABEL_STUDIO_LOCAL_FILES_DOCUMENT_ROOT', '/data/files')
+        self.lock = threading.Lock()
+        self.projects: Dict[int, Dict[str, Any]] = {}
+        self.storages: Dict[int, Dict[str, Any]] = {}
+        self.tasks: Dict[int, Dict[str, Any]] = {}
+        self.storage_keys: Dict[int, set] = {}
+        self._ids = {'project': 0, 'storage': 0, 'task': 0}
+
+    def next_id(self, kind: str) -> int:
+        self._ids[kind] += 1
+        return self._ids[kind]
+
+    def add_project(self, title: str, label_config: str = '') -> Dict[str, Any]:
+        project_id = self.next_id('project')
+        project = {
+            'id': project_id,
+            'title': title,
+            'label_config': label_config,
+            'created_at': _now(),
+        }
+        self.projects[project_id] = project
+        return project
+
+    def add_task(self, project_id: int, task: Dict[str, Any]) -> int:
+        task_id = self.next_id('task')
+        now = _now()
+        self.tasks[task_id] = {
+            'id': task_id,
+            'project': project_id,
+            'data': task.get('data', task),
+            'annotations': task.get('annotations', []),
+            'predictions': task.get('predictions', []),
+            'created_at': now,
+            'updated_at': now,
+        }
+        return task_id
+
+
+class MockLabelStudioHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик REST API заглушки: проекты, локальные хранилища, задачи и health.
+    Поддерживает только те эндпоинты и поля, которые использует этот проект.
+    """
+
+    server_version = 'MockLabelStudio/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    routes = [
+        ('GET', r'/(api/)?health', 'health'),
+        ('GET', r'/api/version', 'version'),
+        ('GET', r'/api/projects/?', 'list_projects'),
+        ('POST', r'/api/projects/?', 'create_project'),
+        ('GET', r'/api/projects/(\d+)/?', 'get_project'),
+        ('POST', r'/api/projects/(\d+)/import', 'import_tasks'),
+        ('POST', r'/api/projects/(\d+)/import/predictions', 'import_predictions'),
+        ('GET', r'/api/tasks/?', 'list_tasks'),
+        ('POST', r'/api/dm/actions/?', 'dm_action'),
+        ('GET', r'/api/tasks/(\d+)/?', 'get_task'),
+        ('PATCH', r'/api/tasks/(\d+)/?', 'update_task'),
+        ('DELETE', r'/api/tasks/(\d+)/?', 'delete_task'),
+        ('GET', r'/api/storages/localfiles/?', 'list_storages'),
+        ('POST', r'/api/storages/localfiles/?', 'create_storage'),
+        ('GET', r'/api/storages/localfiles/(\d+)/?', 'get_storage'),
+        ('PATCH', r'/api/storages/localfiles/(\d+)/?', 'update_storage'),
+        ('DELETE', r'/api/storages/localfiles/(\d+)/?', 'delete_storage'),
+        ('POST', r'/api/storages/localfiles/(\d+)/sync', 'sync_storage'),
+        ('GET', r'/api/storages/localfiles/(\d+)/stats', 'storage_stats'),
+    ]
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    @property
+    def state(self) -> MockLabelStudioState:
+        return self.server.state
+
+    def _dispatch(self, method: str):
+        parsed = urlparse(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        # Тело читается всегда, иначе оно останется в keep-alive соединении
+        length = int(self.headers.get('Content-Length') or 0)
+        self.raw_body = self.rfile.read(length) if length else b''
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        api_key = self.server.api_key
+        if api_key and parsed.path.startswith('/api/') and not parsed.path.startswith('/api/health'):
+            if self.headers.get('Authorization') != f'Token {api_key}':
+                return self._send(401, {'detail': 'Authentication credentials were not provided.'})
+
+        for route_method, pattern, handler in self.routes:
+            if route_method != method:
+                continue
+            match = re.fullmatch(pattern, parsed.path)
+            if match:
+                args = [int(g) for g in match.groups() if g and g.isdigit()]
+                try:
+                    status, body = getattr(self, f'handle_{handler}')(*args)
+                except KeyError:
+                    status, body = 404, {'detail': 'Not found.'}
+                return self._send(status, body)
+        return self._send(404, {'detail': 'Not found.'})
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _body(self) -> Any:
+        if not self.raw_body:
+            return {}
+        return json.loads(self.raw_body)
+
+    def _send(self, status: int, body: Any = None):
+        payload = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+    def _page(self, items, default_size=30):
+        page = int(self.query.get('page', 1))
+        page_size = int(self.query.get('page_size', default_size))
+        start = (page - 1) * page_size
+        return items[start:start + page_size], page, page_size
+
+    # --- health ---
+    def handle_health(self):
+        return 200, {'status': 'UP'}
+
+    def handle_version(self):
+        return 200, {'release': 'mock'}
+
+    # --- projects ---
+    def handle_list_projects(self):
+        with self.state.lock:
+            projects = list(self.state.projects.values())
+        title = self.query.get('title')
+        if title:
+            projects = [p for p in projects if title.lower() in p['title'].lower()]
+        results, page, page_size = self._page(projects)
+        if not results and page > 1:
+            return 404, {'detail': 'Invalid page.'}
+        has_next = page * page_size < len(projects)
+        return 200, {
+            'count': len(projects),
+            'next': f'/api/projects?page={page + 1}&page_size={page_size}' if has_next else None,
+            'previous': None,
+            'results': results,
+        }
+
+    def handle_create_project(self):
+        body = self._body()
+        with self.state.lock:
+            project = self.state.add_project(body.get('title', ''), body.get('label_config', ''))
+        return 201, project
+
+    def handle_get_project(self, project_id):
+        with self.state.lock:
+            project = dict(self.state.projects[project_id])
+            project['task_number'] = sum(1 for t in self.state.tasks.values() if t['project'] == project_id)
+        return 200, project
+
+    def handle_import_tasks(self, project_id):
+        body = self._body()
+        tasks = body if isinstance(body, list) else [body]
+        with self.state.lock:
+            if project_id not in self.state.projects:
+                raise KeyError(project_id)
+            task_ids = [self.state.add_task(project_id, task) for task in tasks]
+        return 201, {'task_count': len(task_ids), 'task_ids': task_ids}
+
+    def handle_import_predictions(self, project_id):
+        predictions = self._body()
+        with self.state.lock:
+            for prediction in predictions:
+                task = self.state.tasks[prediction['task']]
+                task['predictions'].append({k: v for k, v in prediction.items() if k != 'task'})
+        return 201, {'created': len(predictions)}
+
+    # --- tasks ---
+    def handle_list_tasks(self):
+        project_id = int(self.query.get('project', 0))
+        with self.state.lock:
+            tasks = sorted(
+                (t for t in self.state.tasks.values() if t['project'] == project_id),
+                key=lambda t: t['id']
+            )
+        query = json.loads(self.query.get('query', '{}') or '{}')
+        for item in (query.get('filters') or {}).get('items', []):
+            field = item['filter'].split(':')[-1]
+            if item.get('operator') == 'greater':
+                tasks = [t for t in tasks if t[field] > item['value']]
+            elif item.get('operator') == 'in':
+                tasks = [t for t in tasks if item['value']['min'] <= t[field] <= item['value']['max']]
+        results, page, page_size = self._page(tasks, default_size=100)
+        if not results and page > 1:
+            return 404, {'detail': 'Invalid page.'}
+        return 200, {'tasks': results, 'total': len(tasks)}
+
+    def handle_get_task(self, task_id):
+        with self.state.lock:
+            return 200, self.state.tasks[task_id]
+
+    def handle_update_task(self, task_id):
+        body = self._body()
+        with self.state.lock:
+            task = self.state.tasks[task_id]
+            task.update({k: v for k, v in body.items() if k in ('data', 'meta')})
+            task['updated_at'] = _now()
+            return 200, task
+
+    def handle_delete_task(self, task_id):
+        with self.state.lock:
+            del self.state.tasks[task_id]
+        return 204, None
+
+    # --- data manager ---
+    def handle_dm_action(self):
+        if self.query.get('id') != 'delete_tasks':
+            return 400, {'detail': f"Unknown action {self.query.get('id')}"}
+        project_id = int(self.query.get('project', 0))
+        selected = (self._body() or {}).get('selectedItems') or {}
+        with self.state.lock:
+            ids = [
+                task_id for task_id, task in self.state.tasks.items()
+                if task['project'] == project_id and (
+                    task_id not in (selected.get('excluded') or []) if selected.get('all')
+                    else task_id in (selected.get('included') or [])
+                )
+            ]
+            for task_id in ids:
+                del self.state.tasks[task_id]
+        return 200, {'processed_items': len(ids), 'detail': f'Deleted {len(ids)} tasks'}
+
+    # --- local storages ---
+    def handle_list_storages(self):
+        project_id = self.query.get('project')
+        with self.state.lock:
+            storages = [
+                s for s in self.state.storages.values()
+                if project_id is None or s['project'] == int(project_id)
+            ]
+        return 200, storages
+
+    def handle_create_storage(self):
+        body = self._body()
+        with self.state.lock:
+            storage_id = self.state.next_id('storage')
+            storage = {
+                'id': storage_id,
+                'type': 'localfiles',
+                'title': body.get('title', ''),
+                'path': body.get('path', ''),
+                'regex_filter': body.get('regex_filter'),
+                'use_blob_urls': body.get('use_blob_urls', True),
+                'project': body.get('project'),
+                'status': 'initialized',
+                'last_sync': None,
+                'last_sync_count': None,
+            }
+            self.state.storages[storage_id] = storage
+            self.state.storage_keys[storage_id] = set()
+        return 201, storage
+
+    def handle_get_storage(self, storage_id):
+        with self.state.lock:
+            return 200, self.state.storages[storage_id]
+
+    def handle_update_storage(self, storage_id):
+        body = self._body()
+        with self.state.lock:
+            storage = self.state.storages[storage_id]
+            storage.update(body)
+            return 200, storage
+
+    def handle_delete_storage(self, storage_id):
+        with self.state.lock:
+            del self.state.storages[storage_id]
+            self.state.storage_keys.pop(storage_id, None)
+        return 204, None
+
+    def handle_sync_storage(self, storage_id):
+        with self.state.lock:
+            storage = self.state.storages[storage_id]
+            path = storage['path']
+            regex = re.compile(storage['regex_filter']) if storage.get('regex_filter') else None
+            root = os.path.abspath(self.state.document_root)
+            count = 0
+            for dirpath, _, filenames in os.walk(path):
+                for name in filenames:
+                    if regex and not regex.match(name):
+                        continue
+                    full = os.path.join(dirpath, name)
+                    if full in self.state.storage_keys[storage_id]:
+                        continue
+                    relative = os.path.relpath(os.path.abspath(full), root).replace(os.sep, '/')
+                    self.state.add_task(storage['project'], {'data': {'image': f"/data/local-files/?d={quote(relative, safe='/')}"}})
+                    self.state.storage_keys[storage_id].add(full)
+                    count += 1
+            storage.update(status='completed', last_sync=_now(), last_sync_count=count)
+            return 200, storage
+
+    def handle_storage_stats(self, storage_id):
+        with self.state.lock:
+            storage = self.state.storages[storage_id]
+            return 200, {
+                'id': storage_id,
+                'status': storage['status'],
+                'last_sync_count': storage['last_sync_count'],
+                'total_keys': len(self.state.storage_keys[storage_id]),
+            }
+
+
+class MockLabelStudioServer:
+    """
+    Локальная заглушка Label Studio для тестов и бенчмарков.
+
+    Пример:
+        with MockLabelStudioServer(api_key='test') as server:
+            manager = AsyncLabelStudioManager(url=server.url, api_key='test')
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, api_key: Optional[str] = None,
+                 latency: float = 0.0, document_root: str = None):
+        self.httpd = ThreadingHTTPServer((host, port), MockLabelStudioHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = MockLabelStudioState(document_root)
+        self.httpd.api_key = api_key
+        self.httpd.latency = latency
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def state(self) -> MockLabelStudioState:
+        return self.httpd.state
+
+    def start(self) -> 'MockLabelStudioServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='mock-label-studio', daemon=True)
+        self._thread.start()
+        logger.info(f"Заглушка Label Studio запущена: {self.url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная заглушка Label Studio API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--api-key', default=os.getenv('LABEL_STUDIO_API_KEY'))
+    parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа в секундах')
+    parser.add_argument('--document-root', default=None, help='Корень локальных файлов')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = MockLabelStudioServer(
+        args.host, args.port, api_key=args.api_key, latency=args.latency, document_root=args.document_root
+    )
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import os
+import json
+import signal
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from requests.adapters import HTTPAdapter
+
+from file_manifest import DEFAULT_STATE_DIR
+from label_studio_client import LabelStudioManager
+from metrics import start_metrics_server
+from sharding import ShardManager
+from storage_manager import StorageManager
+from watcher import WatchDaemon
+
+logger = logging.getLogger(__name__)
+
+
+class Dataset(NamedTuple):
+    """Описание набора данных: проект, директория файлов и конфигурация разметки"""
+    project: str
+    data_dir: str
+    label_config: Optional[str] = None
+    sharding: bool = False
+
+
+def load_datasets(path: str) -> List[Dataset]:
+    """
+    Чтение списка наборов данных из JSON
+
+    Формат: [{"project": ..., "data_dir": ..., "label_config": ..., "sharding": false}, ...]
+    или {"datasets": [...]}. label_config - XML или путь к файлу с XML.
+    """
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    if isinstance(config, dict):
+        config = config.get('datasets', [])
+
+    datasets = []
+    for item in config:
+        label_config = item.get('label_config')
+        if label_config and not label_config.lstrip().startswith('<'):
+            config_path = os.path.join(os.path.dirname(os.path.abspath(path)), label_config)
+            with open(config_path, encoding='utf-8') as f:
+                label_config = f.read()
+        datasets.append(Dataset(
+            project=item['project'],
+            data_dir=item.get('data_dir', 'augmented_images'),
+            label_config=label_config,
+            sharding=bool(item.get('sharding', False))
+        ))
+
+    projects = [d.project for d in datasets]
+    duplicates = {p for p in projects if projects.count(p) > 1}
+    if duplicates:
+        raise ValueError(f"Проекты указаны несколько раз: {sorted(duplicates)}")
+    return datasets
+
+
+class Orchestrator:
+    """
+    Обслуживание нескольких проектов Label Studio в одном процессе.
+
+    Все проекты используют один клиент SDK с общим пулом соединений.
+    reconcile() параллельно приводит каждый набор данных к описанному
+    состоянию: проект, локальное хранилище и синхронизация файлов.
+    Ошибка одного набора данных не прерывает обработку остальных.
+    """
+
+    def __init__(self, datasets: List[Dataset], workers: int = None, interval: float = None):
+        """
+        :param datasets: Наборы данных
+        :param workers: Параллельно обрабатываемых наборов (ORCHESTRATOR_WORKERS, по умолчанию 4)
+        :param interval: Пауза между циклами, сек (RECONCILE_INTERVAL, 0 - один цикл)
+        """
+        if not datasets:
+            raise ValueError("Список наборов данных пуст")
+        self.datasets = datasets
+        self.workers = workers or int(os.getenv('ORCHESTRATOR_WORKERS', '4'))
+        self.interval = interval if interval is not None else float(os.getenv('RECONCILE_INTERVAL', '0'))
+        self._stop = threading.Event()
+        self._storage_managers: Dict[str, StorageManager] = {}
+        self._storage_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        first = datasets[0]
+        self.ls_manager = LabelStudioManager(project_name=first.project, label_config=first.label_config)
+        self._configure_pool()
+
+    def _configure_pool(self):
+        """Пул соединений общего клиента с запасом на все параллельные запросы"""
+        import_workers = int(os.getenv('IMPORT_WORKERS', '4'))
+        pool_size = int(os.getenv('ORCHESTRATOR_POOL_SIZE', '0')) or self.workers * (import_workers + 1)
+        session = self.ls_manager.client.session
+        for prefix in ('http://', 'https://'):
+            retries = session.get_adapter(prefix).max_retries
+            session.mount(prefix, HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries))
+
+    def storage_manager(self, dataset: Dataset) -> StorageManager:
+        """StorageManager набора данных (создается один раз за время работы процесса)"""
+        with self._lock:
+            if dataset.project not in self._storage_managers:
+                if dataset.project == self.ls_manager.project_name:
+                    ls_manager = self.ls_manager
+                else:
+                    ls_manager = self.ls_manager.for_project(dataset.project, label_config=dataset.label_config)
+                self._storage_managers[dataset.project] = StorageManager(ls_manager, data_dir=dataset.data_dir)
+            return self._storage_managers[dataset.project]
+
+    def ensure_storage(self, storage_manager: StorageManager, dataset: Dataset) -> int:
+        """ID локального хранилища набора данных; хранилище создается при отсутствии"""
+        if dataset.project in self._storage_ids:
+            return self._storage_ids[dataset.project]
+        storages = storage_manager.list_storages()
+        storage = next((s for s in storages if s.get('path') == storage_manager.storage_path), None)
+        if storage is None and storages:
+            storage = storages[0]
+            # SERVE_PREVIEWS переключает хранилище между оригиналами и деревом превью
+            logger.info(
+                f"[{dataset.project}] Обновление пути хранилища {storage['id']}: {storage_manager.storage_path}"
+            )
+            storage = storage_manager.update_storage(storage['id'], path=storage_manager.storage_path)
+        if storage is None:
+            storage = storage_manager.create_storage(title=dataset.project)
+            logger.info(f"[{dataset.project}] Создано хранилище {storage['id']}")
+        self._storage_ids[dataset.project] = storage['id']
+        return storage['id']
+
+    def reconcile_dataset(self, dataset: Dataset) -> Dict[str, Any]:
+        storage_manager = self.storage_manager(dataset)
+        if dataset.sharding:
+            state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+            state_path = os.path.join(state_dir, f'shards_{storage_manager.client.get_project_id()}.json')
+            return ShardManager(storage_manager, state_path=state_path).run(scan_all=True)
+        storage_id = self.ensure_storage(storage_manager, dataset)
+        with storage_manager.sync_lock:
+            return storage_manager.sync_storage(storage_id, scan_all=True)
+
+    def reconcile(self) -> Dict[str, Any]:
+        """
+        Один цикл обработки всех наборов данных
+
+        :return: Результаты по проектам ({'error': ...} для завершившихся с ошибкой)
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='reconcile') as pool:
+            futures = {pool.submit(self.reconcile_dataset, d): d for d in self.datasets}
+            for future, dataset in futures.items():
+                try:
+                    results[dataset.project] = future.result()
+                    logger.info(f"[{dataset.project}] {results[dataset.project]}")
+                except Exception as e:
+                    logger.error(f"[{dataset.project}] Ошибка обработки набора данных: {e}")
+                    results[dataset.project] = {'error': str(e)}
+        return results
+
+    def start_watchers(self) -> List[WatchDaemon]:
+        """Режим наблюдения для каждого набора данных без шардирования"""
+        daemons = []
+        for dataset in self.datasets:
+            if dataset.sharding:
+                logger.warning(f"[{dataset.project}] Режим наблюдения не поддерживается для шардов")
+                continue
+            if dataset.project not in self._storage_ids:
+                continue
+            daemon = WatchDaemon(self.storage_manager(dataset), self._storage_ids[dataset.project])
+            threading.Thread(target=daemon.run, name=f'watch-{dataset.project}', daemon=True).start()
+            daemons.append(daemon)
+        return daemons
+
+    def run(self, watch: bool = None):
+        """
+        Циклическая обработка до остановки (SIGTERM/SIGINT) или один цикл при interval=0
+
+        :param watch: Режим наблюдения за файлами между циклами (WATCH_ENABLED)
+        """
+        if watch is None:
+            watch = os.getenv('WATCH_ENABLED', 'false').lower() == 'true'
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, lambda *_: self.stop())
+
+        self.reconcile()
+        daemons = self.start_watchers() if watch else []
+        while self.interval > 0 and not self._stop.wait(self.interval):
+            self.reconcile()
+        if daemons:
+            self._stop.wait()
+            for daemon in daemons:
+                daemon.stop()
+        logger.info("Оркестратор остановлен")
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Обслуживание нескольких проектов Label Studio')
+    parser.add_argument('config', nargs='?', default=os.getenv('DATASETS_CONFIG'), help='JSON со списком наборов данных')
+    parser.add_argument('--once', action='store_true', help='Один цикл без повторов')
+    args = parser.parse_args()
+    if not args.config:
+        parser.error('укажите файл конфигурации или DATASETS_CONFIG')
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    if not args.once:
+        start_metrics_server()
+    orchestrator = Orchestrator(load_datasets(args.config), interval=0 if args.once else None)
+    orchestrator.run()
+
+
+if __name__ == "__main__":
+    main()
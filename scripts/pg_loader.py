@@ -0,0 +1,299 @@
+import io
+import os
+import csv
+import json
+import random
+import sqlite3
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from task_importer import chunked
+
+logger = logging.getLogger(__name__)
+
+# Таблицы Label Studio (Django): задачи, связи задач с файлами локального хранилища и сводка проекта
+TASK_TABLE = 'task'
+LINK_TABLE = 'io_storages_localfilesimportstoragelink'
+STORAGE_TABLE = 'io_storages_localfilesimportstorage'
+SUMMARY_TABLE = 'projects_projectsummary'
+
+# Django не задает значения по умолчанию в базе, поэтому все NOT NULL поля передаются явно
+TASK_COLUMNS = (
+    'id', 'data', 'meta', 'created_at', 'updated_at', 'is_labeled', 'overlap', 'project_id', 'inner_id',
+    'total_annotations', 'cancelled_annotations', 'total_predictions',
+    'comment_count', 'unresolved_comment_count'
+)
+LINK_COLUMNS = ('key', 'object_exists', 'created_at', 'task_id', 'storage_id')
+
+
+def connect_postgres():
+    """Подключение к базе Label Studio по POSTGRES_HOST/PORT/DB/USER/PASSWORD (psycopg2)"""
+    try:
+        import psycopg2
+    except ImportError:
+        raise RuntimeError("Для прямой загрузки в Postgres установите psycopg2: pip install psycopg2-binary")
+    return psycopg2.connect(
+        host=os.getenv('POSTGRES_HOST'),
+        port=int(os.getenv('POSTGRES_PORT', '5432')),
+        dbname=os.getenv('POSTGRES_DB'),
+        user=os.getenv('POSTGRES_USER'),
+        password=os.getenv('POSTGRES_PASSWORD')
+    )
+
+
+def _json_value(value) -> Any:
+    if isinstance(value, (bytes, str)):
+        return json.loads(value) if value else None
+    return value
+
+
+class PostgresDialect:
+    """Postgres: ID из последовательности таблицы, COPY FROM STDIN (CSV), блокировка строки проекта"""
+    placeholder = '%s'
+
+    def begin(self, cursor):
+        pass
+
+    def lock_project(self, cursor, project_id: int):
+        # Параллельные загрузки в один проект получают непересекающиеся inner_id
+        cursor.execute('SELECT id FROM project WHERE id = %s FOR UPDATE', (project_id,))
+
+    def allocate_ids(self, cursor, table: str, count: int) -> List[int]:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+            (table, count)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def insert(self, cursor, table: str, columns: Sequence[str], rows: List[tuple]):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            # Пустое значение без кавычек - NULL в CSV формате COPY
+            writer.writerow(['' if v is None else ('t' if v is True else 'f' if v is False else v) for v in row])
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+class SQLiteDialect:
+    """Локальная замена базы Label Studio (SQLite с той же схемой) для проверки загрузчика"""
+    placeholder = '?'
+
+    def begin(self, cursor):
+        # Как и в psycopg2, незавершенная транзакция вызывающего продолжается (BEGIN внутри нее - ошибка)
+        if not cursor.connection.in_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+
+    def lock_project(self, cursor, project_id: int):
+        pass
+
+    def allocate_ids(self, cursor, table: str, count: int) -> List[int]:
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+        start = cursor.fetchone()[0] + 1
+        return list(range(start, start + count))
+
+    def insert(self, cursor, table: str, columns: Sequence[str], rows: List[tuple]):
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows
+        )
+
+
+def dialect_for(conn):
+    if isinstance(conn, sqlite3.Connection):
+        return SQLiteDialect()
+    return PostgresDialect()
+
+
+def create_standin_schema(conn: sqlite3.Connection):
+    """Таблицы Label Studio, которые использует загрузчик (для SQLite замены)"""
+    conn.executescript(
+        f"""
+        CREATE TABLE IF NOT EXISTS project (id INTEGER PRIMARY KEY, title TEXT);
+        CREATE TABLE IF NOT EXISTS {TASK_TABLE} (
+            id INTEGER PRIMARY KEY, data TEXT NOT NULL, meta TEXT, created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL, is_labeled BOOLEAN NOT NULL, overlap INTEGER NOT NULL,
+            project_id INTEGER REFERENCES project (id), inner_id INTEGER,
+            total_annotations INTEGER NOT NULL, cancelled_annotations INTEGER NOT NULL,
+            total_predictions INTEGER NOT NULL, comment_count INTEGER NOT NULL,
+            unresolved_comment_count INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS {STORAGE_TABLE} (
+            id INTEGER PRIMARY KEY, project_id INTEGER, path TEXT, last_sync TEXT, last_sync_count INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS {LINK_TABLE} (
+            id INTEGER PRIMARY KEY, key TEXT NOT NULL, object_exists BOOLEAN NOT NULL, created_at TEXT NOT NULL,
+            task_id INTEGER NOT NULL UNIQUE REFERENCES {TASK_TABLE} (id), storage_id INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} (
+            project_id INTEGER PRIMARY KEY, all_data_columns TEXT, common_data_columns TEXT
+        );
+        """
+    )
+
+
+class BulkTaskLoader:
+    """
+    Прямая загрузка задач в базу Label Studio для первичного импорта миллионов файлов.
+
+    Строки задач и связей с локальным хранилищем пишутся пачками (COPY в
+    Postgres) в одной транзакции: при ошибке в базе не остается ничего.
+    В той же транзакции обновляются счетчики, которые сервер ведет при
+    обычном импорте (колонки данных в сводке проекта, время и количество
+    последней синхронизации хранилища). Связи с хранилищем не дают
+    последующей синхронизации хранилища создать задачи повторно.
+    """
+
+    def __init__(
+        self,
+        conn,
+        project_id: int,
+        storage_id: int = None,
+        batch_size: int = None,
+        dialect=None,
+        sample: int = None
+    ):
+        """
+        :param conn: Соединение DB-API (psycopg2 или sqlite3 для замены базы)
+        :param project_id: ID проекта
+        :param storage_id: ID локального хранилища (для связей задач с файлами)
+        :param batch_size: Строк в одной пачке (BULK_BATCH_SIZE, по умолчанию 10000)
+        :param sample: Размер случайной выборки задач для проверки через REST (BULK_VERIFY_SAMPLE, по умолчанию 100)
+        """
+        self.conn = conn
+        self.project_id = project_id
+        self.storage_id = storage_id
+        self.batch_size = batch_size or int(os.getenv('BULK_BATCH_SIZE', '10000'))
+        self.dialect = dialect or dialect_for(conn)
+        self.sample = sample or int(os.getenv('BULK_VERIFY_SAMPLE', '100'))
+
+    def _sql(self, query: str) -> str:
+        return query.replace('%s', self.dialect.placeholder)
+
+    def load(self, items: Iterable[Tuple[Optional[str], Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Загрузка задач
+
+        :param items: Пары (ключ файла в хранилище или None, данные задачи)
+        :return: Количество задач и случайная выборка пар (ID задачи, данные) для проверки через REST
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        loaded = 0
+        # Выборка резервуаром: память не зависит от количества загруженных задач
+        sample: List[Tuple[int, Dict[str, Any]]] = []
+        data_columns: Dict[str, int] = {}
+        common = None
+        cursor = self.conn.cursor()
+        try:
+            self.dialect.begin(cursor)
+            self.dialect.lock_project(cursor, self.project_id)
+            cursor.execute(
+                self._sql(f'SELECT COALESCE(MAX(inner_id), 0) FROM {TASK_TABLE} WHERE project_id = %s'),
+                (self.project_id,)
+            )
+            inner_id = cursor.fetchone()[0]
+
+            for batch in chunked(items, self.batch_size):
+                ids = self.dialect.allocate_ids(cursor, TASK_TABLE, len(batch))
+                tasks, links = [], []
+                for task_id, (key, data) in zip(ids, batch):
+                    inner_id += 1
+                    tasks.append((
+                        task_id, json.dumps(data, ensure_ascii=False), '{}', now, now, False, 1,
+                        self.project_id, inner_id, 0, 0, 0, 0, 0
+                    ))
+                    if key and self.storage_id:
+                        links.append((key, True, now, task_id, self.storage_id))
+                    for column in data:
+                        data_columns[column] = data_columns.get(column, 0) + 1
+                    common = set(data) if common is None else common & set(data)
+                    loaded += 1
+                    if len(sample) < self.sample:
+                        sample.append((task_id, data))
+                    else:
+                        position = random.randrange(loaded)
+                        if position < self.sample:
+                            sample[position] = (task_id, data)
+                self.dialect.insert(cursor, TASK_TABLE, TASK_COLUMNS, tasks)
+                if links:
+                    self.dialect.insert(cursor, LINK_TABLE, LINK_COLUMNS, links)
+                logger.info(f"Загружено в базу {loaded} задач")
+
+            if loaded:
+                self._reconcile(cursor, data_columns, common or set(), loaded, now)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            logger.error("Ошибка прямой загрузки, транзакция отменена")
+            raise
+        finally:
+            cursor.close()
+
+        logger.info(f"Прямая загрузка в проект {self.project_id}: {loaded} задач")
+        return {'loaded': loaded, 'sample': sample}
+
+    def _reconcile(self, cursor, data_columns: Dict[str, int], common: set, count: int, now: str):
+        """Счетчики, которые сервер обновляет при импорте через API (ProjectSummary.update_data_columns)"""
+        cursor.execute(
+            self._sql(f'SELECT all_data_columns, common_data_columns FROM {SUMMARY_TABLE} WHERE project_id = %s'),
+            (self.project_id,)
+        )
+        row = cursor.fetchone()
+        all_columns = (_json_value(row[0]) if row else None) or {}
+        existing_common = _json_value(row[1]) if row else None
+        for column, total in data_columns.items():
+            all_columns[column] = all_columns.get(column, 0) + total
+        common_columns = sorted(common if not existing_common else common & set(existing_common))
+        values = (json.dumps(all_columns), json.dumps(common_columns), self.project_id)
+        if row:
+            cursor.execute(self._sql(
+                f'UPDATE {SUMMARY_TABLE} SET all_data_columns = %s, common_data_columns = %s WHERE project_id = %s'
+            ), values)
+        else:
+            cursor.execute(self._sql(
+                f'INSERT INTO {SUMMARY_TABLE} (all_data_columns, common_data_columns, project_id) VALUES (%s, %s, %s)'
+            ), values)
+        if self.storage_id:
+            cursor.execute(self._sql(
+                f'UPDATE {STORAGE_TABLE} SET last_sync = %s, last_sync_count = %s WHERE id = %s'
+            ), (now, count, self.storage_id))
+
+
+def verify_with_rest(
+    ls_manager,
+    project_id: int,
+    sample: List[Tuple[int, Dict[str, Any]]],
+    expected_total: int = None
+) -> Dict[str, Any]:
+    """
+    Проверка загрузки через REST API: задачи видны серверу и совпадают с импортом через API
+
+    :param sample: Выборка пар (ID задачи, данные) из BulkTaskLoader.load
+    :param expected_total: Ожидаемое количество задач в проекте
+    :return: {'ok', 'task_number', 'expected_total', 'checked', 'mismatches'}
+    """
+    project = ls_manager.make_request('GET', f'/api/projects/{project_id}').json()
+    task_number = project.get('task_number')
+
+    mismatches = []
+    for task_id, data in sample:
+        response = ls_manager.make_request('GET', f'/api/tasks/{task_id}', raise_exceptions=False)
+        if response.status_code != 200:
+            mismatches.append({'id': task_id, 'error': f'HTTP {response.status_code}'})
+        elif response.json().get('data') != data:
+            mismatches.append({'id': task_id, 'expected': data, 'actual': response.json().get('data')})
+
+    ok = not mismatches and (expected_total is None or task_number == expected_total)
+    result = {
+        'ok': ok,
+        'task_number': task_number,
+        'expected_total': expected_total,
+        'checked': len(sample),
+        'mismatches': mismatches[:10]
+    }
+    if ok:
+        logger.info(f"Проверка прямой загрузки через API: {result}")
+    else:
+        logger.error(f"Результат прямой загрузки не совпадает с API: {result}")
+    return result
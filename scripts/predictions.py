@@ -0,0 +1,169 @@
+import os
+import csv
+import json
+import logging
+import argparse
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from resilience import is_not_delivered
+from task_importer import BulkTaskImporter, chunked
+from task_paths import TaskPathMap, image_path_from_task
+
+logger = logging.getLogger(__name__)
+
+
+def build_choice_result(label: str, from_name: str = 'choice', to_name: str = 'image') -> List[Dict[str, Any]]:
+    """Результат предсказания для конфигурации разметки Choices (drone / not_drone)"""
+    return [{
+        'from_name': from_name,
+        'to_name': to_name,
+        'type': 'choices',
+        'value': {'choices': [label]}
+    }]
+
+
+def predictions_from_file(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Чтение предсказаний из JSONL или CSV (колонки path, label, score[, model_version])
+    """
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith('.csv'):
+            for row in csv.DictReader(f):
+                if row.get('score') not in (None, ''):
+                    row['score'] = float(row['score'])
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class PredictionUploader:
+    """
+    Пакетная загрузка предсказаний модели для существующих задач.
+
+    Пути файлов сопоставляются с ID задач через персистентную карту
+    TaskPathMap, предсказания отправляются чанками в несколько потоков
+    через /api/projects/<id>/import/predictions. Повтор чанка создал бы
+    предсказания второй раз, поэтому он повторяется только если сервер
+    его точно не получил (соединение не установлено, 429 или 503).
+    """
+
+    def __init__(
+        self,
+        storage_manager,
+        project_id: int = None,
+        chunk_size: int = None,
+        workers: int = None,
+        model_version: str = None
+    ):
+        """
+        :param storage_manager: StorageManager (пути файлов и LabelStudioManager)
+        :param project_id: ID проекта. Если не указан, используется текущий проект.
+        :param chunk_size: Предсказаний в запросе (PREDICTIONS_CHUNK_SIZE, по умолчанию 1000)
+        :param workers: Параллельных запросов (PREDICTIONS_WORKERS, по умолчанию 4)
+        :param model_version: Версия модели по умолчанию
+        """
+        self.storage_manager = storage_manager
+        self.ls_manager = storage_manager.client
+        self.project_id = project_id or self.ls_manager.get_project_id()
+        self.chunk_size = chunk_size or int(os.getenv('PREDICTIONS_CHUNK_SIZE', '1000'))
+        self.workers = workers or int(os.getenv('PREDICTIONS_WORKERS', '4'))
+        self.model_version = model_version
+        self.task_map = TaskPathMap(self.ls_manager, self.project_id)
+        self.unmatched = 0
+
+    def task_path(self, path: str) -> Optional[str]:
+        """
+        Путь файла в том виде, в каком он записан в задаче.
+        Принимаются абсолютные пути, пути относительно document_root или data_dir.
+        """
+        document_root = self.storage_manager.document_root
+        if os.path.isabs(path):
+            relative = os.path.relpath(path, document_root)
+        else:
+            data_prefix = os.path.relpath(self.storage_manager.data_dir, document_root)
+            relative = path if path.startswith(data_prefix + '/') else f"{data_prefix}/{path}"
+        return image_path_from_task(self.storage_manager.build_task(relative.replace(os.sep, '/')))
+
+    def _resolve(self, predictions: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Преобразование входных записей в предсказания Label Studio с ID задач"""
+        for batch in chunked(predictions, self.chunk_size):
+            paths = [self.task_path(item['path']) for item in batch]
+            task_ids = self.task_map.lookup(p for p in paths if p)
+            for item, path in zip(batch, paths):
+                task_id = task_ids.get(path)
+                if task_id is None:
+                    self.unmatched += 1
+                    logger.debug("Задача для файла %s не найдена", item['path'])
+                    continue
+                prediction = {
+                    'task': task_id,
+                    'result': item.get('result') or build_choice_result(item['label']),
+                    'model_version': item.get('model_version') or self.model_version
+                }
+                if item.get('score') is not None:
+                    prediction['score'] = float(item['score'])
+                yield prediction
+
+    def _send_chunk(self, chunk: List[Dict[str, Any]], project_id: int) -> List[int]:
+        retrying = self.ls_manager.resilience.retrying('import_predictions', retry_on=is_not_delivered)
+        retrying(
+            self.ls_manager.make_request,
+            "POST",
+            f"/api/projects/{project_id}/import/predictions",
+            json=chunk,
+            timeout=(10, 600)
+        )
+        return [prediction['task'] for prediction in chunk]
+
+    def upload(self, predictions: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Загрузка предсказаний
+
+        :param predictions: Итератор словарей {path, label | result, score, model_version}
+        :return: Статистика загрузки
+        """
+        self.task_map.refresh()
+        self.unmatched = 0
+        importer = BulkTaskImporter(
+            self.ls_manager,
+            project_id=self.project_id,
+            chunk_size=self.chunk_size,
+            workers=self.workers,
+            sender=self._send_chunk
+        )
+        stats = importer.import_tasks(self._resolve(predictions))
+        stats['unmatched'] = self.unmatched
+        if self.unmatched:
+            logger.warning(f"Предсказаний без задачи: {self.unmatched}")
+        return stats
+
+
+def main():
+    from label_studio_client import LabelStudioManager
+    from storage_manager import StorageManager
+
+    parser = argparse.ArgumentParser(description='Загрузка предсказаний модели в Label Studio')
+    parser.add_argument('input', help='JSONL или CSV с полями path, label, score')
+    parser.add_argument('--model-version', default=None)
+    parser.add_argument('--chunk-size', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    storage_manager = StorageManager(LabelStudioManager())
+    storage_manager.upload_predictions(
+        predictions_from_file(args.input),
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        model_version=args.model_version
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional, Tuple
+
+from PIL import Image
+
+from file_manifest import FileEntry
+from task_importer import chunked
+
+logger = logging.getLogger(__name__)
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+
+
+def render_preview(source: str, target: str, max_size: int, quality: int) -> Tuple[str, Optional[str]]:
+    """
+    Создание уменьшенной копии изображения (в том же формате, что и оригинал)
+
+    :return: (путь оригинала, текст ошибки или None)
+    """
+    tmp_target = f"{target}.tmp"
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with Image.open(source) as image:
+            image.draft('RGB', (max_size, max_size))
+            image.thumbnail((max_size, max_size), Image.LANCZOS)
+            if source.lower().endswith(JPEG_EXTENSIONS):
+                if image.mode not in ('RGB', 'L'):
+                    image = image.convert('RGB')
+                image.save(tmp_target, format='JPEG', quality=quality, optimize=True, progressive=True)
+            else:
+                image.save(tmp_target, format=image.format or 'PNG', optimize=True)
+        os.replace(tmp_target, target)
+        # mtime превью = mtime оригинала: так проверяется актуальность при следующем запуске
+        st = os.stat(source)
+        os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+        return source, None
+    except Exception as e:
+        try:
+            os.remove(tmp_target)
+        except OSError:
+            pass
+        return source, str(e)
+
+
+class PreviewGenerator:
+    """
+    Генерация превью изображений в параллельное дерево директорий.
+
+    Превью для файла document_root/<путь> сохраняется в preview_root/<путь>,
+    поэтому путь оригинала восстанавливается простой заменой префикса.
+    Пересоздаются только превью, mtime которых не совпадает с оригиналом.
+    """
+
+    def __init__(
+        self,
+        document_root: str,
+        preview_root: str = None,
+        max_size: int = None,
+        quality: int = None,
+        workers: int = None
+    ):
+        """
+        :param document_root: Корень локальных файлов Label Studio
+        :param preview_root: Корень превью (PREVIEW_DIR, по умолчанию document_root/previews)
+        :param max_size: Максимальная сторона превью в пикселях (PREVIEW_MAX_SIZE, 1024)
+        :param quality: Качество JPEG (PREVIEW_QUALITY, 80)
+        :param workers: Количество процессов (PREVIEW_WORKERS, по умолчанию число CPU)
+        """
+        self.document_root = document_root
+        self.preview_root = preview_root or os.getenv('PREVIEW_DIR') or os.path.join(document_root, 'previews')
+        self.max_size = max_size or int(os.getenv('PREVIEW_MAX_SIZE', '1024'))
+        self.quality = quality or int(os.getenv('PREVIEW_QUALITY', '80'))
+        self.workers = workers or int(os.getenv('PREVIEW_WORKERS', '0')) or os.cpu_count() or 1
+
+    def preview_path(self, relative_path: str) -> str:
+        """Абсолютный путь превью для пути относительно document_root"""
+        return os.path.join(self.preview_root, relative_path)
+
+    def preview_relative_path(self, relative_path: str) -> str:
+        """Путь превью относительно document_root (для URL задачи)"""
+        return os.path.relpath(self.preview_path(relative_path), self.document_root).replace(os.sep, '/')
+
+    def original_relative_path(self, preview_relative_path: str) -> str:
+        """Обратное преобразование: путь превью -> путь оригинала относительно document_root"""
+        full = os.path.join(self.document_root, preview_relative_path)
+        return os.path.relpath(full, self.preview_root).replace(os.sep, '/')
+
+    def is_fresh(self, entry: FileEntry) -> bool:
+        try:
+            return os.stat(self.preview_path(entry.path)).st_mtime_ns == entry.mtime_ns
+        except FileNotFoundError:
+            return False
+
+    def generate(self, entries: Iterable[FileEntry], batch_size: int = 1000) -> dict:
+        """
+        Инкрементальная генерация превью
+
+        :param entries: Итератор FileEntry с путями относительно document_root
+        :return: Статистика: создано, актуальных, ошибок и пути файлов без превью (failed_paths)
+        """
+        stats = {'generated': 0, 'fresh': 0, 'failed': 0}
+        failed_paths = []
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for batch in chunked(entries, batch_size):
+                stale = [e for e in batch if not self.is_fresh(e)]
+                stats['fresh'] += len(batch) - len(stale)
+                if not stale:
+                    continue
+
+                futures = [
+                    pool.submit(
+                        render_preview,
+                        os.path.join(self.document_root, e.path),
+                        self.preview_path(e.path),
+                        self.max_size,
+                        self.quality
+                    )
+                    for e in stale
+                ]
+                for entry, future in zip(stale, futures):
+                    source, error = future.result()
+                    if error:
+                        stats['failed'] += 1
+                        failed_paths.append(entry.path)
+                        logger.warning(f"Не удалось создать превью для {source}: {error}")
+                    else:
+                        stats['generated'] += 1
+
+        logger.info(f"Генерация превью в {self.preview_root}: {stats}")
+        stats['failed_paths'] = failed_paths
+        return stats
+
+    def remove(self, relative_paths: Iterable[str]):
+        """Удаление превью удаленных файлов"""
+        for relative_path in relative_paths:
+            try:
+                os.remove(self.preview_path(relative_path))
+            except FileNotFoundError:
+                pass
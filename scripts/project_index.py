@@ -0,0 +1,88 @@
+import os
+import logging
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+from file_manifest import DEFAULT_STATE_DIR
+from json_state import load_json, update_json
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Нормализация имени проекта: без пробелов по краям и внутри, в нижнем регистре"""
+    if not name:
+        return ''
+    return name.strip().lower().replace(' ', '')
+
+
+class ProjectIndex:
+    """
+    Персистентный индекс нормализованное имя проекта -> ID проекта.
+
+    Индекс хранится в JSON файле отдельно для каждого адреса Label Studio,
+    поэтому после первого запуска проект находится без загрузки списка проектов.
+    Изменения сливаются с текущим содержимым файла (см. update_json), поэтому
+    несколько менеджеров и процессов не теряют записи друг друга; внутри процесса
+    используется общий экземпляр (get_project_index).
+    """
+
+    def __init__(self, path: str = None):
+        state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+        self.path = path or os.path.join(state_dir, 'project_index.json')
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, int]] = load_json(self.path, {})
+
+    def _modify(self, change: Callable[[Dict[str, Dict[str, int]]], bool]):
+        """Применение изменения к перечитанному файлу индекса"""
+        data = update_json(self.path, lambda data: change(data) if isinstance(data, dict) else False, {})
+        if isinstance(data, dict):
+            self._data = data
+
+    def get(self, url: str, name: str) -> Optional[int]:
+        with self._lock:
+            return self._data.get(url, {}).get(normalize_name(name))
+
+    def set(self, url: str, name: str, project_id: int):
+        def change(data):
+            data.setdefault(url, {})[normalize_name(name)] = project_id
+            return True
+
+        with self._lock:
+            self._modify(change)
+
+    def update(self, url: str, projects: Iterable[Dict]):
+        """Добавление в индекс всех просмотренных проектов (id, title)"""
+        projects = list(projects)
+
+        def change(data):
+            bucket = data.setdefault(url, {})
+            for project in projects:
+                key = normalize_name(project.get('title'))
+                if key:
+                    # Как и при линейном поиске, побеждает первый проект с таким именем
+                    bucket.setdefault(key, project['id'])
+            return True
+
+        with self._lock:
+            self._modify(change)
+
+    def remove(self, url: str, name: str):
+        def change(data):
+            return data.get(url, {}).pop(normalize_name(name), None) is not None
+
+        with self._lock:
+            self._modify(change)
+
+
+_indexes: Dict[str, ProjectIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_project_index(path: str = None) -> ProjectIndex:
+    """Общий для процесса индекс проектов для файла path (по умолчанию STATE_DIR/project_index.json)"""
+    path = os.path.abspath(path or os.path.join(os.getenv('STATE_DIR', DEFAULT_STATE_DIR), 'project_index.json'))
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = ProjectIndex(path)
+        return _indexes[path]
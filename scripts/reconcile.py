@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from file_manifest import DEFAULT_STATE_DIR, FileEntry, ManifestDelta
+from task_importer import chunked
+from task_paths import image_path_from_task
+
+logger = logging.getLogger(__name__)
+
+ORPHAN_MODES = ('archive', 'delete', 'report')
+
+
+class Move(NamedTuple):
+    """Файл задачи переименован или перенесен"""
+    task_id: int
+    old: FileEntry
+    new: FileEntry
+    method: str
+
+
+class ReconcilePlan(NamedTuple):
+    moves: List[Move]
+    # Задачи, файлов которых больше нет: (ID задачи, путь в задаче, запись манифеста или None)
+    orphans: List[Tuple[int, str, Any]]
+    # Файлы без задач (их импортирует обычная синхронизация)
+    new: List[FileEntry]
+    # Файлов в data_dir и задач с путями в проекте на момент сверки
+    files: int = 0
+    tasks: int = 0
+    # Ошибок чтения при обходе data_dir: при неполном обходе изменения не применяются
+    scan_errors: int = 0
+
+
+class Reconciler:
+    """
+    Сверка файлов data_dir с задачами проекта.
+
+    Задача, файл которой исчез, сопоставляется с новым файлом без задачи:
+    сначала по inode (перенос внутри файловой системы сохраняет inode,
+    размер и mtime), затем по хешу содержимого из индекса дедупликации.
+    Такие задачи получают новый путь (PATCH), аннотации сохраняются.
+    Остальные задачи без файлов архивируются в JSONL и удаляются пачками
+    через действие Data Manager delete_tasks. Перед удалением каждая задача
+    перечитывается: задачи, файл которых есть на диске (например, путь
+    записан в задаче без кодирования), не удаляются. Если обход data_dir
+    завершился с ошибками, data_dir пуст или задач без файлов слишком
+    много (например, не смонтирован том), сверка ничего не меняет.
+    """
+
+    def __init__(self, storage_manager, mode: str = None, batch_size: int = None, archive_path: str = None,
+                 workers: int = None, max_orphan_fraction: float = None):
+        """
+        :param storage_manager: StorageManager
+        :param mode: Что делать с задачами без файлов: archive, delete или report
+                     (RECONCILE_ORPHANS, по умолчанию report)
+        :param batch_size: Задач в одном запросе удаления (RECONCILE_BATCH_SIZE, по умолчанию 500)
+        :param archive_path: Архив удаленных задач (по умолчанию STATE_DIR/orphans_<project>.jsonl)
+        :param workers: Параллельных запросов обновления путей (IMPORT_WORKERS, по умолчанию 4)
+        :param max_orphan_fraction: Максимальная доля задач без файлов, при которой они удаляются
+                                    (RECONCILE_MAX_ORPHAN_FRACTION, по умолчанию 0.2)
+        """
+        self.storage_manager = storage_manager
+        self.ls_manager = storage_manager.client
+        self.project_id = self.ls_manager.get_project_id()
+        self.mode = mode or os.getenv('RECONCILE_ORPHANS', 'report')
+        if self.mode not in ORPHAN_MODES:
+            raise ValueError(f"Неизвестный режим обработки задач без файлов: {self.mode}")
+        self.batch_size = batch_size or int(os.getenv('RECONCILE_BATCH_SIZE', '500'))
+        state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+        self.archive_path = archive_path or os.path.join(state_dir, f'orphans_{self.project_id}.jsonl')
+        self.workers = workers or int(os.getenv('IMPORT_WORKERS', '4'))
+        if max_orphan_fraction is None:
+            max_orphan_fraction = float(os.getenv('RECONCILE_MAX_ORPHAN_FRACTION', '0.2'))
+        self.max_orphan_fraction = max_orphan_fraction
+        self.index = self.ls_manager.import_index(self.project_id)
+
+    def task_path(self, relative_path: str) -> str:
+        """Путь, который записан в задаче для файла (с учетом превью)"""
+        return image_path_from_task(self.storage_manager.build_task(relative_path))
+
+    def plan(self) -> ReconcilePlan:
+        """Сравнение текущих файлов, манифеста и задач проекта"""
+        sm = self.storage_manager
+        self.index.refresh()
+
+        scanner = sm.scanner()
+        current = {self.task_path(e.path): e for e in scanner.scan()}
+        previous = {self.task_path(e.path): e for e in sm.manifest.entries(sm.data_dir)}
+        prefix = os.path.relpath(sm.data_dir, sm.document_root).replace(os.sep, '/') + '/'
+
+        imported = set()
+        orphans = []
+        for path, task_id in self.index.task_map.items():
+            if path in current:
+                imported.add(path)
+            elif path in previous or path.startswith(prefix):
+                orphans.append((task_id, path, previous.get(path)))
+        new = [entry for path, entry in current.items() if path not in imported]
+
+        moves = self._match(orphans, new)
+        moved_ids = {move.task_id for move in moves}
+        moved_paths = {move.new.path for move in moves}
+        plan = ReconcilePlan(
+            moves,
+            [orphan for orphan in orphans if orphan[0] not in moved_ids],
+            [entry for entry in new if entry.path not in moved_paths],
+            files=len(current),
+            tasks=self.index.task_map.count(),
+            scan_errors=scanner.errors
+        )
+        logger.info(
+            f"Сверка проекта {self.project_id}: перенесено {len(plan.moves)}, "
+            f"задач без файлов {len(plan.orphans)}, новых файлов {len(plan.new)}"
+        )
+        return plan
+
+    def _match(self, orphans: List[Tuple[int, str, Any]], new: List[FileEntry]) -> List[Move]:
+        if not orphans or not new:
+            return []
+        moves = []
+        # inode может быть занят новым файлом после удаления старого, поэтому сравниваются и размер, и mtime
+        by_inode = {(e.inode, e.size, e.mtime_ns): e for e in new}
+        unmatched = []
+        for task_id, path, old in orphans:
+            entry = by_inode.pop((old.inode, old.size, old.mtime_ns), None) if old else None
+            if entry:
+                moves.append(Move(task_id, old, entry, 'inode'))
+            else:
+                unmatched.append((task_id, path, old))
+
+        deduplicator = self.storage_manager.deduplicator
+        if not deduplicator or not unmatched:
+            return moves
+        # Хеш исчезнувшего файла есть только в индексе дедупликации
+        old_paths = {old.path if old else path: (task_id, old) for task_id, path, old in unmatched}
+        known = deduplicator.digests(old_paths)
+        by_digest = {digest: old_paths[path] + (path, size) for path, (size, digest) in known.items()}
+        sizes = {size for size, _ in known.values()}
+        taken = {move.new.path for move in moves}
+        candidates = [e for e in new if e.size in sizes and e.path not in taken]
+        for entry, digest in deduplicator.hash_entries(candidates):
+            match = by_digest.pop(digest, None)
+            if match:
+                task_id, old, path, size = match
+                moves.append(Move(task_id, old or FileEntry(path, size, 0, 0), entry, 'hash'))
+        return moves
+
+    def apply(self, plan: ReconcilePlan) -> Dict[str, Any]:
+        """Обновление путей перенесенных задач и обработка задач без файлов"""
+        if plan.scan_errors:
+            # Файлы нечитаемых директорий выглядят исчезнувшими - ни переносы, ни удаления не применяются
+            logger.error(
+                f"Обход {self.storage_manager.data_dir} завершился с ошибками ({plan.scan_errors}), "
+                f"сверка не применяется"
+            )
+            return {
+                'moved': 0, 'orphans': len(plan.orphans), 'refused': True,
+                'archived': 0, 'deleted': 0, 'new': len(plan.new)
+            }
+        moved = self._apply_moves(plan.moves)
+        archived = deleted = 0
+        refused = plan.orphans and self.mode != 'report' and not self._orphans_plausible(plan)
+        if plan.orphans and self.mode != 'report' and not refused:
+            paths = {task_id: path for task_id, path, _ in plan.orphans}
+            ids = self._confirm(list(paths), paths, archive=self.mode == 'archive')
+            if self.mode == 'archive':
+                archived = len(ids)
+            deleted = self._delete(ids)
+            ids = set(ids)
+            removed = [old for task_id, _, old in plan.orphans if old and task_id in ids]
+            self.storage_manager.manifest.apply(ManifestDelta([], [], removed), self.storage_manager.data_dir)
+            if self.storage_manager.deduplicator:
+                self.storage_manager.deduplicator.remove(old.path for old in removed)
+        elif plan.orphans and not refused:
+            logger.warning(f"Задач без файлов: {len(plan.orphans)} (RECONCILE_ORPHANS=report)")
+        return {
+            'moved': moved,
+            'orphans': len(plan.orphans),
+            'refused': bool(refused),
+            'archived': archived,
+            'deleted': deleted,
+            'new': len(plan.new)
+        }
+
+    def _orphans_plausible(self, plan: ReconcilePlan) -> bool:
+        """Защита от удаления задач, когда файлы пропали целиком (пустой или несмонтированный data_dir)"""
+        if not plan.files:
+            logger.error(
+                f"В {self.storage_manager.data_dir} нет файлов: задачи без файлов ({len(plan.orphans)}) не удаляются"
+            )
+            return False
+        if len(plan.orphans) > self.max_orphan_fraction * max(plan.tasks, 1):
+            logger.error(
+                f"Задач без файлов {len(plan.orphans)} из {plan.tasks} - больше "
+                f"RECONCILE_MAX_ORPHAN_FRACTION={self.max_orphan_fraction}, удаление не выполняется"
+            )
+            return False
+        return True
+
+    def run(self, dry_run: bool = False) -> Dict[str, Any]:
+        plan = self.plan()
+        if dry_run:
+            return {'moved': len(plan.moves), 'orphans': len(plan.orphans), 'new': len(plan.new), 'dry_run': True}
+        result = self.apply(plan)
+        logger.info(f"Сверка проекта {self.project_id}: {result}")
+        return result
+
+    def _apply_moves(self, moves: List[Move]) -> int:
+        if not moves:
+            return 0
+        sm = self.storage_manager
+
+        def patch(move: Move) -> Move:
+            self.ls_manager.make_request(
+                'PATCH', f'/api/tasks/{move.task_id}', json={'data': sm.build_task(move.new.path)['data']}
+            )
+            logger.info(f"Задача {move.task_id}: {move.old.path} -> {move.new.path} ({move.method})")
+            return move
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            done = list(pool.map(patch, moves))
+
+        ids = [move.task_id for move in done]
+        self.index.task_map.remove_tasks(ids)
+        self.index.record([sm.build_task(move.new.path) for move in done], ids)
+        self.index.save()
+        # Новый путь уже связан с задачей - инкрементальная синхронизация его не импортирует
+        sm.manifest.apply(ManifestDelta([move.new for move in done], [], [move.old for move in done]), sm.data_dir)
+        if sm.previews:
+            sm.previews.generate(move.new for move in done)
+            sm.previews.remove(move.old.path for move in done)
+        return len(done)
+
+    def _file_exists(self, task: Dict[str, Any]) -> bool:
+        """Есть ли на диске файл задачи - по декодированному пути или по пути, записанному без кодирования"""
+        candidates = {image_path_from_task(task)}
+        url = (task.get('data') or {}).get('image')
+        if isinstance(url, str) and '?d=' in url:
+            candidates.add(url.split('?d=', 1)[1])
+        root = self.storage_manager.document_root
+        return any(path and os.path.exists(os.path.join(root, path)) for path in candidates)
+
+    def _confirm(self, task_ids: List[int], paths: Dict[int, str], archive: bool) -> List[int]:
+        """
+        Проверка задач перед удалением и запись их (с аннотациями) в архив
+
+        :param archive: Записывать задачи в архив
+        :return: ID задач, которые можно удалить (сохраненные в архив, если archive=True)
+        """
+        def fetch(task_id: int):
+            response = self.ls_manager.make_request('GET', f'/api/tasks/{task_id}', raise_exceptions=False)
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return response.json()
+
+        confirmed = []
+        if archive:
+            os.makedirs(os.path.dirname(os.path.abspath(self.archive_path)), exist_ok=True)
+        with (open(self.archive_path, 'a', encoding='utf-8') if archive else nullcontext()) as f, \
+                ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for batch in chunked(task_ids, self.batch_size):
+                for task in pool.map(fetch, batch):
+                    if task is None:
+                        continue
+                    if self._file_exists(task):
+                        logger.warning(
+                            f"Файл задачи {task['id']} есть на диске ({paths.get(task['id'])}), задача не удаляется"
+                        )
+                        continue
+                    if f:
+                        f.write(json.dumps(
+                            dict(task, orphan_path=paths.get(task['id']), archived_at=time.time()), ensure_ascii=False
+                        ) + '\n')
+                    confirmed.append(task['id'])
+                if f:
+                    f.flush()
+        if archive:
+            logger.info(f"Задачи без файлов сохранены в {self.archive_path}: {len(confirmed)}")
+        return confirmed
+
+    def _delete(self, task_ids: List[int]) -> int:
+        """Удаление задач пачками через действие Data Manager"""
+        deleted = 0
+        for batch in chunked(task_ids, self.batch_size):
+            response = self.ls_manager.make_request(
+                'POST',
+                '/api/dm/actions',
+                params={'id': 'delete_tasks', 'project': self.project_id},
+                json={'selectedItems': {'all': False, 'included': batch}}
+            )
+            deleted += (response.json() or {}).get('processed_items', len(batch))
+            self.index.task_map.remove_tasks(batch)
+        logger.info(f"Удалено задач без файлов: {deleted}")
+        return deleted
+
+
+def main():
+    from label_studio_client import LabelStudioManager
+    from storage_manager import StorageManager
+
+    parser = argparse.ArgumentParser(description='Сверка файлов хранилища с задачами Label Studio')
+    parser.add_argument('--mode', choices=ORPHAN_MODES, default=None, help='Задачи без файлов (RECONCILE_ORPHANS)')
+    parser.add_argument('--dry-run', action='store_true', help='Только показать изменения')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    print(Reconciler(StorageManager(LabelStudioManager()), mode=args.mode).run(dry_run=args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+import requests
+from urllib3.exceptions import NewConnectionError
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from metrics import CIRCUIT_STATE, RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Методы, повтор которых не меняет состояние сервера
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+# Статусы временной недоступности: запрос можно повторить
+TRANSIENT_STATUSES = frozenset({429, 502, 503, 504})
+# Статусы, с которыми сервер отклоняет запрос, не выполняя его
+REJECTED_STATUSES = frozenset({429, 503})
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Сервер признан недоступным, запрос не отправлялся"""
+
+
+def _status(exc: BaseException) -> Optional[int]:
+    response = getattr(exc, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Ошибка соединения, таймаут или временный статус (429, 502-504)"""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return _status(exc) in TRANSIENT_STATUSES
+
+
+def is_not_delivered(exc: BaseException) -> bool:
+    """
+    Запрос точно не выполнен сервером: соединение не установлено или запрос отклонен (429, 503).
+    Только такие ошибки допускают повтор неидемпотентного запроса без проверки результата.
+    """
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    if isinstance(exc, requests.ConnectionError):
+        reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+        return isinstance(reason, NewConnectionError)
+    return _status(exc) in REJECTED_STATUSES
+
+
+def is_server_failure(exc: BaseException) -> bool:
+    """Ошибка, говорящая о неисправности сервера (учитывается размыкателем)"""
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    status = _status(exc)
+    return status is not None and status >= 500
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи: после failure_threshold ошибок сервера подряд запросы
+    не отправляются reset_timeout секунд (CircuitOpenError), затем один
+    пробный запрос решает, замкнуть цепь или снова разомкнуть.
+    """
+
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = None):
+        """
+        :param failure_threshold: Ошибок подряд до размыкания (CIRCUIT_FAILURE_THRESHOLD, по умолчанию 5)
+        :param reset_timeout: Время до пробного запроса, сек (CIRCUIT_RESET_TIMEOUT, по умолчанию 30)
+        """
+        self.failure_threshold = failure_threshold or int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+        self.reset_timeout = reset_timeout or float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(_STATE_VALUES[self.state])
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Размыкатель цепи Label Studio: {self.state} -> {state}")
+            self.state = state
+            CIRCUIT_STATE.set(_STATE_VALUES[state])
+
+    def before(self):
+        """Проверка перед запросом; CircuitOpenError, если цепь разомкнута"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == OPEN and remaining <= 0:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            raise CircuitOpenError(
+                f"Label Studio недоступен, повторная проверка через {max(remaining, 0):.1f} сек"
+            )
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def release(self):
+        """Запрос завершился без признаков неисправности сервера (например, 404)"""
+        with self._lock:
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN:
+                self.failures = 0
+                self._set_state(CLOSED)
+
+
+class Resilience:
+    """
+    Единая политика устойчивости запросов к Label Studio.
+
+    - размыкатель цепи: пока сервер недоступен, вызовы завершаются сразу;
+    - идемпотентные запросы (GET) повторяются при временных ошибках через
+      короткие паузы со случайным разбросом (0.1 сек, 0.2, 0.4 ... до max_delay);
+    - POST повторяется только через idempotent_post: перед повтором
+      проверяется, не выполнилось ли действие на самом деле.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker = None,
+        attempts: int = None,
+        base_delay: float = None,
+        max_delay: float = None
+    ):
+        """
+        :param breaker: Размыкатель цепи (по умолчанию из CIRCUIT_*)
+        :param attempts: Попыток с учетом первой (RETRY_ATTEMPTS, по умолчанию 4)
+        :param base_delay: Начальная пауза, сек (RETRY_BASE_DELAY, по умолчанию 0.1)
+        :param max_delay: Максимальная пауза, сек (RETRY_MAX_DELAY, по умолчанию 2)
+        """
+        self.breaker = breaker or CircuitBreaker()
+        self.attempts = attempts or int(os.getenv('RETRY_ATTEMPTS', '4'))
+        self.base_delay = base_delay or float(os.getenv('RETRY_BASE_DELAY', '0.1'))
+        self.max_delay = max_delay or float(os.getenv('RETRY_MAX_DELAY', '2'))
+
+    def retrying(
+        self,
+        name: str,
+        attempts: int = None,
+        retry_on: Callable[[BaseException], bool] = is_transient
+    ) -> Retrying:
+        """
+        Повторы при временных ошибках с джиттером (full jitter)
+
+        :param retry_on: Какие ошибки повторять (по умолчанию временные, см. is_transient)
+        """
+        def before_sleep(retry_state):
+            RETRIES.inc(function=name)
+            logger.warning(
+                f"Повтор {name} (попытка {retry_state.attempt_number}): {retry_state.outcome.exception()}"
+            )
+
+        return Retrying(
+            stop=stop_after_attempt(attempts or self.attempts),
+            wait=wait_random_exponential(multiplier=self.base_delay, max=self.max_delay),
+            retry=retry_if_exception(retry_on),
+            before_sleep=before_sleep,
+            reraise=True
+        )
+
+    def guarded(self, fn: Callable[[], Any]) -> Any:
+        """Один вызов через размыкатель цепи"""
+        self.breaker.before()
+        try:
+            result = fn()
+        except Exception as e:
+            if is_server_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+            raise
+        # Ответ без исключения (raise_exceptions=False) тоже может означать неисправность
+        if (getattr(result, 'status_code', None) or 0) >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return result
+
+    def call(self, method: str, name: str, fn: Callable[[], Any]) -> Any:
+        """
+        Запрос с размыкателем цепи; идемпотентные методы повторяются при временных ошибках
+
+        :param method: HTTP метод
+        :param name: Имя для логов и метрик повторов
+        :param fn: Отправка запроса
+        """
+        if method.upper() not in IDEMPOTENT_METHODS:
+            return self.guarded(fn)
+        return self.retrying(name)(self.guarded, fn)
+
+    def idempotent_post(
+        self,
+        name: str,
+        create: Callable[[], Any],
+        find_existing: Callable[[], Optional[Any]]
+    ) -> Any:
+        """
+        Неидемпотентное действие с безопасными повторами
+
+        После временной ошибки ответ мог потеряться, хотя сервер действие
+        выполнил, поэтому перед каждой следующей попыткой вызывается
+        find_existing: найденный результат возвращается вместо повтора.
+
+        :param create: Выполнение действия (POST)
+        :param find_existing: Результат уже выполненного действия или None
+        """
+        first = [True]
+
+        def attempt():
+            if not first[0]:
+                existing = find_existing()
+                if existing is not None:
+                    logger.info(f"{name}: действие уже выполнено сервером, повтор не нужен")
+                    return existing
+            first[0] = False
+            return create()
+
+        return self.retrying(name)(attempt)
+
+
+_resilience: Optional[Resilience] = None
+_resilience_lock = threading.Lock()
+
+
+def get_resilience() -> Resilience:
+    """Общая политика процесса (один размыкатель цепи на сервер)"""
+    global _resilience
+    with _resilience_lock:
+        if _resilience is None:
+            _resilience = Resilience()
+        return _resilience
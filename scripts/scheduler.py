@@ -0,0 +1,236 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from metrics import CONCURRENCY_LIMIT, REQUESTS_IN_FLIGHT, THROTTLED, endpoint_label
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Ограничение частоты запросов: rate токенов в секунду, не больше burst подряд.
+
+    reserve() не блокирует, а возвращает время ожидания, поэтому одна и та же
+    корзина используется и потоками (time.sleep), и корутинами (asyncio.sleep).
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Резервирование токена; возвращает, сколько секунд нужно подождать"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class AdaptiveLimiter:
+    """
+    Ограничение числа запросов в работе по схеме AIMD (как окно TCP).
+
+    Каждый успешный ответ увеличивает лимит на 1/limit (примерно +1 за
+    "круг" запросов), сигнал перегрузки (429, 5xx, ошибка соединения,
+    рост задержки) уменьшает его в backoff раз, не чаще раза в cooldown секунд.
+    """
+
+    def __init__(
+        self,
+        initial: float = 8,
+        minimum: float = 1,
+        maximum: float = 64,
+        backoff: float = 0.5,
+        cooldown: float = 1.0
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = min(max(initial, minimum), maximum)
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        CONCURRENCY_LIMIT.set(self.limit)
+
+    def _can_start(self, now: float) -> bool:
+        return self.in_flight < int(self.limit) and now >= self.paused_until
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if not self._can_start(time.monotonic()):
+                return False
+            self.in_flight += 1
+            REQUESTS_IN_FLIGHT.set(self.in_flight)
+            return True
+
+    def acquire(self):
+        with self._cond:
+            while not self._can_start(time.monotonic()):
+                pause = self.paused_until - time.monotonic()
+                self._cond.wait(pause if pause > 0 else None)
+            self.in_flight += 1
+            REQUESTS_IN_FLIGHT.set(self.in_flight)
+
+    def release(self, congested: bool):
+        with self._cond:
+            # Лимит растет, только если окно было заполнено, иначе он рос бы без нагрузки
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            now = time.monotonic()
+            if congested:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+                    logger.info(f"Перегрузка сервера, лимит параллельных запросов: {int(self.limit)}")
+            elif saturated:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            CONCURRENCY_LIMIT.set(self.limit)
+            REQUESTS_IN_FLIGHT.set(self.in_flight)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Приостановка новых запросов (Retry-After)"""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+
+class Ticket(NamedTuple):
+    endpoint: str
+    started: float
+
+
+def parse_rate_limits(value: str) -> Dict[str, Tuple[float, Optional[float]]]:
+    """
+    'POST /api/projects/{id}/import=2:4,GET /api/tasks=20' -> {эндпоинт: (запросов/сек, burst)}
+
+    Метод необязателен; эндпоинт записывается так же, как в метках метрик.
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        endpoint, _, rate = item.rpartition('=')
+        rate, _, burst = rate.partition(':')
+        limits[endpoint.strip()] = (float(rate), float(burst) if burst else None)
+    return limits
+
+
+class RequestScheduler:
+    """
+    Общий планировщик запросов к Label Studio для всех менеджеров процесса.
+
+    Перед запросом берется токен из корзины эндпоинта (если для него задан
+    лимит) и место в AdaptiveLimiter. После ответа лимит параллельности
+    корректируется по статусу и задержке относительно базовой задержки эндпоинта.
+    """
+
+    def __init__(
+        self,
+        limiter: AdaptiveLimiter = None,
+        rate_limits: Dict[str, Tuple[float, Optional[float]]] = None,
+        default_rate: float = None,
+        latency_tolerance: float = None
+    ):
+        """
+        :param limiter: Ограничение параллельности (по умолчанию из CONCURRENCY_*)
+        :param rate_limits: Лимиты эндпоинтов (RATE_LIMITS, см. parse_rate_limits)
+        :param default_rate: Лимит остальных эндпоинтов, запросов/сек (RATE_LIMIT_DEFAULT, 0 - без лимита)
+        :param latency_tolerance: Во сколько раз задержка может превышать базовую (LATENCY_TOLERANCE, по умолчанию 4)
+        """
+        self.limiter = limiter or AdaptiveLimiter(
+            initial=float(os.getenv('CONCURRENCY_INITIAL', '8')),
+            minimum=float(os.getenv('CONCURRENCY_MIN', '1')),
+            maximum=float(os.getenv('CONCURRENCY_MAX', '64'))
+        )
+        if rate_limits is None:
+            rate_limits = parse_rate_limits(os.getenv('RATE_LIMITS', ''))
+        self.rate_limits = rate_limits
+        self.default_rate = default_rate if default_rate is not None else float(os.getenv('RATE_LIMIT_DEFAULT', '0'))
+        self.latency_tolerance = latency_tolerance or float(os.getenv('LATENCY_TOLERANCE', '4'))
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._baseline: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, method: str, endpoint: str) -> Optional[TokenBucket]:
+        key = f'{method} {endpoint}'
+        with self._lock:
+            if key not in self._buckets:
+                rate, burst = self.rate_limits.get(key) or self.rate_limits.get(endpoint) or (self.default_rate, None)
+                self._buckets[key] = TokenBucket(rate, burst) if rate > 0 else None
+            return self._buckets[key]
+
+    def _delay(self, method: str, endpoint: str) -> float:
+        bucket = self._bucket(method, endpoint)
+        delay = bucket.reserve() if bucket else 0.0
+        if delay > 0:
+            THROTTLED.inc(endpoint=endpoint)
+        return delay
+
+    def acquire(self, method: str, url: str) -> Ticket:
+        endpoint = endpoint_label(url)
+        delay = self._delay(method, endpoint)
+        if delay > 0:
+            time.sleep(delay)
+        self.limiter.acquire()
+        return Ticket(f'{method} {endpoint}', time.monotonic())
+
+    async def acquire_async(self, method: str, url: str) -> Ticket:
+        endpoint = endpoint_label(url)
+        delay = self._delay(method, endpoint)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        while not self.limiter.try_acquire():
+            await asyncio.sleep(0.01)
+        return Ticket(f'{method} {endpoint}', time.monotonic())
+
+    def release(self, ticket: Ticket, status, retry_after: str = None):
+        """
+        :param status: HTTP статус ответа или 'error' для ошибки соединения
+        :param retry_after: Заголовок Retry-After ответа 429/503
+        """
+        latency = time.monotonic() - ticket.started
+        congested = status == 'error' or status == 429 or (isinstance(status, int) and status >= 500)
+        if not congested and isinstance(status, int) and status < 400:
+            congested = self._slow(ticket.endpoint, latency)
+        if retry_after:
+            try:
+                self.limiter.pause(min(float(retry_after), 60.0))
+            except ValueError:
+                pass
+        self.limiter.release(congested)
+
+    def _slow(self, endpoint: str, latency: float) -> bool:
+        """Рост задержки относительно базовой (почти минимальной) задержки эндпоинта"""
+        with self._lock:
+            baseline = self._baseline.get(endpoint)
+            if baseline is None or latency < baseline:
+                self._baseline[endpoint] = latency
+                return False
+            # Базовая задержка медленно подтягивается к текущей (сервер мог стать медленнее)
+            self._baseline[endpoint] = baseline + (latency - baseline) * 0.01
+        return latency > 0.05 and latency > baseline * self.latency_tolerance
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Optional[RequestScheduler]:
+    """Общий планировщик процесса или None, если он отключен (SCHEDULER_ENABLED=false)"""
+    global _scheduler
+    if os.getenv('SCHEDULER_ENABLED', 'true').lower() != 'true':
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
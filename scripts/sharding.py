@@ -0,0 +1,407 @@
+import os
+import re
+import math
+import logging
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from file_manifest import DEFAULT_STATE_DIR
+from file_scanner import FileScanner
+from json_state import load_json, save_json
+from sync_jobs import StorageSyncJob
+
+logger = logging.getLogger(__name__)
+
+SHARD_MODES = ('subdirectory', 'hash')
+
+
+class Shard(NamedTuple):
+    """Часть дерева файлов, которая обслуживается отдельным локальным хранилищем"""
+    name: str
+    path: str
+    regex_filter: str
+    file_count: int
+
+
+def _stem_key(name: str, length: int) -> str:
+    """Последние length символов имени файла без расширения"""
+    stem = name.rpartition('.')[0] or name
+    return stem[-length:]
+
+
+def bucket_pattern(keys: Iterable[str], length: int) -> str:
+    """
+    Регулярное выражение для имен файлов, основа которых оканчивается на один из ключей.
+    Короткие основы (меньше length символов) должны совпадать с ключом целиком.
+    """
+    long_keys = sorted(re.escape(k) for k in keys if len(k) == length)
+    short_keys = sorted(re.escape(k) for k in keys if len(k) < length)
+    parts = []
+    if long_keys:
+        parts.append(f".*(?:{'|'.join(long_keys)})")
+    if short_keys:
+        parts.append(f"(?:{'|'.join(short_keys)})")
+    return f"(?:{'|'.join(parts)})\\.[^.]+$"
+
+
+class ShardPlanner:
+    """
+    Разбиение директории с файлами на шарды ограниченного размера.
+
+    Label Studio применяет regex_filter хранилища к имени файла и обходит
+    path рекурсивно, поэтому шард задается парой (директория, фильтр):
+
+    - subdirectory: слишком большие директории без собственных файлов
+      делятся по поддиректориям;
+    - hash: файлы директории распределяются по корзинам по последним
+      символам имени. Ключи назначаются корзинам жадно по фактическому
+      распределению, первая корзина получает все не назначенные ключи,
+      так что новые файлы всегда попадают ровно в один шард.
+
+    Директория, в которой есть собственные файлы, в режиме subdirectory
+    тоже делится по корзинам - иначе хранилища пересекались бы.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        matcher=None,
+        regex_filter: str = None,
+        max_files: int = None,
+        mode: str = None
+    ):
+        """
+        :param root: Директория с файлами (data_dir)
+        :param matcher: Фильтр имен файлов (как у StorageManager)
+        :param regex_filter: regex_filter хранилища, к которому добавляется условие корзины
+        :param max_files: Максимум файлов в шарде (SHARD_MAX_FILES, по умолчанию 200000)
+        :param mode: 'subdirectory' или 'hash' (SHARD_MODE, по умолчанию subdirectory)
+        """
+        self.root = root
+        self.matcher = matcher
+        self.regex_filter = regex_filter or ''
+        self.max_files = max_files or int(os.getenv('SHARD_MAX_FILES', '200000'))
+        self.mode = mode or os.getenv('SHARD_MODE', 'subdirectory')
+        if self.mode not in SHARD_MODES:
+            raise ValueError(f"Неизвестный режим шардирования: {self.mode}")
+
+        self._total: Dict[str, int] = defaultdict(int)
+        self._own: Dict[str, int] = defaultdict(int)
+        self._children: Dict[str, set] = defaultdict(set)
+
+    def count(self):
+        """Подсчет файлов по директориям за один обход дерева"""
+        self._total.clear()
+        self._own.clear()
+        self._children.clear()
+        for entry in FileScanner(self.root, base=self.root, matcher=self.matcher).scan():
+            directory = os.path.dirname(entry.path) or '.'
+            self._own[directory] += 1
+            while True:
+                self._total[directory] += 1
+                if directory == '.':
+                    break
+                parent = os.path.dirname(directory) or '.'
+                self._children[parent].add(directory)
+                directory = parent
+
+    def plan(self) -> List[Shard]:
+        """Построение нового плана шардов"""
+        self.count()
+        if self.mode == 'hash':
+            return self._split_by_hash('.')
+        return self._plan_dir('.')
+
+    def extend(self, shards: List[Shard]) -> List[Shard]:
+        """
+        Шарды для файлов, не покрытых существующим планом.
+
+        Существующие шарды не перестраиваются: перенос файлов между
+        хранилищами привел бы к повторному созданию задач.
+        """
+        self.count()
+        known: Dict[str, List[Shard]] = defaultdict(list)
+        for shard in shards:
+            known[self._relative(shard.path)].append(shard)
+        return self._extend_dir('.', known)
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def _extend_dir(self, directory: str, known: Dict[str, List[Shard]]) -> List[Shard]:
+        if directory in known:
+            if self._total[directory] > self.max_files * len(known[directory]):
+                logger.warning(
+                    f"Шарды {directory} выросли до {self._total[directory]} файлов "
+                    f"(лимит {self.max_files} на шард); для разделения постройте план заново"
+                )
+            return []
+        prefix = '' if directory == '.' else directory + '/'
+        if not any(path == '.' or path.startswith(prefix) for path in known):
+            return self._plan_dir(directory)
+        if self._own[directory]:
+            logger.warning(
+                f"{self._own[directory]} файлов в {directory} не покрыты шардами: "
+                f"директория уже разделена по поддиректориям"
+            )
+        shards = []
+        for child in sorted(self._children[directory]):
+            shards.extend(self._extend_dir(child, known))
+        return shards
+
+    def _plan_dir(self, directory: str) -> List[Shard]:
+        total = self._total[directory]
+        if total <= self.max_files:
+            return [self._shard(directory, directory, self.regex_filter, total)] if total else []
+        if self._own[directory]:
+            return self._split_by_hash(directory)
+        shards = []
+        for child in sorted(self._children[directory]):
+            shards.extend(self._plan_dir(child))
+        return shards
+
+    def _split_by_hash(self, directory: str) -> List[Shard]:
+        total = self._total[directory]
+        buckets = max(1, math.ceil(total / self.max_files))
+        if buckets == 1:
+            return [self._shard(directory, directory, self.regex_filter, total)] if total else []
+
+        path = os.path.join(self.root, directory)
+        counts = Counter(
+            _stem_key(os.path.basename(entry.path), 2)
+            for entry in FileScanner(path, base=path, matcher=self.matcher).scan()
+        )
+        assignment = None
+        for length in (1, 2):
+            keyed = Counter()
+            for key, count in counts.items():
+                keyed[key[-length:]] += count
+            assignment = self._assign(keyed, buckets)
+            if max(sum(keyed[k] for k in keys) for keys in assignment) <= self.max_files:
+                break
+        else:
+            logger.warning(
+                f"Не удалось разделить {directory} на шарды до {self.max_files} файлов: "
+                f"имена файлов распределены неравномерно"
+            )
+
+        if len(assignment) == 1:
+            return [self._shard(directory, directory, self.regex_filter, total)]
+
+        patterns = [bucket_pattern(keys, length) for keys in assignment]
+        shards = []
+        for i, keys in enumerate(assignment):
+            if i == 0:
+                condition = f"(?!(?:{'|'.join(patterns[1:])}))"
+            else:
+                condition = f"(?={patterns[i]})"
+            name = f"{'root' if directory == '.' else directory}#{i:02d}"
+            shards.append(self._shard(name, directory, condition + self.regex_filter, sum(keyed[k] for k in keys)))
+        return shards
+
+    @staticmethod
+    def _assign(counts: Counter, buckets: int) -> List[List[str]]:
+        """Жадное распределение ключей по корзинам: самый частый ключ - в наименее заполненную"""
+        buckets = min(buckets, len(counts)) or 1
+        assignment: List[List[str]] = [[] for _ in range(buckets)]
+        loads = [0] * buckets
+        for key, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+            i = loads.index(min(loads))
+            assignment[i].append(key)
+            loads[i] += count
+        return assignment
+
+    def _shard(self, name: str, directory: str, regex_filter: str, file_count: int) -> Shard:
+        name = 'root' if name == '.' else name
+        path = self.root if directory == '.' else os.path.join(self.root, directory)
+        return Shard(name, path, regex_filter, file_count)
+
+
+class ShardManager:
+    """
+    Локальные хранилища (и при необходимости проекты) для шардов data_dir.
+
+    План шардов сохраняется в STATE_DIR/shards.json. При повторных запусках
+    план только дополняется шардами для новых директорий, хранилища
+    создаются или обновляются по названию "<название> [<шард>]", после чего
+    все шарды синхронизируются параллельно.
+
+    Шарды синхронизируются только на стороне Label Studio: манифест файлов,
+    дедупликация, проверка целостности и индекс импортированных путей
+    в этом режиме не используются.
+    """
+
+    def __init__(
+        self,
+        storage_manager,
+        max_files: int = None,
+        mode: str = None,
+        per_project: bool = None,
+        state_path: str = None
+    ):
+        """
+        :param storage_manager: StorageManager
+        :param max_files: Максимум файлов в шарде (SHARD_MAX_FILES)
+        :param mode: Режим шардирования (SHARD_MODE)
+        :param per_project: Отдельный проект на шард (SHARD_PROJECTS, по умолчанию false)
+        :param state_path: Файл плана (по умолчанию STATE_DIR/shards.json)
+        """
+        from storage_manager import IMAGE_REGEX_FILTER
+
+        self.storage_manager = storage_manager
+        self.ls_manager = storage_manager.client
+        self.planner = ShardPlanner(
+            storage_manager.data_dir,
+            matcher=storage_manager.file_matcher,
+            regex_filter=IMAGE_REGEX_FILTER,
+            max_files=max_files,
+            mode=mode
+        )
+        if per_project is None:
+            per_project = os.getenv('SHARD_PROJECTS', 'false').lower() == 'true'
+        self.per_project = per_project
+        state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+        self.state_path = state_path or os.path.join(state_dir, 'shards.json')
+        self.title = self.ls_manager.project_name
+        self._managers: Dict[str, Any] = {}
+
+    def load(self) -> List[Dict[str, Any]]:
+        state = load_json(self.state_path, {})
+        if state.get('root') != self.planner.root or state.get('mode') != self.planner.mode:
+            return []
+        return state.get('shards', [])
+
+    def save(self, records: List[Dict[str, Any]]):
+        save_json(self.state_path, {
+            'root': self.planner.root,
+            'mode': self.planner.mode,
+            'max_files': self.planner.max_files,
+            'shards': records
+        })
+
+    def plan(self) -> List[Dict[str, Any]]:
+        """Загрузка сохраненного плана и добавление шардов для новых файлов"""
+        records = self.load()
+        if records:
+            new_shards = self.planner.extend([Shard(**self._shard_fields(r)) for r in records])
+        else:
+            new_shards = self.planner.plan()
+        for shard in new_shards:
+            logger.info(f"Новый шард {shard.name}: {shard.path} ({shard.file_count} файлов)")
+            records.append(shard._asdict())
+        self.save(records)
+        return records
+
+    @staticmethod
+    def _shard_fields(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {field: record[field] for field in Shard._fields}
+
+    def shard_manager(self, record: Dict[str, Any]):
+        """LabelStudioManager проекта шарда"""
+        if not self.per_project:
+            return self.ls_manager
+        name = record['name']
+        if name not in self._managers:
+            self._managers[name] = self.ls_manager.for_project(f"{self.ls_manager.project_name} [{name}]")
+        return self._managers[name]
+
+    def storage_path(self, record: Dict[str, Any]) -> str:
+        """Путь хранилища шарда (оригиналы или дерево превью)"""
+        if self.storage_manager.serve_previews:
+            relative = os.path.relpath(record['path'], self.storage_manager.document_root)
+            return self.storage_manager.previews.preview_path(relative)
+        return record['path']
+
+    def ensure_storages(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Создание или обновление хранилища для каждого шарда"""
+        existing: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        for record in records:
+            project_id = self.shard_manager(record).get_project_id()
+            if project_id not in existing:
+                storages = self.storage_manager.list_storages(project_id)
+                if not self.per_project:
+                    self._check_shared_project(project_id, storages)
+                existing[project_id] = {s.get('title'): s for s in storages}
+
+            title = f"{self.title} [{record['name']}]"
+            path = self.storage_path(record)
+            storage = existing[project_id].get(title)
+            if storage is None:
+                storage = self.storage_manager.create_storage(
+                    path=path, title=title, regex_filter=record['regex_filter'], project_id=project_id
+                )
+            elif storage.get('path') != path or storage.get('regex_filter') != record['regex_filter']:
+                logger.info(f"Обновление хранилища {storage['id']} шарда {record['name']}")
+                storage = self.storage_manager.update_storage(
+                    storage['id'], path=path, regex_filter=record['regex_filter']
+                )
+            record.update(storage_id=storage['id'], project_id=project_id)
+        self.save(records)
+        return records
+
+    def _check_shared_project(self, project_id: int, storages: List[Dict[str, Any]]):
+        """
+        Отказ от запуска, если файлы data_dir уже попадают в проект не через хранилища шардов:
+        хранилища шардов в том же проекте создали бы для них вторые задачи
+        """
+        shard_storages = [s for s in storages if str(s.get('title', '')).startswith(f"{self.title} [")]
+        roots = {os.path.abspath(self.planner.root)}
+        if self.storage_manager.serve_previews:
+            relative = os.path.relpath(self.planner.root, self.storage_manager.document_root)
+            roots.add(os.path.abspath(self.storage_manager.previews.preview_path(relative)))
+        for storage in storages:
+            if storage in shard_storages or not storage.get('path'):
+                continue
+            path = os.path.abspath(storage['path'])
+            if any(os.path.commonpath([path, root]) in (path, root) for root in roots):
+                raise RuntimeError(
+                    f"Хранилище {storage['id']} ({storage['path']}) проекта {project_id} уже охватывает "
+                    f"{self.planner.root}: включите SHARD_PROJECTS=true или используйте пустой проект"
+                )
+        if not shard_storages:
+            project = self.ls_manager.make_request('GET', f'/api/projects/{project_id}').json()
+            if project.get('task_number'):
+                raise RuntimeError(
+                    f"В проекте {project_id} уже есть задачи ({project['task_number']}), созданные без "
+                    f"хранилищ шардов: включите SHARD_PROJECTS=true или используйте пустой проект"
+                )
+
+    def sync(self, records: List[Dict[str, Any]], scan_all: bool = False, **job_kwargs) -> Dict[str, Any]:
+        """
+        Параллельная синхронизация хранилищ всех шардов
+
+        :return: Результаты синхронизации по именам шардов
+        """
+        jobs = []
+        for record in records:
+            payload = {
+                'scan_all': scan_all,
+                'project': record['project_id'],
+                'params': {'path': self.storage_path(record), 'regex_filter': record['regex_filter']}
+            }
+            job = StorageSyncJob(self.shard_manager(record), record['storage_id'], payload=payload, **job_kwargs)
+            jobs.append((record['name'], job.start()))
+
+        results = {}
+        failed = []
+        for name, job in jobs:
+            try:
+                results[name] = job.wait()
+            except Exception as e:
+                logger.error(f"Ошибка синхронизации шарда {name}: {e}")
+                failed.append(name)
+        if failed:
+            raise RuntimeError(f"Не удалось синхронизировать шарды: {failed}")
+        return results
+
+    def run(self, scan_all: bool = False, **job_kwargs) -> Dict[str, Any]:
+        """План шардов, хранилища и параллельная синхронизация"""
+        records = self.plan()
+        if self.storage_manager.previews:
+            self.storage_manager.previews.generate(self.storage_manager.iter_files())
+        records = self.ensure_storages(records)
+        logger.info(f"Шардов: {len(records)}, синхронизация...")
+        return {
+            'shards': [(r['name'], r['storage_id'], r['file_count']) for r in records],
+            'sync': self.sync(records, scan_all=scan_all, **job_kwargs)
+        }
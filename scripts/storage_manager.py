@@ -1,20 +1,75 @@
 import os
+import time
+import threading
 import logging
 from label_studio_client import LabelStudioManager
-from typing import Dict, Any, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
+from file_manifest import DEFAULT_STATE_DIR, FileEntry, FileManifest, ManifestDelta
+from file_scanner import FileScanner, build_matcher, count_entries
+from task_importer import tasks_from_files
+from task_paths import image_path_from_task, local_files_url
+from dedup import ContentDeduplicator
+from integrity import ImageIntegrityChecker, IntegrityResult
+from previews import PreviewGenerator
+from predictions import PredictionUploader
+from reconcile import Reconciler
+from pg_loader import BulkTaskLoader, connect_postgres, verify_with_rest
+from metrics import record_sync
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+IMAGE_REGEX_FILTER = r".*\.(jpg|jpeg|png)"
+DEFAULT_DATA_DIR = 'augmented_images'
+
 class StorageManager:
-    def __init__(self, label_studio_client: LabelStudioManager):
+    def __init__(self, label_studio_client: LabelStudioManager, data_dir: str = None):
+        """
+        :param label_studio_client: LabelStudioManager проекта
+        :param data_dir: Директория файлов (абсолютная или относительно document_root),
+                         по умолчанию augmented_images
+        """
         self.client = label_studio_client
         
         # Используем правильный корневой путь из переменных окружения
         self.document_root = os.getenv('LABEL_STUDIO_LOCAL_FILES_DOCUMENT_ROOT', '/data/files')
         # Путь для хранения файлов должен быть внутри document_root
-        self.data_dir = os.path.join(self.document_root, 'augmented_images')
+        self.data_dir = os.path.join(self.document_root, data_dir or DEFAULT_DATA_DIR)
+
+        # Предкомпилированный фильтр файлов (ALLOWED_IMAGE_EXTENSIONS + regex хранилища)
+        self.file_matcher = build_matcher(regex_filter=IMAGE_REGEX_FILTER)
+
+        # Манифест файлов для инкрементальной синхронизации
+        self.manifest = FileManifest()
+        # Порог изменений, выше которого выполняется полная синхронизация на сервере
+        self.full_sync_threshold = int(os.getenv('FULL_SYNC_THRESHOLD', '50000'))
+        # Первичная загрузка напрямую в базу Label Studio вместо полной синхронизации на сервере
+        self.bulk_load_enabled = os.getenv('BULK_LOAD_ENABLED', 'false').lower() == 'true'
+        # Сверка с задачами проекта, когда файлы удалены или перенесены
+        self.reconcile_enabled = os.getenv('RECONCILE_ENABLED', 'false').lower() == 'true'
+        # Синхронизации одного хранилища (по расписанию и по событиям) не должны пересекаться
+        self.sync_lock = threading.RLock()
+
+        # Уменьшенные копии изображений для интерфейса разметки
+        self.previews = None
+        self.serve_previews = os.getenv('SERVE_PREVIEWS', 'false').lower() == 'true'
+        if self.serve_previews or os.getenv('PREVIEWS_ENABLED', 'false').lower() == 'true':
+            self.previews = PreviewGenerator(self.document_root)
+
+        # Исключение побайтно одинаковых файлов перед импортом
+        self.deduplicator = None
+        if os.getenv('DEDUP_ENABLED', 'false').lower() == 'true':
+            # Индекс хешей общий только для файлов одного проекта
+            db_path = None
+            if data_dir:
+                state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+                db_path = os.path.join(state_dir, f'content_hashes_{self.client.get_project_id()}.sqlite')
+            self.deduplicator = ContentDeduplicator(self.document_root, db_path=db_path)
         
+        # Проверка изображений и карантин поврежденных файлов перед импортом
+        self.integrity = None
+        if os.getenv('INTEGRITY_CHECK_ENABLED', 'false').lower() == 'true':
+            self.integrity = ImageIntegrityChecker(self.document_root)
+
         # Проверяем и создаем директории
         self.validate_paths()
 
@@ -39,34 +94,64 @@ class StorageManager:
             logger.error(f"Ошибка при создании директорий: {e}")
             raise
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def create_storage(self) -> Dict[str, Any]:
-        """Создание локального хранилища"""
+    @property
+    def storage_path(self) -> str:
+        """Директория, которую Label Studio отдает в интерфейс разметки"""
+        if self.serve_previews:
+            return self.previews.preview_path(os.path.relpath(self.data_dir, self.document_root))
+        return self.data_dir
+
+    def create_storage(
+        self,
+        path: str = None,
+        title: str = None,
+        regex_filter: str = IMAGE_REGEX_FILTER,
+        project_id: int = None
+    ) -> Dict[str, Any]:
+        """
+        Создание локального хранилища
+
+        :param path: Абсолютный путь (по умолчанию storage_path)
+        :param title: Название (по умолчанию LABEL_STUDIO_PROJECT_NAME)
+        :param regex_filter: Фильтр имен файлов
+        :param project_id: ID проекта. Если не указан, используется текущий проект.
+        """
         try:
-            project_id = self.client.get_project_id()
+            project_id = project_id or self.client.get_project_id()
             
-            # Используем абсолютный путь внутри контейнера
-            storage_path = '/data/files/augmented_images'  # Абсолютный путь
+            # Используем абсолютный путь внутри контейнера (оригиналы или дерево превью)
+            storage_path = path or self.storage_path
             
             payload = {
                 "type": "localfiles",
-                "title": os.getenv('LABEL_STUDIO_PROJECT_NAME', 'Local Images Storage'),
+                "title": title or os.getenv('LABEL_STUDIO_PROJECT_NAME', 'Local Images Storage'),
                 "path": storage_path,  # Используем абсолютный путь
-                "regex_filter": r".*\.(jpg|jpeg|png)",
+                "regex_filter": regex_filter,
                 "use_blob_urls": True,
                 "presign": False,
                 "project": project_id
             }
             
             logger.info(f"Создание хранилища с параметрами: {payload}")
-            
-            response = self.client.client.make_request(
-                "POST",
-                f"/api/storages/localfiles",
-                json=payload
-            )
-            
-            storage_info = response.json()
+
+            def create():
+                response = self.client.make_request(
+                    "POST",
+                    f"/api/storages/localfiles",
+                    json=payload
+                )
+                return response.json()
+
+            def find_existing():
+                # Повтор POST после потерянного ответа не должен создать второе хранилище
+                return next((
+                    storage for storage in self.list_storages(project_id)
+                    if storage.get('path') == payload['path']
+                    and storage.get('title') == payload['title']
+                    and storage.get('regex_filter') == regex_filter
+                ), None)
+
+            storage_info = self.client.resilience.idempotent_post('create_storage', create, find_existing)
             logger.info(f"Создано локальное хранилище: {storage_info}")
             return storage_info
             
@@ -74,43 +159,354 @@ class StorageManager:
             logger.error(f"Ошибка создания хранилища: {e}")
             raise
 
-    def sync_storage(self, storage_id: int, scan_all: bool = False):
-        """Синхронизация хранилища"""
+    def sync_storage(self, storage_id: int, scan_all: bool = False, incremental: bool = True):
+        """
+        Синхронизация хранилища
+
+        При incremental=True изменения вычисляются по манифесту файлов и в Label Studio
+        отправляются только новые файлы. Полная синхронизация на сервере выполняется
+        только для проекта без задач, то есть при первом запуске (при BULK_LOAD_ENABLED=true
+        вместо нее задачи пишутся напрямую в базу, см. bulk_load). Если задачи уже есть, а изменений
+        больше FULL_SYNC_THRESHOLD или манифест пуст, новые файлы импортируются через API
+        с пропуском файлов, для которых задачи уже существуют.
+        """
+        started = time.perf_counter()
         try:
             # Сначала проверяем существование директории
             if not os.path.exists(self.data_dir):
                 raise ValueError(f"Directory {self.data_dir} does not exist")
-            
-            # Проверяем наличие файлов
-            files = os.listdir(self.data_dir)
-            if not files:
-                logger.warning(f"Directory {self.data_dir} is empty")
-            
-            logger.info(f"Found {len(files)} files in {self.data_dir}")
-            
-            # Выполняем синхронизацию через API
-            sync_url = f"/api/storages/localfiles/{storage_id}/sync"
-            response = self.client.client.make_request(
-                "POST", 
-                sync_url,
-                json={
-                    "scan_all": scan_all,
-                    "project": self.client.get_project_id(),
-                    "params": {
-                        "path": self.data_dir,
-                        "regex_filter": r".*\.(jpg|jpeg|png)"
-                    }
-                }
-            )
-            
-            sync_result = response.json()
-            logger.info(f"Синхронизация хранилища {storage_id}: {sync_result}")
+
+            delta = None
+            if incremental and not self.manifest.is_empty(self.data_dir):
+                delta = self._diff_manifest()
+                if delta.removed and self.reconcile_enabled:
+                    # Перенесенные файлы сохраняют задачи, задачи удаленных файлов убираются
+                    self.reconcile()
+                    delta = self._diff_manifest()
+                if len(delta.added) <= self.full_sync_threshold:
+                    return self._sync_delta(storage_id, delta, started)
+                logger.info(f"Новых файлов {len(delta.added)} больше порога {self.full_sync_threshold}")
+
+            if not self.bulk_load_enabled and self._project_has_tasks():
+                # Задачи, созданные через /import, не связаны с хранилищем: синхронизация
+                # на сервере создала бы для их файлов вторые задачи
+                if delta is None:
+                    delta = self._diff_manifest() if incremental \
+                        else ManifestDelta(list(self.iter_files()), [], [])
+                return self._sync_delta(storage_id, delta, started, skip_existing=True)
+
+            if self.integrity:
+                # Поврежденные файлы убираются из директории до синхронизации на сервере
+                self.validate_images()
+
+            if self.deduplicator:
+                # Синхронизация на сервере импортирует все файлы - дубликаты только в отчет
+                self.deduplicator.write_report(self.iter_files())
+
+            if self.previews:
+                self.previews.generate(self.iter_files())
+                if delta:
+                    self.previews.remove(entry.path for entry in delta.removed)
+
+            snapshot_scope = f'{self.data_dir}#snapshot'
+            if incremental:
+                # Снимок до синхронизации: файлы, скопированные во время нее (в том числе
+                # с сохранением mtime), в манифест не попадут и войдут в следующую дельту
+                snapshot_scanner = self.scanner()
+                self.manifest.rebuild(snapshot_scanner.scan(), snapshot_scope)
+
+            if self.bulk_load_enabled:
+                sync_result = self.bulk_load(storage_id)
+            else:
+                sync_result = self._sync_storage_full(storage_id, scan_all)
+
+            if incremental and snapshot_scanner.errors:
+                # В неполном снимке не хватает файлов - манифест остается прежним
+                logger.warning(
+                    f"Обход {self.data_dir} завершился с ошибками ({snapshot_scanner.errors}), манифест не обновлен"
+                )
+            elif incremental:
+                self.manifest.promote(snapshot_scope, self.data_dir)
+            record_sync('full', started)
             return sync_result
             
         except Exception as e:
             logger.error(f"Ошибка синхронизации хранилища: {e}")
             raise
 
+    def _diff_manifest(self) -> ManifestDelta:
+        """
+        Дельта манифеста по текущему обходу data_dir
+
+        Если обход завершился с ошибками чтения, удаления не применяются:
+        файлы из нечитаемой директории выглядели бы удаленными.
+        """
+        scanner = self.scanner()
+        delta = self.manifest.diff(scanner.scan(), self.data_dir)
+        if scanner.errors and delta.removed:
+            logger.warning(
+                f"Обход {self.data_dir} завершился с ошибками ({scanner.errors}), "
+                f"удаление {len(delta.removed)} файлов отложено до полного обхода"
+            )
+            delta = delta._replace(removed=[])
+        return delta
+
+    def _sync_delta(self, storage_id: int, delta: ManifestDelta, started: float,
+                    skip_existing: bool = None) -> Dict[str, Any]:
+        """Отправка дельты манифеста через API импорта"""
+        # Недавно измененные файлы не попадают в манифест и войдут в следующую дельту
+        delta, _ = self._quarantine_delta(delta)
+        sync_result = self._apply_delta(delta, skip_existing=skip_existing)
+        record_sync('incremental', started)
+        logger.info(f"Инкрементальная синхронизация хранилища {storage_id}: {sync_result}")
+        return sync_result
+
+    def _project_has_tasks(self) -> bool:
+        project_id = self.client.get_project_id()
+        project = self.client.make_request('GET', f'/api/projects/{project_id}').json()
+        return bool(project.get('task_number'))
+
+    def sync_paths(self, paths: Iterable[str]) -> Dict[str, Any]:
+        """
+        Инкрементальная синхронизация только указанных файлов без обхода директории
+
+        :param paths: Пути относительно document_root (новые, измененные или удаленные файлы)
+        :return: Статистика; deferred - пути недавно измененных файлов, которые нужно передать повторно
+        """
+        started = time.perf_counter()
+        entries = []
+        missing = []
+        for path in set(paths):
+            if not self.file_matcher(os.path.basename(path)):
+                continue
+            try:
+                st = os.stat(os.path.join(self.document_root, path))
+            except FileNotFoundError:
+                missing.append(path)
+                continue
+            entries.append(FileEntry(path, st.st_size, st.st_mtime_ns, st.st_ino))
+
+        delta, deferred = self._quarantine_delta(self.manifest.diff_paths(entries, missing, self.data_dir))
+        if not any(delta):
+            return {'added': 0, 'changed': 0, 'removed': 0, 'deferred': deferred}
+        sync_result = self._apply_delta(delta)
+        sync_result['deferred'] = deferred
+        record_sync('paths', started)
+        return sync_result
+
+    def _quarantine_delta(self, delta: ManifestDelta) -> Tuple[ManifestDelta, List[str]]:
+        """
+        Исключение из дельты поврежденных файлов (они переносятся в карантин)
+        и файлов, которые еще могут дописываться
+
+        :return: (дельта, пути отложенных недавно измененных файлов)
+        """
+        if not self.integrity or not (delta.added or delta.changed):
+            return delta, []
+        result = self.integrity.validate(list(delta.added) + list(delta.changed))
+        deferred = [entry.path for entry in result.pending]
+        if not result.invalid and not deferred:
+            return delta, deferred
+        bad = {entry.path for entry, _ in result.invalid}
+        skip = bad | set(deferred)
+        # Измененный файл уже был импортирован - из манифеста он удаляется
+        return ManifestDelta(
+            [e for e in delta.added if e.path not in skip],
+            [e for e in delta.changed if e.path not in skip],
+            list(delta.removed) + [e for e in delta.changed if e.path in bad]
+        ), deferred
+
+    def _apply_delta(self, delta: ManifestDelta, skip_existing: bool = None) -> Dict[str, Any]:
+        """Превью, отправка новых файлов и фиксация дельты в манифесте"""
+        if self.previews:
+            failed = set(self.previews.generate(delta.added + delta.changed)['failed_paths'])
+            self.previews.remove(entry.path for entry in delta.removed)
+            if failed and self.serve_previews:
+                # Задача ссылалась бы на несуществующее превью - файл попадет в следующую дельту
+                delta = ManifestDelta(
+                    [e for e in delta.added if e.path not in failed],
+                    [e for e in delta.changed if e.path not in failed],
+                    delta.removed
+                )
+        sync_result, applied = self._push_delta(delta, skip_existing=skip_existing)
+        self.manifest.apply(applied, self.data_dir)
+        return sync_result
+
+    def reconcile(self, mode: str = None, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Сверка файлов с задачами проекта: перенесенные файлы получают новый путь
+        в своих задачах, задачи удаленных файлов архивируются и удаляются (см. Reconciler)
+
+        :param mode: archive, delete или report (RECONCILE_ORPHANS)
+        :param dry_run: Только подсчитать изменения
+        """
+        with self.sync_lock:
+            return Reconciler(self, mode=mode).run(dry_run=dry_run)
+
+    def start_sync(self, storage_id: int, scan_all: bool = False, **job_kwargs):
+        """
+        Неблокирующая полная синхронизация хранилища на стороне Label Studio
+
+        :param job_kwargs: Параметры StorageSyncJob (колбэки, интервалы опроса, timeout)
+        :return: Запущенная задача синхронизации
+        """
+        payload = {
+            "scan_all": scan_all,
+            "project": self.client.get_project_id(),
+            "params": {
+                "path": self.storage_path,
+                "regex_filter": IMAGE_REGEX_FILTER
+            }
+        }
+        return self.client.start_storage_sync(storage_id, payload=payload, **job_kwargs)
+
+    def _sync_storage_full(self, storage_id: int, scan_all: bool = False):
+        """Полная синхронизация хранилища на стороне Label Studio с ожиданием завершения"""
+        logger.info(f"Полная синхронизация хранилища {storage_id} (scan_all={scan_all})")
+
+        sync_result = self.start_sync(storage_id, scan_all).wait()
+        logger.info(f"Синхронизация хранилища {storage_id}: {sync_result}")
+        return sync_result
+
+    def bulk_load(self, storage_id: int = None, conn=None) -> Dict[str, Any]:
+        """
+        Загрузка задач для файлов хранилища напрямую в базу Label Studio (COPY, одна транзакция)
+
+        Данные задач и связи с файлами те же, что создает синхронизация хранилища,
+        поэтому последующие синхронизации эти файлы не импортируют повторно.
+        Файлы, для которых задачи уже есть, пропускаются. После загрузки
+        результат проверяется через REST API: задачи к этому моменту уже
+        зафиксированы в базе, поэтому расхождение не прерывает синхронизацию,
+        а возвращается в результате ('ok': False) и пишется в лог.
+
+        :param storage_id: ID локального хранилища (без него связи с файлами не создаются)
+        :param conn: Соединение с базой (по умолчанию connect_postgres())
+        """
+        project_id = self.client.get_project_id()
+        index = self.client.import_index(project_id)
+        index.refresh()
+        before = self.client.make_request('GET', f'/api/projects/{project_id}').json().get('task_number') or 0
+
+        stats = {}
+        tasks = index.filter_new(tasks_from_files(self.iter_files(), self.build_task), stats)
+        # Ключ связи - абсолютный путь файла, как при синхронизации хранилища
+        items = ((os.path.join(self.document_root, image_path_from_task(t)), t['data']) for t in tasks)
+
+        own_conn = conn is None
+        conn = conn or connect_postgres()
+        try:
+            result = BulkTaskLoader(conn, project_id, storage_id).load(items)
+        finally:
+            if own_conn:
+                conn.close()
+
+        verification = verify_with_rest(self.client, project_id, result['sample'], before + result['loaded'])
+        # Индекс догружает новые задачи через API - следующие импорты их пропустят
+        index.refresh()
+        return {
+            'loaded': result['loaded'],
+            'skipped': stats.get('skipped', 0),
+            'verified': verification['checked'],
+            'ok': verification['ok'],
+            'mismatches': verification['mismatches']
+        }
+
+    def scanner(self) -> FileScanner:
+        """Сканер файлов изображений data_dir с путями относительно document_root"""
+        return FileScanner(self.data_dir, base=self.document_root, matcher=self.file_matcher)
+
+    def iter_files(self):
+        """Потоковый обход файлов изображений с путями относительно document_root"""
+        return self.scanner().scan()
+
+    def build_task(self, relative_path: str) -> Dict[str, Any]:
+        """
+        Формирование задачи для файла в том же формате, что создает синхронизация
+        локального хранилища Label Studio
+
+        :param relative_path: Путь к файлу относительно document_root
+        """
+        if self.serve_previews:
+            relative_path = self.previews.preview_relative_path(relative_path)
+        return {'data': {'image': local_files_url(relative_path)}}
+
+    def _push_delta(self, delta: ManifestDelta, skip_existing: bool = None) -> Tuple[Dict[str, Any], ManifestDelta]:
+        """
+        Отправка в Label Studio только новых файлов из дельты манифеста
+
+        Пропущенные дубликаты в манифест не записываются: они проверяются при каждой
+        синхронизации и импортируются, когда файл-оригинал удален.
+
+        :param skip_existing: Проверять файлы по индексу импортированных путей (по умолчанию IMPORT_INDEX_ENABLED)
+        :return: Статистика и дельта для фиксации в манифесте
+        """
+        import_stats = {}
+        to_import = delta.added
+        duplicates = []
+        if self.deduplicator:
+            self.deduplicator.remove(entry.path for entry in delta.removed)
+            if delta.added:
+                to_import, duplicates = self.deduplicator.deduplicate(delta.added)
+                for entry, original in duplicates:
+                    logger.debug(f"Пропущен дубликат {entry.path} (совпадает с {original})")
+
+        if to_import:
+            imported_paths = set()
+
+            def on_chunk(chunk, task_ids):
+                paths = [image_path_from_task(task) for task in chunk]
+                imported_paths.update(paths)
+
+            try:
+                import_stats = self.client.import_tasks(
+                    tasks_from_files(to_import, self.build_task),
+                    project_id=self.client.get_project_id(),
+                    on_chunk=on_chunk,
+                    skip_existing=skip_existing
+                )
+            except Exception:
+                # Часть чанков импортирована - они фиксируются в манифесте, иначе
+                # следующая синхронизация (без индекса импорта) создала бы их повторно
+                done = [e for e in to_import if image_path_from_task(self.build_task(e.path)) in imported_paths]
+                if done:
+                    self.manifest.apply(ManifestDelta(done, [], []), self.data_dir)
+                    logger.warning(f"Импорт прерван ошибкой, в манифест записаны импортированные файлы: {len(done)}")
+                raise
+
+        if delta.changed:
+            # Задачи ссылаются на файл по пути, поэтому обновленное содержимое отдается автоматически
+            logger.info(f"Изменено файлов: {len(delta.changed)}")
+        if delta.removed:
+            logger.warning(f"Удалено файлов, для которых остались задачи: {len(delta.removed)}")
+
+        stats = {
+            'added': len(delta.added),
+            'changed': len(delta.changed),
+            'removed': len(delta.removed),
+            'duplicates': len(duplicates),
+            'imported': import_stats.get('imported', 0),
+            'skipped': import_stats.get('skipped', 0),
+            'tasks_per_sec': import_stats.get('tasks_per_sec', 0.0)
+        }
+        if duplicates:
+            skipped = {entry.path for entry, _ in duplicates}
+            delta = ManifestDelta([e for e in delta.added if e.path not in skipped], delta.changed, delta.removed)
+        return stats, delta
+
+    def upload_predictions(self, predictions, **uploader_kwargs) -> Dict[str, Any]:
+        """
+        Пакетная загрузка предсказаний модели (предразметка) для файлов хранилища
+
+        :param predictions: Итератор словарей {path, label | result, score, model_version}
+        :param uploader_kwargs: Параметры PredictionUploader (chunk_size, workers, model_version)
+        :return: Статистика загрузки
+        """
+        try:
+            return PredictionUploader(self, **uploader_kwargs).upload(predictions)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки предсказаний: {e}")
+            raise
+
     def validate_storage(self, storage_id: int):
         """Валидация хранилища и проверка доступа к файлам"""
         logger.info(f"Начало валидации хранилища {storage_id}")
@@ -121,19 +517,19 @@ class StorageManager:
             if not any(s['id'] == storage_id for s in storages):
                 raise ValueError(f"Storage with ID {storage_id} does not exist")
             
-            # Проверяем содержимое директорий
+            # Проверяем содержимое директорий без загрузки списка файлов в память
             for path in [self.document_root, self.data_dir]:
                 logger.info(f"Проверка директории {path}")
                 try:
-                    files = os.listdir(path)
-                    logger.info(f"Файлы в {path}: {files[:10]}...")
-                    logger.info(f"Всего файлов: {len(files)}")
+                    total, sample = count_entries(path)
+                    logger.info(f"Файлы в {path}: {sample}...")
+                    logger.info(f"Всего элементов: {total}")
                     logger.info(f"Права доступа: {oct(os.stat(path).st_mode)[-3:]}")
                 except Exception as e:
                     logger.error(f"Ошибка при проверке директории {path}: {e}")
 
             # Используем правильный эндпоинт для валидации
-            response = self.client.client.make_request(
+            response = self.client.make_request(
                 'GET',  # Изменено с POST на GET
                 f'/api/storages/localfiles/{storage_id}',  # Изменен эндпоинт
                 params={'validate': 'true'}  # Добавлен параметр validate
@@ -146,14 +542,28 @@ class StorageManager:
             logger.error(f"Ошибка при валидации хранилища: {e}")
             raise
         
-    def list_storages(self):
+    def validate_images(self, entries: Iterable[FileEntry] = None) -> IntegrityResult:
+        """
+        Проверка изображений (заголовки и декодирование) с переносом поврежденных в карантин
+
+        :param entries: Файлы для проверки (по умолчанию все файлы data_dir)
+        """
+        checker = self.integrity or ImageIntegrityChecker(self.document_root)
+        result = checker.validate(self.iter_files() if entries is None else entries)
+        if result.invalid:
+            logger.warning(
+                f"В карантин {checker.quarantine_dir} перенесено поврежденных файлов: {len(result.invalid)}"
+            )
+        return result
+
+    def list_storages(self, project_id: int = None):
         """Получение списка хранилищ"""
         try:
             # Получаем ID проекта
-            project_id = self.client.get_project_id()
+            project_id = project_id or self.client.get_project_id()
             
             # Добавляем project_id в URL запроса
-            response = self.client.client.make_request(
+            response = self.client.make_request(
                 "GET", 
                 f"/api/storages/localfiles?project={project_id}"
             )
@@ -162,10 +572,22 @@ class StorageManager:
             logger.error(f"Ошибка получения списка хранилищ: {e}")
             raise
 
+    def get_storage(self, storage_id: int) -> Dict[str, Any]:
+        """Получение хранилища по ID (один запрос, без валидации файлов)"""
+        try:
+            response = self.client.make_request(
+                "GET",
+                f"/api/storages/localfiles/{storage_id}"
+            )
+            return response.json()
+        except Exception as e:
+            logger.error(f"Ошибка получения хранилища {storage_id}: {e}")
+            raise
+
     def delete_storage(self, storage_id: int):
         """Удаление хранилища"""
         try:
-            response = self.client.client.make_request(
+            response = self.client.make_request(
                 "DELETE", 
                 f"/api/storages/localfiles/{storage_id}"
             )
@@ -194,7 +616,7 @@ class StorageManager:
                 'description': description
             }.items() if v is not None}
             
-            response = self.client.client.make_request(
+            response = self.client.make_request(
                 "PATCH",
                 f"/api/storages/localfiles/{storage_id}",
                 json=payload
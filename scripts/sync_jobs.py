@@ -0,0 +1,213 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Статусы хранилища Label Studio, при которых синхронизация еще идет
+IN_PROGRESS_STATUSES = ('initialized', 'queued', 'in_progress')
+
+
+class SyncCancelledError(RuntimeError):
+    """Отслеживание синхронизации отменено (cancel), результата нет"""
+
+
+class StorageSyncJob:
+    """
+    Неблокирующая синхронизация локального хранилища.
+
+    start() запускает синхронизацию и фоновый опрос статуса хранилища с
+    адаптивным интервалом: пока количество задач растет, опрос частый,
+    без изменений интервал увеличивается до poll_max. По завершении
+    вызываются колбэки on_complete / on_failure.
+
+    Label Studio не позволяет отменить синхронизацию на сервере, поэтому
+    cancel() только прекращает отслеживание. Ошибки в колбэках пишутся
+    в лог и не меняют состояние задачи.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __init__(
+        self,
+        ls_manager,
+        storage_id: int,
+        payload: Optional[Dict[str, Any]] = None,
+        on_complete: Optional[Callable[['StorageSyncJob'], None]] = None,
+        on_failure: Optional[Callable[['StorageSyncJob', Exception], None]] = None,
+        on_progress: Optional[Callable[['StorageSyncJob'], None]] = None,
+        poll_min: float = 0.5,
+        poll_max: float = 15.0,
+        timeout: Optional[float] = None
+    ):
+        """
+        :param ls_manager: LabelStudioManager
+        :param storage_id: ID локального хранилища
+        :param payload: Тело запроса синхронизации (scan_all и т.п.)
+        :param on_complete: Вызывается после успешной синхронизации
+        :param on_failure: Вызывается при ошибке синхронизации
+        :param on_progress: Вызывается при изменении количества импортированных задач
+        :param poll_min: Минимальный интервал опроса, сек
+        :param poll_max: Максимальный интервал опроса, сек
+        :param timeout: Максимальное время отслеживания, сек (None - без ограничения)
+        """
+        self.ls_manager = ls_manager
+        self.storage_id = storage_id
+        self.payload = payload
+        self.on_complete = on_complete
+        self.on_failure = on_failure
+        self.on_progress = on_progress
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.timeout = timeout
+
+        self.state = self.PENDING
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[Exception] = None
+        self.imported = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """Скорость импорта, задач/сек"""
+        elapsed = self.elapsed
+        return self.imported / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def progress(self) -> Dict[str, Any]:
+        return {
+            'storage_id': self.storage_id,
+            'state': self.state,
+            'imported': self.imported,
+            'rate': round(self.rate, 1),
+            'elapsed': round(self.elapsed, 3)
+        }
+
+    def start(self) -> 'StorageSyncJob':
+        if self._thread is not None:
+            return self
+        self.started_at = time.monotonic()
+        self.state = self.RUNNING
+        self._thread = threading.Thread(
+            target=self._run, name=f'storage-sync-{self.storage_id}', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Ожидание завершения синхронизации
+
+        :return: Последнее состояние хранилища
+        :raises: Ошибку синхронизации, TimeoutError если timeout истек,
+                 SyncCancelledError если отслеживание отменено
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Синхронизация хранилища {self.storage_id} не завершилась за {timeout} сек")
+        if self.error is not None:
+            raise self.error
+        if self.state == self.CANCELLED:
+            raise SyncCancelledError(f"Отслеживание синхронизации хранилища {self.storage_id} отменено")
+        return self.result
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def _run(self):
+        try:
+            response = self.ls_manager.make_request(
+                "POST",
+                f"/api/storages/localfiles/{self.storage_id}/sync",
+                json=self.payload
+            )
+            storage = response.json()
+            self._update_progress(storage)
+
+            interval = self.poll_min
+            while storage.get('status') in IN_PROGRESS_STATUSES:
+                if self.timeout is not None and self.elapsed > self.timeout:
+                    raise TimeoutError(f"Превышено время синхронизации хранилища {self.storage_id}")
+                if self._cancelled.wait(interval):
+                    self.state = self.CANCELLED
+                    self.finished_at = time.monotonic()
+                    logger.info(f"Отслеживание синхронизации хранилища {self.storage_id} отменено")
+                    return
+
+                storage = self.ls_manager.make_request(
+                    "GET", f"/api/storages/localfiles/{self.storage_id}"
+                ).json()
+                if self._update_progress(storage):
+                    interval = self.poll_min
+                else:
+                    interval = min(interval * 1.5, self.poll_max)
+
+            if storage.get('status') == 'failed':
+                raise RuntimeError(
+                    f"Синхронизация хранилища {self.storage_id} завершилась ошибкой: "
+                    f"{storage.get('traceback') or storage.get('meta')}"
+                )
+
+            self.result = storage
+            self.state = self.COMPLETED
+            self.finished_at = time.monotonic()
+            logger.info(f"Синхронизация хранилища завершена: {self.progress}")
+            self._callback(self.on_complete, self)
+
+        except Exception as e:
+            self.error = e
+            self.state = self.FAILED
+            self.finished_at = time.monotonic()
+            logger.error(f"Ошибка синхронизации хранилища {self.storage_id}: {e}")
+            self._callback(self.on_failure, self, e)
+        finally:
+            self._done.set()
+
+    def _callback(self, callback: Optional[Callable], *args):
+        """Вызов колбэка: его ошибка не считается ошибкой синхронизации"""
+        if not callback:
+            return
+        try:
+            callback(*args)
+        except Exception:
+            logger.exception(f"Ошибка в колбэке синхронизации хранилища {self.storage_id}")
+
+    def _update_progress(self, storage: Dict[str, Any]) -> bool:
+        """Обновление счетчика задач. Возвращает True, если прогресс изменился."""
+        imported = storage.get('last_sync_count') or 0
+        if imported == self.imported:
+            return False
+        self.imported = imported
+        logger.info(f"Синхронизация хранилища {self.storage_id}: {self.progress}")
+        self._callback(self.on_progress, self)
+        return True
+
+
+def run_sync_jobs(ls_manager, storage_ids: Iterable[int], **job_kwargs) -> List[StorageSyncJob]:
+    """
+    Одновременная синхронизация нескольких хранилищ
+
+    :return: Список завершенных задач синхронизации (с result или error)
+    """
+    jobs = [StorageSyncJob(ls_manager, storage_id, **job_kwargs).start() for storage_id in storage_ids]
+    for job in jobs:
+        job._done.wait()
+    return jobs
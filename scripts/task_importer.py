@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Разбиение итератора на списки фиксированного размера"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def prefetch(items: Iterable[Any], depth: int = 2) -> Iterator[Any]:
+    """
+    Чтение итератора в фоновом потоке не более чем на depth элементов вперед
+
+    Обработка текущего элемента (например, запись страницы в SQLite)
+    выполняется параллельно с получением следующих страниц. Исключение
+    источника пробрасывается в потребителя.
+    """
+    queue: Queue = Queue(maxsize=max(depth, 1))
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                queue.put((item, None))
+            queue.put((done, None))
+        except Exception as e:
+            queue.put((done, e))
+
+    thread = threading.Thread(target=produce, name='prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = queue.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Потребитель остановился раньше - освобождаем поток источника
+        stop.set()
+        while thread.is_alive():
+            while not queue.empty():
+                queue.get_nowait()
+            thread.join(0.05)
+
+
+def tasks_from_files(entries: Iterable[Any], build_task: Callable[[str], Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Задачи для файлов, найденных сканером
+
+    :param entries: Итератор FileEntry (см. FileScanner)
+    :param build_task: Функция относительный путь -> задача (StorageManager.build_task)
+    """
+    for entry in entries:
+        yield build_task(entry.path)
+
+
+def tasks_from_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Задачи из JSONL файла: по одной задаче Label Studio JSON на строку.
+    Строки без ключа 'data' считаются данными задачи. Предсказания
+    ('predictions') передаются как есть.
+    """
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                task = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.error(f"Некорректный JSON в {path}:{line_no}: {e}")
+                continue
+            yield task if 'data' in task else {'data': task}
+
+
+class BulkTaskImporter:
+    """
+    Конвейер пакетного импорта задач.
+
+    Задачи из генератора группируются в чанки и отправляются через API импорта
+    проекта в несколько параллельных потоков. Количество чанков в работе
+    ограничено, поэтому генератор не читается быстрее, чем сервер принимает задачи.
+    """
+
+    def __init__(
+        self,
+        ls_manager,
+        project_id: int = None,
+        chunk_size: int = None,
+        workers: int = None,
+        max_pending_chunks: int = None,
+        progress_interval: float = 10.0,
+        sender: Optional[Callable[[List[Dict[str, Any]], int], List[int]]] = None
+    ):
+        """
+        :param ls_manager: LabelStudioManager
+        :param project_id: ID проекта. Если не указан, используется текущий проект.
+        :param chunk_size: Задач в одном запросе (IMPORT_CHUNK_SIZE, по умолчанию 1000)
+        :param workers: Параллельных запросов (IMPORT_WORKERS, по умолчанию 4)
+        :param max_pending_chunks: Максимум чанков в работе (по умолчанию workers * 2)
+        :param progress_interval: Интервал логирования прогресса в секундах
+        :param sender: Отправка чанка (элементы, ID проекта) - по умолчанию create_tasks_batch
+        """
+        self.ls_manager = ls_manager
+        self.project_id = project_id or ls_manager.get_project_id()
+        self.chunk_size = chunk_size or int(os.getenv('IMPORT_CHUNK_SIZE', '1000'))
+        self.workers = workers or int(os.getenv('IMPORT_WORKERS', '4'))
+        self.max_pending_chunks = max_pending_chunks or self.workers * 2
+        self.progress_interval = progress_interval
+        self.sender = sender or ls_manager.create_tasks_batch
+
+    def import_tasks(
+        self,
+        tasks: Iterable[Dict[str, Any]],
+        on_chunk: Optional[Callable[[List[Dict[str, Any]], List[int]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Импорт задач из итератора
+
+        :param tasks: Итератор задач в формате Label Studio JSON
+        :param on_chunk: Вызывается после успешного импорта чанка (задачи, ID задач)
+        :return: Статистика импорта
+        """
+        pending = threading.BoundedSemaphore(self.max_pending_chunks)
+        lock = threading.Lock()
+        stats = {'imported': 0, 'chunks': 0, 'failed_chunks': 0}
+        errors: List[Exception] = []
+        started = time.monotonic()
+        last_report = [started]
+
+        def post_chunk(chunk):
+            try:
+                task_ids = self.sender(chunk, self.project_id)
+                if on_chunk:
+                    on_chunk(chunk, task_ids)
+                with lock:
+                    stats['imported'] += len(chunk)
+                    stats['chunks'] += 1
+                    self._report_progress(stats, started, last_report)
+            except Exception as e:
+                logger.error(f"Ошибка импорта чанка из {len(chunk)} задач: {e}")
+                with lock:
+                    stats['failed_chunks'] += 1
+                    errors.append(e)
+            finally:
+                pending.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='importer') as executor:
+            for chunk in chunked(tasks, self.chunk_size):
+                # Ждем освобождения слота - обратное давление на генератор задач
+                pending.acquire()
+                executor.submit(post_chunk, chunk)
+
+        elapsed = time.monotonic() - started
+        stats['elapsed'] = round(elapsed, 3)
+        stats['tasks_per_sec'] = round(stats['imported'] / elapsed, 1) if elapsed > 0 else 0.0
+        logger.info(
+            f"Импорт в проект {self.project_id} завершен: {stats['imported']} задач, "
+            f"{stats['chunks']} чанков, ошибок {stats['failed_chunks']}, "
+            f"{stats['tasks_per_sec']} задач/сек"
+        )
+
+        if errors:
+            raise RuntimeError(
+                f"Не удалось импортировать {stats['failed_chunks']} чанков из "
+                f"{stats['chunks'] + stats['failed_chunks']}"
+            ) from errors[0]
+        return stats
+
+    def _report_progress(self, stats, started, last_report):
+        now = time.monotonic()
+        if now - last_report[0] < self.progress_interval:
+            return
+        last_report[0] = now
+        rate = stats['imported'] / (now - started)
+        logger.info(f"Импортировано {stats['imported']} задач ({rate:.1f} задач/сек)")
+
+
+def main():
+    """Импорт задач из JSONL файла или директории с изображениями"""
+    from label_studio_client import LabelStudioManager
+    from storage_manager import StorageManager
+
+    parser = argparse.ArgumentParser(description='Пакетный импорт задач в Label Studio')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--jsonl', help='JSONL файл с задачами (по одной на строку)')
+    source.add_argument('--scan', action='store_true', help='Импорт всех изображений хранилища')
+    parser.add_argument('--chunk-size', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    ls_manager = LabelStudioManager()
+    if args.jsonl:
+        tasks = tasks_from_jsonl(args.jsonl)
+    else:
+        storage_manager = StorageManager(ls_manager)
+        tasks = tasks_from_files(storage_manager.iter_files(), storage_manager.build_task)
+
+    ls_manager.import_tasks(tasks, chunk_size=args.chunk_size, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import os
+import time
+import logging
+import sqlite3
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+from file_manifest import DEFAULT_STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+LOCAL_FILES_PREFIX = '/data/local-files/'
+
+
+def local_files_url(relative_path: str) -> str:
+    """
+    URL файла в формате, который создает синхронизация локального хранилища Label Studio
+
+    Путь кодируется, поэтому '+', '%', '&', '#' и пробелы в именах файлов
+    восстанавливаются image_path_from_task без искажений.
+    """
+    return f"{LOCAL_FILES_PREFIX}?d={quote(relative_path, safe='/')}"
+
+
+def image_path_from_task(task: Dict[str, Any], key: str = 'image') -> Optional[str]:
+    """
+    Путь файла относительно document_root из данных задачи
+
+    '/data/local-files/?d=augmented_images/1.jpg' -> 'augmented_images/1.jpg'
+
+    Значение d декодируется только здесь (parse_qs), см. local_files_url.
+    """
+    url = (task.get('data') or {}).get(key)
+    if not isinstance(url, str):
+        return None
+    parsed = urlparse(url)
+    if parsed.path.startswith(LOCAL_FILES_PREFIX):
+        values = parse_qs(parsed.query).get('d')
+        return values[0] if values else None
+    return unquote(parsed.path).lstrip('/') or None
+
+
+class TaskPathMap:
+    """
+    Персистентное соответствие путь файла -> ID задачи для проекта.
+
+    Карта хранится в SQLite и обновляется инкрементально: при refresh()
+    запрашиваются только задачи с ID больше последнего обработанного.
+    Задачи, удаленные в Label Studio, так не обнаружить, поэтому раз
+    в rebuild_interval карта перестраивается полным обходом проекта.
+    """
+
+    def __init__(self, ls_manager, project_id: int = None, db_path: str = None, rebuild_interval: float = None):
+        """
+        :param ls_manager: LabelStudioManager
+        :param project_id: ID проекта. Если не указан, используется текущий проект.
+        :param db_path: Файл карты (по умолчанию STATE_DIR/task_paths_<project>.sqlite)
+        :param rebuild_interval: Период полной перестройки, сек (TASK_MAP_REBUILD_INTERVAL,
+                                 по умолчанию 86400, 0 - не перестраивать)
+        """
+        self.ls_manager = ls_manager
+        self.project_id = project_id or ls_manager.get_project_id()
+        state_dir = os.getenv('STATE_DIR', DEFAULT_STATE_DIR)
+        self.db_path = db_path or os.path.join(state_dir, f'task_paths_{self.project_id}.sqlite')
+        if rebuild_interval is None:
+            rebuild_interval = float(os.getenv('TASK_MAP_REBUILD_INTERVAL', '86400'))
+        self.rebuild_interval = rebuild_interval
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS task_paths (
+                    path TEXT PRIMARY KEY,
+                    task_id INTEGER NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS task_paths_task ON task_paths (task_id)')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)')
+
+    def _meta(self, key: str) -> int:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else 0
+
+    @property
+    def last_task_id(self) -> int:
+        return self._meta('last_task_id')
+
+    def rebuild_due(self) -> bool:
+        """Пора ли перестроить карту полным обходом (см. rebuild_interval)"""
+        return self.rebuild_interval > 0 and time.time() - self._meta('rebuilt_at') >= self.rebuild_interval
+
+    def refresh(
+        self,
+        page_size: int = 1000,
+        on_rows: Optional[Callable[[List[Tuple[str, int]]], None]] = None
+    ) -> int:
+        """
+        Загрузка задач, созданных после последнего обновления
+
+        Следующая страница запрашивается, пока текущая записывается в базу.
+
+        :param on_rows: Вызывается для каждой записанной страницы (пары путь, ID задачи)
+        :return: Количество добавленных путей
+        """
+        if self.rebuild_due():
+            return self.rebuild(page_size, on_rows)
+        last_id = self.last_task_id
+        added = 0
+        conn = self._connect()
+        try:
+            pages = self.ls_manager.iter_task_pages(
+                self.project_id, page_size=page_size, fields='task_only', after_id=last_id
+            )
+            for page in pages:
+                rows = [(path, task['id']) for task in page for path in [image_path_from_task(task)] if path]
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO task_paths VALUES (?, ?)', rows)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO meta VALUES ('last_task_id', ?)", (page[-1]['id'],)
+                    )
+                if on_rows:
+                    on_rows(rows)
+                added += len(rows)
+        finally:
+            conn.close()
+        if added:
+            logger.info(f"Карта путей задач проекта {self.project_id}: добавлено {added}")
+        return added
+
+    def rebuild(
+        self,
+        page_size: int = 1000,
+        on_rows: Optional[Callable[[List[Tuple[str, int]]], None]] = None
+    ) -> int:
+        """
+        Полная перестройка карты: пути удаленных задач из нее исчезают.
+        Задачи загружаются во временную таблицу, которая заменяет карту одной транзакцией.
+
+        :return: Количество путей в карте
+        """
+        total = 0
+        last_id = 0
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DROP TABLE IF EXISTS task_paths_rebuild')
+                conn.execute(
+                    'CREATE TABLE task_paths_rebuild (path TEXT PRIMARY KEY, task_id INTEGER NOT NULL) WITHOUT ROWID'
+                )
+            for page in self.ls_manager.iter_task_pages(self.project_id, page_size=page_size, fields='task_only'):
+                rows = [(path, task['id']) for task in page for path in [image_path_from_task(task)] if path]
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO task_paths_rebuild VALUES (?, ?)', rows)
+                if on_rows:
+                    on_rows(rows)
+                total += len(rows)
+                last_id = page[-1]['id']
+            with conn:
+                removed = conn.execute(
+                    'SELECT COUNT(*) FROM task_paths WHERE path NOT IN (SELECT path FROM task_paths_rebuild)'
+                ).fetchone()[0]
+                conn.execute('DELETE FROM task_paths')
+                conn.execute('INSERT INTO task_paths SELECT path, task_id FROM task_paths_rebuild')
+                conn.execute('DROP TABLE task_paths_rebuild')
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('last_task_id', ?)", (last_id,))
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('rebuilt_at', ?)", (int(time.time()),))
+        finally:
+            conn.close()
+        logger.info(f"Карта путей задач проекта {self.project_id} перестроена: {total} путей, удалено {removed}")
+        return total
+
+    def add(self, items: Iterable[Tuple[str, int]], created_ids: Iterable[int] = None):
+        """
+        Добавление пар (путь, ID задачи) для только что созданных задач
+
+        :param created_ids: ID всех задач, созданных одним запросом (в том числе без путей).
+                            Если они идут подряд сразу за last_task_id, граница сдвигается,
+                            и refresh() не загружает эти задачи повторно.
+        """
+        ids = sorted(set(created_ids or ()))
+        with self._connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO task_paths VALUES (?, ?)', items)
+            if ids and ids[-1] - ids[0] + 1 == len(ids):
+                # Условное обновление: между границей и ID задач не должно остаться чужих задач
+                conn.execute("INSERT OR IGNORE INTO meta VALUES ('last_task_id', 0)")
+                conn.execute(
+                    "UPDATE meta SET value = ? WHERE key = 'last_task_id' AND value = ?",
+                    (ids[-1], ids[0] - 1)
+                )
+
+    def remove_tasks(self, task_ids: Iterable[int]):
+        with self._connect() as conn:
+            conn.executemany('DELETE FROM task_paths WHERE task_id = ?', ((i,) for i in task_ids))
+
+    def lookup(self, paths: Iterable[str]) -> Dict[str, int]:
+        """ID задач для списка путей (отсутствующие пути не возвращаются)"""
+        paths = list(paths)
+        result = {}
+        with self._connect() as conn:
+            for i in range(0, len(paths), 500):
+                part = paths[i:i + 500]
+                result.update(conn.execute(
+                    f"SELECT path, task_id FROM task_paths WHERE path IN ({','.join('?' * len(part))})",
+                    part
+                ).fetchall())
+        return result
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM task_paths').fetchone()[0]
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        conn = self._connect()
+        try:
+            yield from conn.execute('SELECT path, task_id FROM task_paths ORDER BY path')
+        finally:
+            conn.close()
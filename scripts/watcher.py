@@ -0,0 +1,299 @@
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# События для обработки демоном: файл создан/изменен, файл удален, нужен полный обход
+CREATED = 'created'
+REMOVED = 'removed'
+RESCAN = 'rescan'
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """
+    Рекурсивное отслеживание директории через inotify (Linux, без внешних зависимостей).
+
+    Файл считается готовым после IN_CLOSE_WRITE или IN_MOVED_TO, поэтому
+    недописанные файлы не попадают в импорт. Для новых директорий watch
+    добавляется на лету, а уже появившиеся в них файлы сообщаются сразу.
+    """
+
+    def __init__(self, root: str, base: str = None, matcher: Callable[[str], bool] = None):
+        """
+        :param root: Отслеживаемая директория
+        :param base: Директория, относительно которой возвращаются пути (по умолчанию root)
+        :param matcher: Фильтр имен файлов
+        """
+        self.root = root
+        self.base = base or root
+        self.matcher = matcher
+        self.fd: Optional[int] = None
+        self._dirs = {}
+
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify недоступен')
+
+    def start(self) -> 'InotifyWatcher':
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = fd
+        try:
+            self._watch_tree(self.root)
+        except OSError:
+            self.close()
+            raise
+        logger.info(f"inotify: отслеживается {len(self._dirs)} директорий в {self.root}")
+        return self
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self._dirs.clear()
+
+    def _add_watch(self, path: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            # ENOSPC - исчерпан fs.inotify.max_user_watches
+            raise OSError(err, f"{os.strerror(err)}: {path}")
+        self._dirs[wd] = path
+
+    def _watch_tree(self, path: str) -> List[str]:
+        """Watch на директорию и все вложенные; возвращает найденные в них файлы"""
+        files = []
+        for dirpath, dirnames, filenames in os.walk(path):
+            self._add_watch(dirpath)
+            files.extend(os.path.join(dirpath, name) for name in filenames)
+        return files
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.base).replace(os.sep, '/')
+
+    def _file_event(self, kind: str, path: str, events: List[Tuple[str, Optional[str]]]):
+        if self.matcher is None or self.matcher(os.path.basename(path)):
+            events.append((kind, self._relative(path)))
+
+    def read(self, timeout: float) -> List[Tuple[str, Optional[str]]]:
+        """
+        Ожидание событий не дольше timeout секунд
+
+        :return: Список (тип события, путь относительно base)
+        """
+        ready, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+
+        events: List[Tuple[str, Optional[str]]] = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("Переполнение очереди inotify, будет выполнен полный обход")
+                events.append((RESCAN, None))
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        for file_path in self._watch_tree(path):
+                            self._file_event(CREATED, file_path, events)
+                    except OSError as e:
+                        logger.warning(f"Не удалось отслеживать {path}: {e}")
+                        events.append((RESCAN, None))
+                elif mask & IN_MOVED_FROM:
+                    # Содержимое перенесенной директории известно только манифесту
+                    events.append((RESCAN, None))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._file_event(CREATED, path, events)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._file_event(REMOVED, path, events)
+        return events
+
+
+class PollingWatcher:
+    """Запасной вариант без inotify: периодический запрос полного инкрементального обхода"""
+
+    def __init__(self, interval: float = None):
+        """
+        :param interval: Интервал опроса, сек (WATCH_POLL_INTERVAL, по умолчанию 30)
+        """
+        self.interval = interval or float(os.getenv('WATCH_POLL_INTERVAL', '30'))
+        self._next = time.monotonic()
+
+    def start(self) -> 'PollingWatcher':
+        logger.info(f"Отслеживание изменений опросом каждые {self.interval} сек")
+        return self
+
+    def close(self):
+        pass
+
+    def read(self, timeout: float) -> List[Tuple[str, Optional[str]]]:
+        wait = self._next - time.monotonic()
+        if wait > timeout:
+            time.sleep(max(timeout, 0))
+            return []
+        time.sleep(max(wait, 0))
+        self._next = time.monotonic() + self.interval
+        return [(RESCAN, None)]
+
+
+class WatchDaemon:
+    """
+    Режим наблюдения: новые файлы отправляются в Label Studio через несколько секунд.
+
+    События накапливаются до тех пор, пока в течение debounce секунд не
+    приходит новых (но не дольше max_delay), после чего пачка путей
+    отправляется через StorageManager.sync_paths без обхода директории.
+    Если inotify недоступен, используется периодический инкрементальный обход.
+    """
+
+    def __init__(
+        self,
+        storage_manager,
+        storage_id: int,
+        debounce: float = None,
+        max_delay: float = None,
+        use_inotify: bool = None
+    ):
+        """
+        :param storage_manager: StorageManager
+        :param storage_id: ID хранилища (для полного обхода)
+        :param debounce: Окно тишины перед отправкой, сек (WATCH_DEBOUNCE, по умолчанию 2)
+        :param max_delay: Максимальная задержка отправки, сек (WATCH_MAX_DELAY, по умолчанию 10)
+        :param use_inotify: Использовать inotify (WATCH_INOTIFY, по умолчанию true)
+        """
+        self.storage_manager = storage_manager
+        self.storage_id = storage_id
+        self.debounce = debounce or float(os.getenv('WATCH_DEBOUNCE', '2'))
+        self.max_delay = max_delay or float(os.getenv('WATCH_MAX_DELAY', '10'))
+        if use_inotify is None:
+            use_inotify = os.getenv('WATCH_INOTIFY', 'true').lower() == 'true'
+        self.use_inotify = use_inotify
+        self.watcher = None
+        self._stop = threading.Event()
+
+        self._pending = set()
+        self._rescan = False
+        self._first_event: Optional[float] = None
+        self._last_event: Optional[float] = None
+
+    def _create_watcher(self):
+        if self.use_inotify:
+            try:
+                return InotifyWatcher(
+                    self.storage_manager.data_dir,
+                    base=self.storage_manager.document_root,
+                    matcher=self.storage_manager.file_matcher
+                ).start()
+            except OSError as e:
+                logger.warning(f"inotify недоступен ({e}), используется опрос")
+        return PollingWatcher().start()
+
+    def run(self):
+        """Цикл наблюдения до вызова stop()"""
+        self.watcher = self._create_watcher()
+        logger.info(f"Режим наблюдения за {self.storage_manager.data_dir} (debounce {self.debounce} сек)")
+        try:
+            while not self._stop.is_set():
+                timeout = self.debounce
+                if self._first_event is not None:
+                    now = time.monotonic()
+                    timeout = min(
+                        self._last_event + self.debounce - now,
+                        self._first_event + self.max_delay - now
+                    )
+                for kind, path in self.watcher.read(min(timeout, 1.0)):
+                    self._record(kind, path)
+                if self._due():
+                    self.flush()
+        finally:
+            self.watcher.close()
+
+    def stop(self):
+        self._stop.set()
+
+    def _record(self, kind: str, path: Optional[str]):
+        now = time.monotonic()
+        if self._first_event is None:
+            self._first_event = now
+        self._last_event = now
+        if kind == RESCAN:
+            self._rescan = True
+        else:
+            self._pending.add(path)
+
+    def _due(self) -> bool:
+        if self._first_event is None:
+            return False
+        now = time.monotonic()
+        return now - self._last_event >= self.debounce or now - self._first_event >= self.max_delay
+
+    def flush(self):
+        """Отправка накопленных изменений"""
+        paths, rescan = self._pending, self._rescan
+        self._pending, self._rescan = set(), False
+        self._first_event = self._last_event = None
+        try:
+            with self.storage_manager.sync_lock:
+                if rescan:
+                    result = self.storage_manager.sync_storage(self.storage_id, incremental=True)
+                elif paths:
+                    result = self.storage_manager.sync_paths(paths)
+                else:
+                    return
+            deferred = result.pop('deferred', None) if isinstance(result, dict) else None
+            logger.info(f"Изменения отправлены: {result}")
+            if deferred:
+                # Файлы еще могут дописываться - они будут проверены со следующей пачкой
+                self._pending |= set(deferred)
+                self._first_event = self._last_event = time.monotonic()
+        except Exception as e:
+            # Пути возвращаются в очередь и будут отправлены со следующей пачкой
+            logger.error(f"Ошибка отправки изменений: {e}")
+            self._pending |= paths
+            self._rescan = self._rescan or rescan
+            self._first_event = self._last_event = time.monotonic()
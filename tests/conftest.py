@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from mock_label_studio import MockLabelStudioServer  # noqa: E402
+
+API_KEY = 'test-key'
+
+
+@pytest.fixture
+def document_root(tmp_path):
+    """document_root с 30 файлами изображений в augmented_images (часть во вложенной директории)"""
+    root = tmp_path / 'files'
+    data_dir = root / 'augmented_images'
+    (data_dir / 'sub').mkdir(parents=True)
+    for i in range(30):
+        path = data_dir / ('sub' if i % 3 == 0 else '') / f'{i}.jpg'
+        path.write_bytes(b'x' * (i + 1))
+    return str(root)
+
+
+@pytest.fixture
+def mock_label_studio(tmp_path, document_root, monkeypatch):
+    """Мок Label Studio и переменные окружения, с которыми к нему подключаются менеджеры"""
+    server = MockLabelStudioServer(api_key=API_KEY, document_root=document_root).start()
+    monkeypatch.setenv('LABEL_STUDIO_URL', server.url)
+    monkeypatch.setenv('LABEL_STUDIO_API_KEY', API_KEY)
+    monkeypatch.setenv('LABEL_STUDIO_USERNAME', 'user')
+    monkeypatch.setenv('LABEL_STUDIO_PASSWORD', 'password')
+    monkeypatch.setenv('LABEL_STUDIO_PROJECT_NAME', 'Drone Dataset')
+    monkeypatch.setenv('LABEL_STUDIO_LOCAL_FILES_SERVING_ENABLED', 'true')
+    monkeypatch.setenv('LABEL_STUDIO_LOCAL_FILES_DOCUMENT_ROOT', document_root)
+    monkeypatch.setenv('STATE_DIR', str(tmp_path / 'state'))
+    monkeypatch.setenv('METRICS_ENABLED', 'false')
+    yield server
+    server.stop()
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+import pytest
+
+from async_client import AsyncLabelStudioManager
+from label_studio_client import LabelStudioManager
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_import_tasks_into_mock(mock_label_studio):
+    async def scenario():
+        async with AsyncLabelStudioManager(max_concurrency=4) as manager:
+            project_id = await manager.get_project_id()
+            stats = await manager.import_tasks(
+                ({'data': {'image': f'{i}.jpg'}} for i in range(250)), project_id=project_id, chunk_size=20
+            )
+            tasks = [task async for task in manager.iter_tasks(project_id)]
+            return stats, tasks
+
+    stats, tasks = run(scenario())
+
+    assert stats['imported'] == 250 and stats['chunks'] == 13 and stats['failed_chunks'] == 0
+    assert sorted(task['data']['image'] for task in tasks) == sorted(f'{i}.jpg' for i in range(250))
+
+
+def test_import_tasks_reports_partial_failure(mock_label_studio):
+    async def scenario():
+        async with AsyncLabelStudioManager(max_concurrency=2) as manager:
+            project_id = await manager.get_project_id()
+            create_tasks_batch = manager.create_tasks_batch
+
+            async def flaky(chunk, project_id=None):
+                if chunk[0]['data']['image'] == '20.jpg':
+                    raise RuntimeError('chunk rejected')
+                return await create_tasks_batch(chunk, project_id)
+
+            manager.create_tasks_batch = flaky
+            with pytest.raises(RuntimeError, match='1 чанков из 5, импортировано задач: 80') as error:
+                await manager.import_tasks(
+                    ({'data': {'image': f'{i}.jpg'}} for i in range(100)), project_id=project_id, chunk_size=20
+                )
+            assert str(error.value.__cause__) == 'chunk rejected'
+            return [task async for task in manager.iter_tasks(project_id)]
+
+    tasks = run(scenario())
+
+    assert len(tasks) == 80
+
+
+def test_import_index_runs_off_the_event_loop(mock_label_studio):
+    index = LabelStudioManager().import_index()
+    threads = []
+    record = index.record
+
+    def tracking_record(tasks, task_ids):
+        threads.append(threading.current_thread())
+        record(tasks, task_ids)
+
+    index.record = tracking_record
+
+    async def scenario():
+        async with AsyncLabelStudioManager(max_concurrency=4) as manager:
+            tasks = [{'data': {'image': f'/data/local-files/?d=augmented_images/{i}.jpg'}} for i in range(50)]
+            first = await manager.import_tasks(tasks, project_id=index.project_id, chunk_size=10, index=index)
+            second = await manager.import_tasks(tasks, project_id=index.project_id, chunk_size=10, index=index)
+            return first, second, threading.current_thread()
+
+    first, second, loop_thread = run(scenario())
+
+    assert first['imported'] == 50 and second['imported'] == 0 and second['skipped'] == 50
+    assert len(threads) == 5 and loop_thread not in threads
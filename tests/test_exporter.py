@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from exporter import AnnotationExporter
+from label_studio_client import LabelStudioManager
+
+
+@pytest.fixture
+def ls_manager(mock_label_studio):
+    manager = LabelStudioManager()
+    manager.import_tasks({'data': {'image': f'{i}.jpg'}, 'annotations': [{'result': []}]} for i in range(95))
+    return manager
+
+
+def interrupt_after(monkeypatch, ls_manager, pages):
+    iter_task_pages = ls_manager.iter_task_pages
+    calls = []
+
+    def broken(*args, **kwargs):
+        calls.append(kwargs.get('filters'))
+        for i, page in enumerate(iter_task_pages(*args, **kwargs)):
+            if i == pages:
+                raise ConnectionError('network')
+            yield page
+
+    monkeypatch.setattr(ls_manager, 'iter_task_pages', broken)
+    return calls
+
+
+def ids(path):
+    return [json.loads(line)['id'] for line in path.open(encoding='utf-8')]
+
+
+def test_interrupted_full_export_resumes_in_full_mode(ls_manager, tmp_path, monkeypatch):
+    output = tmp_path / 'export.jsonl'
+    exporter = AnnotationExporter(ls_manager, page_size=10)
+    exporter.export(str(output))
+    interrupt_after(monkeypatch, ls_manager, 3)
+    with pytest.raises(ConnectionError):
+        exporter.export(str(output), resume=False)
+    monkeypatch.undo()
+
+    calls = interrupt_after(monkeypatch, ls_manager, 100)
+    stats = exporter.export(str(output), only_updated=True)
+
+    assert calls == [[]]
+    assert stats['tasks'] == 65
+    assert sorted(ids(output)) == sorted(set(ids(output))) and len(ids(output)) == 95
+
+
+def test_resume_drops_partial_tail(ls_manager, tmp_path, monkeypatch):
+    output = tmp_path / 'export.jsonl'
+    exporter = AnnotationExporter(ls_manager, page_size=10)
+    interrupt_after(monkeypatch, ls_manager, 2)
+    with pytest.raises(ConnectionError):
+        exporter.export(str(output))
+    monkeypatch.undo()
+    # Сбой между записью страницы и сохранением состояния: повтор строк и недописанная строка
+    lines = output.read_text(encoding='utf-8').splitlines(keepends=True)
+    with output.open('a', encoding='utf-8') as f:
+        f.writelines(lines[-3:])
+        f.write('{"id": 99, "data"')
+
+    exporter.export(str(output))
+
+    assert ids(output) == sorted(task['id'] for task in ls_manager.iter_tasks())
+
+
+def test_updated_only_appends_changed_tasks(ls_manager, mock_label_studio, tmp_path):
+    output = tmp_path / 'export.jsonl'
+    exporter = AnnotationExporter(ls_manager, page_size=10)
+    exporter.export(str(output))
+    with mock_label_studio.state.lock:
+        for task in list(mock_label_studio.state.tasks.values())[:4]:
+            task['updated_at'] = '9999-01-01T00:00:00+00:00'
+
+    stats = exporter.export(str(output), only_updated=True)
+
+    assert stats['tasks'] == 4
+    assert len(ids(output)) == 99
@@ -0,0 +1,38 @@
+import os
+
+from file_scanner import FileScanner
+from label_studio_client import LabelStudioManager
+from storage_manager import StorageManager
+
+
+def fail_on(monkeypatch, directory):
+    scandir = os.scandir
+
+    def flaky(path):
+        if os.path.basename(path) == directory:
+            raise PermissionError(13, 'Permission denied', path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', flaky)
+
+
+def test_scanner_counts_unreadable_directories(document_root, monkeypatch):
+    root = os.path.join(document_root, 'augmented_images')
+    scanner = FileScanner(root)
+    assert len(list(scanner.scan())) == 30 and scanner.errors == 0
+
+    fail_on(monkeypatch, 'sub')
+    assert len(list(scanner.scan())) == 20
+    assert scanner.errors == 1
+
+
+def test_incomplete_scan_keeps_files_in_manifest(mock_label_studio, monkeypatch):
+    storage_manager = StorageManager(LabelStudioManager())
+    storage_id = storage_manager.create_storage()['id']
+    storage_manager.sync_storage(storage_id, scan_all=True)
+    assert storage_manager.manifest.count(storage_manager.data_dir) == 30
+
+    fail_on(monkeypatch, 'sub')
+    storage_manager.sync_storage(storage_id, scan_all=True)
+
+    assert storage_manager.manifest.count(storage_manager.data_dir) == 30
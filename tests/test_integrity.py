@@ -0,0 +1,44 @@
+import io
+import os
+import time
+
+from PIL import Image
+
+from file_manifest import FileEntry
+from integrity import ImageIntegrityChecker
+
+
+def write(root, name, data, age):
+    path = os.path.join(root, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    st = os.stat(path)
+    return FileEntry(name, st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def jpeg() -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def test_recent_files_are_deferred_not_quarantined(tmp_path):
+    root = str(tmp_path / 'files')
+    os.makedirs(root)
+    image = jpeg()
+    entries = [
+        write(root, 'ok.jpg', image, age=3600),
+        write(root, 'broken.jpg', image[:len(image) // 2], age=3600),
+        write(root, 'writing.jpg', image[:len(image) // 2], age=0),
+    ]
+    checker = ImageIntegrityChecker(root, db_path=str(tmp_path / 'checks.sqlite'), workers=1, grace_period=60)
+
+    result = checker.validate(entries)
+
+    assert result.valid == 1
+    assert [entry.path for entry, _ in result.invalid] == ['broken.jpg']
+    assert [entry.path for entry in result.pending] == ['writing.jpg']
+    assert os.path.exists(os.path.join(root, 'writing.jpg'))
+    assert os.path.exists(os.path.join(checker.quarantine_dir, 'broken.jpg'))
@@ -0,0 +1,103 @@
+import sqlite3
+import time
+
+from file_manifest import FileEntry
+from leases import LeaseCoordinator
+
+
+def entries(names):
+    return [FileEntry(f'augmented_images/{name}', 1, 0, 0) for name in names]
+
+
+def coordinators(tmp_path, ttl=60.0, **kwargs):
+    db_path = str(tmp_path / 'leases.sqlite')
+    return (
+        LeaseCoordinator(db_path, owner='a', ttl=ttl, range_size=5, scan_interval=0, **kwargs),
+        LeaseCoordinator(db_path, owner='b', ttl=ttl, range_size=5, scan_interval=0, **kwargs),
+    )
+
+
+def ranges(coordinator):
+    """(размер диапазона, число его файлов) и общее число файлов"""
+    with sqlite3.connect(coordinator.db_path) as conn:
+        rows = conn.execute(
+            'SELECT r.size, COUNT(f.path) FROM ranges r LEFT JOIN files f ON f.range_id = r.id GROUP BY r.id'
+        ).fetchall()
+        total = conn.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+    return rows, total
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    a, b = coordinators(tmp_path, ttl=0.2)
+    assert a.publish(entries(range(10))) == 2
+
+    lease = a.acquire()
+    other = b.acquire()
+    assert {lease.range_id, other.range_id} == {1, 2}
+    assert b.acquire() is None
+
+    time.sleep(0.3)
+    assert b.renew(other)
+    stolen = b.acquire()
+
+    assert stolen.range_id == lease.range_id and stolen.owner == 'b'
+    assert not a.renew(lease) and not a.complete(lease)
+    assert b.complete(stolen) and b.complete(other)
+    assert a.pending() == 0
+
+
+def test_failed_range_is_dropped_after_max_attempts(tmp_path):
+    a, b = coordinators(tmp_path, max_attempts=2)
+    a.publish(entries(range(3)))
+
+    assert not a.fail(a.acquire())
+    assert b.fail(b.acquire())
+    assert a.acquire() is None and a.pending() == 0
+
+    assert a.retry_failed() == 1
+    assert a.acquire().range_id == 1
+
+
+def test_range_expiring_max_attempts_times_is_dropped(tmp_path):
+    a, b = coordinators(tmp_path, ttl=0.1, max_attempts=2)
+    a.publish(entries(range(3)))
+
+    assert a.acquire() is not None
+    time.sleep(0.15)
+    assert b.acquire() is not None
+    time.sleep(0.15)
+
+    assert a.acquire() is None and a.pending() == 0
+
+
+def test_publish_stops_when_scan_lock_is_lost(tmp_path):
+    a, b = coordinators(tmp_path, ttl=0.2)
+
+    def slow_scan():
+        yield from entries(range(1000))
+        # Обход дольше ttl: блокировку забирает вторая реплика
+        time.sleep(0.3)
+        assert b.claim('scan')
+        yield from entries(range(1000, 2000))
+
+    assert a.publish(slow_scan()) == 200
+    assert ranges(a)[1] == 1000
+
+    assert b.publish(entries(range(2000))) == 200
+    rows, total = ranges(a)
+    assert total == 2000 and len(rows) == 400
+    assert all(size == files for size, files in rows)
+
+
+def test_republished_files_do_not_overlap(tmp_path):
+    a, b = coordinators(tmp_path)
+    a.publish(entries(range(7)))
+    b.publish(entries(range(12)))
+
+    rows, total = ranges(a)
+    assert total == 12 and [size for size, _ in rows] == [5, 2, 5]
+    assert all(size == files for size, files in rows)
+
+    a.forget(['augmented_images/3'])
+    assert a.publish(entries(range(12))) == 1
+    assert ranges(a)[1] == 12
@@ -0,0 +1,15 @@
+from orchestrator import Dataset, Orchestrator
+
+
+def test_ensure_storage_repoints_storage_with_other_path(mock_label_studio, document_root):
+    orchestrator = Orchestrator([Dataset('Drone Dataset', 'augmented_images')])
+    dataset = orchestrator.datasets[0]
+    storage_manager = orchestrator.storage_manager(dataset)
+    stale = storage_manager.create_storage()
+    storage_manager.update_storage(stale['id'], path=f'{document_root}/previews')
+
+    storage_id = orchestrator.ensure_storage(storage_manager, dataset)
+
+    assert storage_id == stale['id']
+    assert storage_manager.get_storage(storage_id)['path'] == storage_manager.storage_path
+    assert len(storage_manager.list_storages()) == 1
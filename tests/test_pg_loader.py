@@ -0,0 +1,60 @@
+import json
+import os
+import sqlite3
+
+from label_studio_client import LabelStudioManager
+from pg_loader import BulkTaskLoader, SQLiteDialect, create_standin_schema
+from storage_manager import StorageManager
+from task_importer import tasks_from_files
+from task_paths import image_path_from_task
+
+
+def standin(project_id: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(':memory:')
+    create_standin_schema(conn)
+    conn.execute('INSERT INTO project VALUES (?, ?)', (project_id, 'Drone Dataset'))
+    conn.commit()
+    return conn
+
+
+def test_bulk_load_matches_api_import(mock_label_studio):
+    ls_manager = LabelStudioManager()
+    storage_manager = StorageManager(ls_manager)
+    project_id = ls_manager.get_project_id()
+    files = list(storage_manager.iter_files())
+
+    ls_manager.import_tasks(tasks_from_files(files, storage_manager.build_task), project_id=project_id)
+    imported = [task['data'] for task in ls_manager.iter_tasks(project_id)]
+
+    conn = standin(project_id)
+    tasks = tasks_from_files(files, storage_manager.build_task)
+    items = ((os.path.join(storage_manager.document_root, image_path_from_task(t)), t['data']) for t in tasks)
+    result = BulkTaskLoader(conn, project_id, batch_size=7).load(items)
+    loaded = [json.loads(row[0]) for row in conn.execute('SELECT data FROM task ORDER BY id')]
+
+    assert result['loaded'] == len(files) == len(imported)
+    key = lambda data: data['image']  # noqa: E731
+    assert sorted(loaded, key=key) == sorted(imported, key=key)
+
+
+def test_bulk_load_keeps_bounded_sample():
+    conn = standin(1)
+    result = BulkTaskLoader(conn, 1, batch_size=100, sample=10).load(
+        (None, {'image': f'/data/local-files/?d=augmented_images/{i}.jpg'}) for i in range(1000)
+    )
+
+    assert result['loaded'] == 1000
+    assert len(result['sample']) == 10
+    ids = {task_id for task_id, _ in result['sample']}
+    assert len(ids) == 10 and all(1 <= task_id <= 1000 for task_id in ids)
+
+
+def test_sqlite_begin_joins_pending_transaction():
+    conn = standin(1)
+    conn.execute('INSERT INTO project VALUES (2, ?)', ('pending',))
+    assert conn.in_transaction
+
+    BulkTaskLoader(conn, 1, dialect=SQLiteDialect()).load([(None, {'image': 'a.jpg'})])
+
+    assert conn.execute('SELECT COUNT(*) FROM task').fetchone()[0] == 1
+    assert conn.execute('SELECT COUNT(*) FROM project').fetchone()[0] == 2
@@ -0,0 +1,48 @@
+import json
+import threading
+
+from json_state import load_json, save_json
+from project_index import ProjectIndex, get_project_index
+
+URL = 'http://label-studio:8080'
+
+
+def test_writers_keep_each_others_entries(tmp_path):
+    path = str(tmp_path / 'project_index.json')
+    first, second = ProjectIndex(path), ProjectIndex(path)
+
+    first.set(URL, 'Drone Dataset', 1)
+    second.set(URL, 'Birds', 2)
+    first.update(URL, [{'id': 3, 'title': 'Cars'}])
+    second.remove(URL, 'Birds')
+
+    assert load_json(path) == {URL: {'dronedataset': 1, 'cars': 3}}
+    assert ProjectIndex(path).get(URL, 'drone dataset') == 1
+
+
+def test_concurrent_saves_do_not_share_temp_files(tmp_path):
+    path = str(tmp_path / 'state.json')
+    errors = []
+
+    def writer(i):
+        try:
+            for j in range(50):
+                save_json(path, {'writer': i, 'step': j})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert json.loads(open(path, encoding='utf-8').read())['step'] == 49
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['state.json']
+
+
+def test_project_index_is_shared_per_path(tmp_path):
+    path = str(tmp_path / 'project_index.json')
+    assert get_project_index(path) is get_project_index(str(tmp_path / '.' / 'project_index.json'))
+    assert get_project_index(path) is not get_project_index(str(tmp_path / 'other.json'))
@@ -0,0 +1,78 @@
+import os
+import re
+
+import pytest
+
+from file_scanner import build_matcher
+from sharding import ShardPlanner, bucket_pattern
+
+IMAGE_REGEX_FILTER = r".*\.(jpg|jpeg|png)"
+
+# Короткие и длинные основы, точки и спецсимволы в именах, основы с одинаковым окончанием
+NAMES = (
+    [f'{i}.jpg' for i in range(200)]
+    + [f'frame_{i:05d}.png' for i in range(0, 600, 7)]
+    + ['a.jpg', 'ab.jpg', 'x.y.z.jpeg', 'a+b.jpg', 'a(1).jpg', 'кадр 9.jpg', '.hidden.png', 'noext_9.JPG']
+)
+UNSEEN = ['new_a.jpg', 'new_zz.jpg', 'q.png', '9999.jpeg', 'x[1].jpg', 'Ω.jpg']
+
+
+def make_tree(root, layout):
+    for directory, names in layout.items():
+        path = os.path.join(root, directory)
+        os.makedirs(path, exist_ok=True)
+        for name in names:
+            with open(os.path.join(path, name), 'wb') as f:
+                f.write(b'x')
+
+
+def owners(shards, root, relative_path):
+    """Шарды, которые импортировали бы файл: путь хранилища содержит файл, regex_filter совпадает с именем"""
+    full = os.path.join(root, relative_path)
+    name = os.path.basename(relative_path)
+    return [
+        shard.name for shard in shards
+        if os.path.commonpath([shard.path, full]) == shard.path and re.match(shard.regex_filter, name)
+    ]
+
+
+@pytest.mark.parametrize('mode', ['hash', 'subdirectory'])
+def test_shards_partition_files(tmp_path, mode):
+    root = str(tmp_path / 'augmented_images')
+    layout = {'.': NAMES, 'night': NAMES[:150], 'night/ir': NAMES[100:]}
+    make_tree(root, layout)
+    matcher = build_matcher(regex_filter=IMAGE_REGEX_FILTER)
+    planner = ShardPlanner(root, matcher=matcher, regex_filter=IMAGE_REGEX_FILTER, max_files=60, mode=mode)
+
+    shards = planner.plan()
+
+    assert len(shards) > 3
+    for directory, names in layout.items():
+        for name in names + UNSEEN:
+            if not matcher(name):
+                continue
+            assert len(owners(shards, root, os.path.join(directory, name))) == 1, (directory, name)
+    covered = sum(shard.file_count for shard in shards)
+    assert covered == sum(1 for names in layout.values() for name in names if matcher(name))
+
+
+def test_bucket_pattern_keys():
+    pattern = re.compile(bucket_pattern(['7', '42', 'b'], 2))
+
+    assert pattern.match('frame_42.jpg') and pattern.match('7.jpg') and pattern.match('b.png')
+    assert not pattern.match('frame_43.jpg') and not pattern.match('17.jpg') and not pattern.match('42.jpg.bak.x')
+
+
+def test_extend_covers_new_directory_without_overlap(tmp_path):
+    root = str(tmp_path / 'augmented_images')
+    make_tree(root, {'day': NAMES[:100], 'night': NAMES[:100]})
+    matcher = build_matcher(regex_filter=IMAGE_REGEX_FILTER)
+    planner = ShardPlanner(root, matcher=matcher, regex_filter=IMAGE_REGEX_FILTER, max_files=150)
+    shards = planner.plan()
+
+    make_tree(root, {'dusk': NAMES[:100]})
+    shards = shards + planner.extend(shards)
+
+    for directory in ('day', 'night', 'dusk'):
+        for name in NAMES[:100]:
+            assert len(owners(shards, root, os.path.join(directory, name))) == 1, (directory, name)
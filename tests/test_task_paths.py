@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from label_studio_client import LabelStudioManager
+from storage_manager import StorageManager
+from task_paths import image_path_from_task, local_files_url
+
+NAMES = ['a+b.jpg', 'a%20b.jpg', 'a b.jpg', 'a&b.jpg', 'a#1.jpg', 'a=b?.jpg', 'сорт/100%.jpg']
+
+
+@pytest.mark.parametrize('name', NAMES)
+def test_local_files_url_round_trip(name):
+    path = f'augmented_images/{name}'
+    assert image_path_from_task({'data': {'image': local_files_url(path)}}) == path
+
+
+def test_special_names_get_distinct_keys_matching_server_sync(mock_label_studio, document_root):
+    data_dir = os.path.join(document_root, 'augmented_images')
+    for name in NAMES:
+        os.makedirs(os.path.dirname(os.path.join(data_dir, name)), exist_ok=True)
+        with open(os.path.join(data_dir, name), 'wb') as f:
+            f.write(name.encode())
+
+    storage_manager = StorageManager(LabelStudioManager())
+    local = {image_path_from_task(storage_manager.build_task(entry.path)) for entry in storage_manager.iter_files()}
+    storage_id = storage_manager.create_storage()['id']
+    storage_manager.sync_storage(storage_id, scan_all=True)
+    synced = [image_path_from_task(task) for task in storage_manager.client.iter_tasks()]
+
+    assert {f'augmented_images/{name}' for name in NAMES} <= local
+    assert len(synced) == len(set(synced)) == len(local)
+    assert set(synced) == local